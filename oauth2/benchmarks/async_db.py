@@ -0,0 +1,117 @@
+"""Concurrency benchmark for the database layer.
+
+Drives N parallel clients through the token issuance path (get_client +
+create_token), once calling the sync helpers straight from the event loop
+(how the routers used to work) and once through async_operations, where
+get_client runs on the reader threads and create_token on the writer
+threads. A probe task measures event loop lag, i.e. what a DB-free request
+would wait.
+
+    python -m benchmarks.async_db --clients 200 --requests 10
+"""
+import argparse
+import asyncio
+import os
+import random
+import secrets
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DB_FILE", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+from service.config import DB_EXECUTOR_WORKERS, DB_FILE, DB_WRITER_WORKERS  # noqa: E402
+from service.database import operations, async_operations  # noqa: E402
+from service.database.create_db import init_db  # noqa: E402
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name, samples):
+    print(
+        f"  {name:<10} n={len(samples):<6} "
+        f"p50={percentile(samples, 50) * 1000:8.2f}ms "
+        f"p99={percentile(samples, 99) * 1000:8.2f}ms "
+        f"max={max(samples) * 1000:8.2f}ms "
+        f"mean={statistics.fmean(samples) * 1000:8.2f}ms"
+    )
+
+
+def issue_sync(client_id):
+    with operations.get_db_context() as db:
+        operations.get_client(client_id, db)
+        operations.create_token(
+            secrets.token_urlsafe(32), secrets.token_urlsafe(32), "Bearer",
+            datetime.now() + timedelta(minutes=30), datetime.now() + timedelta(days=7), "", client_id, 1, db
+        )
+
+
+async def issue_async(client_id):
+    await async_operations.get_client(client_id)
+    await async_operations.create_token(
+        secrets.token_urlsafe(32), secrets.token_urlsafe(32), "Bearer",
+        datetime.now() + timedelta(minutes=30), datetime.now() + timedelta(days=7), "", client_id, 1
+    )
+
+
+async def run(mode, clients, requests, client_id):
+    latencies, lags = [], []
+    done = asyncio.Event()
+
+    async def probe():
+        while not done.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(0.005)
+            lags.append(time.perf_counter() - start - 0.005)
+
+    async def client():
+        for _ in range(requests):
+            # Latency is measured from when the request would have arrived,
+            # so time spent queued behind a blocked loop is counted.
+            think = random.uniform(0, 0.02)
+            arrival = time.perf_counter() + think
+            await asyncio.sleep(think)
+            if mode == "sync":
+                issue_sync(client_id)
+            else:
+                await issue_async(client_id)
+            latencies.append(time.perf_counter() - arrival)
+
+    probe_task = asyncio.create_task(probe())
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(clients)))
+    elapsed = time.perf_counter() - started
+    done.set()
+    await probe_task
+
+    print(f"{mode}: {clients * requests / elapsed:.0f} req/s over {elapsed:.2f}s")
+    report("issuance", latencies)
+    report("loop lag", lags or [0.0])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--clients", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=10)
+    args = parser.parse_args(argv)
+
+    init_db(DB_FILE)
+    client_id = secrets.token_urlsafe(16)
+    with operations.get_db_context() as db:
+        operations.create_client(client_id, "", "", "bench", "public", db)
+
+    print(f"database: {DB_FILE}  readers: {DB_EXECUTOR_WORKERS}  writers: {DB_WRITER_WORKERS}")
+    asyncio.run(run("sync", args.clients, args.requests, client_id))
+    asyncio.run(run("async", args.clients, args.requests, client_id))
+    async_operations.shutdown()
+    print(f"pool: {operations.get_pool().stats()}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
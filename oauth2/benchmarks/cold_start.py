@@ -0,0 +1,98 @@
+"""Benchmark: cold start of service.main, with a regression budget.
+
+Each run is a fresh interpreter under ``-X importtime``: it imports the app
+and then runs its startup and shutdown hooks against a throwaway database.
+The report shows median import and startup time, and the service modules
+with the most import time of their own. The run fails (exit status 1) when
+the median import exceeds --budget-ms, or when a module that should only
+load on first use (passlib, cryptography, ...) is imported with the app.
+
+    python -m benchmarks.cold_start --runs 5 --budget-ms 450
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+# Loaded on first use only: hashing happens in the worker processes, RS256
+# and EdDSA keys load with the key ring, argon2 only when configured
+DEFERRED = ["sqlalchemy", "jose", "passlib", "bcrypt", "argon2", "cryptography", "uvicorn"]
+
+_PROBE = """
+import asyncio, json, sys, time
+start = time.perf_counter()
+from service.main import app
+imported = time.perf_counter()
+
+async def lifespan():
+    # The startup and shutdown hooks directly; starlette 0.14 has no lifespan_context
+    await app.router.startup()
+    started = time.perf_counter()
+    await app.router.shutdown()
+    return started
+
+started = asyncio.run(lifespan())
+print(json.dumps({
+    "import": imported - start,
+    "startup": started - imported,
+    "deferred": sorted({name.split(".")[0] for name in sys.modules} & set(%r)),
+}))
+"""
+
+
+def run_once(probe):
+    with tempfile.TemporaryDirectory() as directory:
+        env = {
+            **os.environ,
+            "DB_FILE": os.path.join(directory, "cold.db"),
+            "RATE_LIMIT_FILE": os.path.join(directory, "rate_limit"),
+            "DEVICE_POLL_TRACKER_FILE": os.path.join(directory, "device_polls"),
+            "REAPER_ENABLED": "false",
+        }
+        result = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", probe],
+            capture_output=True, text=True, env=env, check=True
+        )
+    self_times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        if own.strip().isdigit() and name.strip().startswith("service"):
+            self_times[name.strip()] = int(own) / 1000
+    return json.loads(result.stdout.splitlines()[-1]), self_times
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=450, help="median import time allowed")
+    parser.add_argument("--top", type=int, default=8)
+    args = parser.parse_args(argv)
+
+    probe = _PROBE % DEFERRED
+    runs = [run_once(probe) for _ in range(args.runs)]
+    import_ms = statistics.median(timing["import"] for timing, _ in runs) * 1000
+    startup_ms = statistics.median(timing["startup"] for timing, _ in runs) * 1000
+    deferred = sorted({name for timing, _ in runs for name in timing["deferred"]})
+    print(f"  import   {import_ms:7.1f} ms  (budget {args.budget_ms:.0f} ms)")
+    print(f"  startup  {startup_ms:7.1f} ms")
+    modules = {name: statistics.median(times[name] for _, times in runs if name in times) for _, times in runs for name in times}
+    for name, ms in sorted(modules.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"    {ms:6.1f} ms  {name}")
+
+    failed = False
+    if import_ms > args.budget_ms:
+        print(f"FAIL: import took {import_ms:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+        failed = True
+    if deferred:
+        print(f"FAIL: imported with the app: {', '.join(deferred)}")
+        failed = True
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
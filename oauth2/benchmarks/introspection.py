@@ -0,0 +1,77 @@
+"""Benchmark: introspecting a batch of tokens one lookup at a time vs in bulk.
+
+"single" does what a gateway calling userinfo per token costs the database:
+a token row and a user row per token. "bulk" is the batch endpoint's path,
+get_tokens and get_users_by_id with IN (...) queries. HTTP round trips saved
+come on top of this.
+
+    python -m benchmarks.introspection --tokens 1000 --batch 500
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+os.environ.setdefault("DB_FILE", os.path.join(tempfile.mkdtemp(), "bench.db"))
+
+from service.database.create_db import init_db  # noqa: E402
+from service.storage import get_storage  # noqa: E402
+from service.utils.security import create_access_token, generate_token  # noqa: E402
+
+
+def populate(storage, count, users=50):
+    ids = [storage.create_user(f"user{n}", "x", f"user{n}@example.com") for n in range(users)]
+    storage.create_client("bench", "secret", "http://cb", "bench", "confidential")
+    tokens = []
+    expires_at = datetime.now() + timedelta(minutes=30)
+    for n in range(count):
+        user_id = ids[n % users]
+        token = create_access_token({"sub": str(user_id), "n": n})
+        storage.create_token(token, generate_token(), "Bearer", expires_at, expires_at, "openid", "bench", user_id)
+        tokens.append(token)
+    return tokens
+
+
+def single(storage, tokens):
+    for token in tokens:
+        row = storage.get_token(token)
+        storage.get_user_by_id(row.user_id)
+
+
+def bulk(storage, tokens):
+    rows = storage.get_tokens(tokens)
+    storage.get_users_by_id(sorted({row.user_id for row in rows}))
+
+
+def measure(name, func, storage, batches, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for batch in batches:
+            func(storage, batch)
+    elapsed = time.perf_counter() - start
+    count = repeat * sum(len(batch) for batch in batches)
+    print(f"  {name:<7} {count / elapsed:>10.0f} tokens/s")
+    return count / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=1000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args(argv)
+
+    init_db()
+    storage = get_storage()
+    tokens = populate(storage, args.tokens)
+    batches = [tokens[start:start + args.batch] for start in range(0, len(tokens), args.batch)]
+    print(f"{args.tokens} tokens, batches of {args.batch}, {type(storage).__name__}:")
+    single_rate = measure("single", single, storage, batches, args.repeat)
+    bulk_rate = measure("bulk", bulk, storage, batches, args.repeat)
+    print(f"  speedup {bulk_rate / single_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
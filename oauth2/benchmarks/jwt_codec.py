@@ -0,0 +1,63 @@
+"""Microbenchmark: python-jose vs service.utils.jwt_codec, encode and decode.
+
+Before timing, checks that each side accepts the other's tokens and that
+both produce identical bytes for the same claims.
+
+    python -m benchmarks.jwt_codec --iterations 50000
+
+Needs python-jose, from requirements-dev.txt.
+"""
+import argparse
+import sys
+import time
+
+from jose import jwt
+
+from service.config import SECRET_KEY, ALGORITHM
+from service.utils import jwt_codec
+
+
+def claims():
+    return {"sub": "12345", "exp": int(time.time()) + 1800}
+
+
+def check_compatibility():
+    payload = claims()
+    ours = jwt_codec.encode_token(payload)
+    theirs = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    assert jwt.decode(ours, SECRET_KEY, algorithms=[ALGORITHM]) == payload
+    assert jwt_codec.decode_token(theirs) == payload
+    return ours == theirs
+
+
+def measure(name, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    print(f"  {name:<8} {iterations / elapsed:>10.0f} ops/s  {elapsed / iterations * 1e6:6.2f} us/op")
+    return iterations / elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=50000)
+    args = parser.parse_args(argv)
+
+    identical = check_compatibility()
+    print(f"{ALGORITHM}, orjson={'yes' if jwt_codec.orjson else 'no'}, identical tokens: {identical}")
+    payload = claims()
+    token = jwt_codec.encode_token(payload)
+
+    print("encode:")
+    jose_rate = measure("jose", lambda: jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM), args.iterations)
+    codec_rate = measure("codec", lambda: jwt_codec.encode_token(payload), args.iterations)
+    print(f"  speedup  {codec_rate / jose_rate:.1f}x")
+    print("decode:")
+    jose_rate = measure("jose", lambda: jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]), args.iterations)
+    codec_rate = measure("codec", lambda: jwt_codec.decode_token(token), args.iterations)
+    print(f"  speedup  {codec_rate / jose_rate:.1f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Benchmark: bcrypt verification on the DB thread pool vs the hashing process pool.
+
+Fires a burst of concurrent verifications and, alongside, a cheap coroutine
+that measures how late the event loop wakes it; bcrypt holding the GIL on a
+thread shows up as loop lag, while the process pool leaves the loop free.
+Rejections are the requests the process pool turned away with a 503.
+
+    python -m benchmarks.password_hashing --requests 64
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+
+from service.database.async_operations import run_db, shutdown
+from service.utils.hashing import PasswordHasher, PasswordPoolSaturated
+from service.utils.security import get_password_hash, verify_password
+
+
+async def loop_lag(stop, interval=0.005):
+    lags = []
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - start - interval)
+    return lags
+
+
+async def run(name, verify, hashed, requests):
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(loop_lag(stop))
+    start = time.perf_counter()
+    results = await asyncio.gather(*[verify("password", hashed) for _ in range(requests)], return_exceptions=True)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lags = sorted(await lag_task)
+    rejected = sum(isinstance(result, PasswordPoolSaturated) for result in results)
+    print(
+        f"  {name:<8} {(requests - rejected) / elapsed:7.1f} verifies/s  rejected {rejected:>3}"
+        f"  loop lag p50 {statistics.median(lags) * 1000:6.1f} ms  max {lags[-1] * 1000:6.1f} ms"
+    )
+
+
+async def bench(args):
+    hashed = get_password_hash("password")
+    await run("threads", lambda *a: run_db(verify_password, *a), hashed, args.requests)
+    hasher = PasswordHasher(max_queue=args.queue).start()
+    try:
+        await run("process", hasher.verify, hashed, args.requests)
+        print(f"  metrics  {hasher.metrics()}")
+    finally:
+        hasher.shutdown()
+        shutdown()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=64)
+    parser.add_argument("--queue", type=int, default=32, help="process pool wait queue")
+    args = parser.parse_args(argv)
+    asyncio.run(bench(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,52 @@
+"""Benchmark: cost of a shared token bucket check, alone and with processes contending.
+
+Each process takes from its own set of keys in one memory-mapped bucket file,
+so the numbers are the flock plus slot update a rate-limited request pays.
+
+    python -m benchmarks.rate_limit --processes 4 --takes 100000
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from service.utils.rate_limit import SharedBuckets
+
+
+def worker(path, slots, takes, keys, results, n):
+    buckets = SharedBuckets(path, slots)
+    start = time.perf_counter()
+    for i in range(takes):
+        buckets.take(f"POST /oauth2/token|ip|10.{n}.{i % keys // 256}.{i % 256}", 1000.0, 1000)
+    results.put((time.perf_counter() - start) / takes)
+    buckets.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--takes", type=int, default=100000)
+    parser.add_argument("--keys", type=int, default=10000, help="distinct keys per process")
+    parser.add_argument("--slots", type=int, default=65536)
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "buckets")
+        for processes in sorted({1, args.processes}):
+            results = multiprocessing.Queue()
+            workers = [
+                multiprocessing.Process(target=worker, args=(path, args.slots, args.takes, args.keys, results, n))
+                for n in range(processes)
+            ]
+            for process in workers:
+                process.start()
+            per_take = [results.get() for _ in workers]
+            for process in workers:
+                process.join()
+            print(f"  {processes} process(es)  {max(per_take) * 1e6:6.2f} us/take")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,94 @@
+"""Microbenchmark: SELECT * with sqlite3.Row vs projected record lookups.
+
+Compares the lookups behind /oauth2/users/info and /oauth2/authorize as they
+were (full rows through sqlite3.Row) with the projected NamedTuple records
+returned by operations.py.
+
+    python -m benchmarks.row_projection --rows 10000 --lookups 100000
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+from service.database import operations
+from service.database.create_db import init_db
+
+
+def legacy_user(db, id):
+    row = db.execute("SELECT * FROM users WHERE id = ?", (id,)).fetchone()
+    row["username"], row["email"]
+    return row
+
+
+def projected_user(db, id):
+    user = operations.get_user_by_id(id, db)
+    user.username, user.email
+    return user
+
+
+def legacy_client(db, client_id):
+    row = db.execute("SELECT * FROM clients WHERE client_id = ?", (client_id,)).fetchone()
+    row["client_id"], row["redirect_uris"]
+    return row
+
+
+def projected_client(db, client_id):
+    client = operations.get_client(client_id, db)
+    client.client_id, client.redirect_uris
+    return client
+
+
+def row_bytes(row):
+    # The row container plus every value it keeps alive
+    return sys.getsizeof(row) + sum(sys.getsizeof(value) for value in tuple(row))
+
+
+def measure(name, func, db, keys):
+    start = time.perf_counter()
+    for key in keys:
+        func(db, key)
+    elapsed = time.perf_counter() - start
+    size = row_bytes(func(db, keys[0]))
+    print(f"  {name:<18} {len(keys) / elapsed:>10.0f} ops/s  {elapsed / len(keys) * 1e6:6.2f} us/op  {size:5d} bytes/row")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=10000)
+    parser.add_argument("--lookups", type=int, default=100000)
+    args = parser.parse_args(argv)
+
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    init_db(path)
+    db = sqlite3.connect(path)
+    db.executemany(
+        "INSERT INTO users (username, hashed_password, email) VALUES (?, ?, ?)",
+        ((f"user{i}", "$2b$12$" + "x" * 53, f"user{i}@example.com") for i in range(args.rows))
+    )
+    db.executemany(
+        "INSERT INTO clients (client_id, client_secret, redirect_uris, name, client_type) VALUES (?, ?, ?, ?, ?)",
+        ((f"client{i}", "s" * 43, "http://localhost:8080/oauth2/callback", f"app{i}", "confidential") for i in range(args.rows))
+    )
+    db.commit()
+
+    user_ids = [random.randint(1, args.rows) for _ in range(args.lookups)]
+    client_ids = [f"client{random.randrange(args.rows)}" for _ in range(args.lookups)]
+
+    legacy_db = sqlite3.connect(path)
+    legacy_db.row_factory = sqlite3.Row
+    projected_db = sqlite3.connect(path)
+
+    print("users by id:")
+    measure("SELECT * / Row", legacy_user, legacy_db, user_ids)
+    measure("projected record", projected_user, projected_db, user_ids)
+    print("clients by client_id:")
+    measure("SELECT * / Row", legacy_client, legacy_db, client_ids)
+    measure("projected record", projected_client, projected_db, client_ids)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,82 @@
+"""Token issuance throughput across processes for different shard counts.
+
+Each process stands in for a uvicorn worker and issues tokens through the
+storage backend as fast as it can. With one file every commit queues on the
+same write lock; with N shards writers spread over N locks.
+
+    python -m benchmarks.sharding --processes 4 --tokens 5000 --shards 1 2 4
+"""
+import argparse
+import multiprocessing
+import os
+import secrets
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from service.config import DB_PRAGMAS
+from service.database.migrations import migrate
+from service.database.pool import ConnectionPool
+from service.database.shards import init_shards, shard_paths
+from service.storage.sharded import ShardedSQLiteStorage
+from service.storage.sqlite import SQLiteStorage
+
+
+def open_storage(db_path, pattern, shards):
+    primary = ConnectionPool(db_path, size=2, pragmas=DB_PRAGMAS)
+    if shards > 1:
+        pools = [ConnectionPool(path, size=2, pragmas=DB_PRAGMAS) for path in shard_paths(shards, pattern)]
+        return ShardedSQLiteStorage(pools, primary)
+    return SQLiteStorage(primary)
+
+
+def worker(db_path, pattern, shards, tokens, start_barrier):
+    storage = open_storage(db_path, pattern, shards)
+    expires_at = datetime.now() + timedelta(hours=1)
+    start_barrier.wait()
+    for _ in range(tokens):
+        storage.create_token(
+            secrets.token_urlsafe(32), secrets.token_urlsafe(32), "Bearer", expires_at, expires_at, "openid", "client", 1
+        )
+    storage.close()
+
+
+def measure(shards, processes, tokens):
+    directory = tempfile.mkdtemp()
+    db_path = os.path.join(directory, "bench.db")
+    pattern = os.path.join(directory, "bench.shard{}.db")
+    migrate(db_path)
+    init_shards(shards, pattern)
+
+    barrier = multiprocessing.Barrier(processes + 1)
+    workers = [
+        multiprocessing.Process(target=worker, args=(db_path, pattern, shards, tokens, barrier))
+        for _ in range(processes)
+    ]
+    for process in workers:
+        process.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for process in workers:
+        process.join()
+    return processes * tokens / (time.perf_counter() - start)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--processes", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--tokens", type=int, default=5000, help="tokens per process")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    args = parser.parse_args(argv)
+
+    print(f"{args.processes} processes x {args.tokens} tokens, synchronous={DB_PRAGMAS['synchronous']}:")
+    baseline = None
+    for shards in args.shards:
+        rate = measure(shards, args.processes, args.tokens)
+        baseline = baseline or rate
+        print(f"  shards={shards:<3} {rate:>10.0f} tokens/s  {rate / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
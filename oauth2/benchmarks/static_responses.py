@@ -0,0 +1,55 @@
+"""Microbenchmark: per-request cost of the discovery document, built vs prebuilt.
+
+"built" is what the handler used to do on every request: fill a dict,
+validate it through OpenIDConfiguration and JSON-encode it into a
+JSONResponse. "prebuilt" serves the StaticResponse made at startup, and
+"304" is a client revalidating with the ETag it already holds.
+
+    python -m benchmarks.static_responses --iterations 20000
+"""
+import argparse
+import sys
+import time
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from starlette.requests import Request
+
+from service.models.schemas import OpenIDConfiguration
+from service.routes.openid import build_discovery
+
+
+def request(headers=()):
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": list(headers), "query_string": b""})
+
+
+def measure(name, func, iterations):
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    per_call = (time.perf_counter() - start) / iterations
+    print(f"  {name:<9} {per_call * 1e6:7.2f} us/request")
+    return per_call
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args(argv)
+
+    discovery = build_discovery()
+    document = dict(discovery.payload)
+
+    def built():
+        return JSONResponse(jsonable_encoder(OpenIDConfiguration(**document)))
+
+    plain = request()
+    conditional = request([(b"if-none-match", discovery.etag.encode())])
+    baseline = measure("built", built, args.iterations)
+    prebuilt = measure("prebuilt", lambda: discovery.respond(plain), args.iterations)
+    measure("304", lambda: discovery.respond(conditional), args.iterations)
+    print(f"  speedup   {baseline / prebuilt:.1f}x")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
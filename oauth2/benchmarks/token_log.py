@@ -0,0 +1,97 @@
+"""Sustained token issuance: SQLite tokens table vs the append-only token log.
+
+Each store gets the same stream of create_token calls from a few threads,
+with a refresh rotation and an access token lookup mixed in every few
+issues, the way /oauth2/token and /oauth2/users/info would drive them. The
+SQLite side uses the pooled connections and pragmas the service runs with.
+
+    python -m benchmarks.token_log --tokens 50000 --threads 4
+"""
+import argparse
+import os
+import secrets
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timedelta
+
+from service.config import DB_POOL, DB_PRAGMAS
+from service.database.create_db import init_db
+from service.database.pool import ConnectionPool
+from service.storage.sqlite import SQLiteStorage
+from service.storage.tokenlog import TokenLog
+
+
+def token_args(expires_at):
+    return dict(
+        access_token=secrets.token_urlsafe(32),
+        refresh_token=secrets.token_urlsafe(32),
+        token_type="Bearer",
+        expires_at=expires_at,
+        refresh_expires_at=expires_at,
+        scope="openid profile",
+        client_id="client-0123456789",
+        user_id=42,
+    )
+
+
+def drive(store, count, rotate_every, lookup_every):
+    expires_at = datetime.now() + timedelta(hours=1)
+    issued = []
+    for i in range(count):
+        token = token_args(expires_at)
+        store.create_token(**token)
+        issued.append(token)
+        if rotate_every and i % rotate_every == 0:
+            old = issued[i // 2]
+            store.rotate_refresh_token(old["refresh_token"], lambda record: token_args(expires_at))
+        if lookup_every and i % lookup_every == 0:
+            store.get_token(issued[i // 3]["access_token"])
+
+
+def measure(name, store, tokens, threads, rotate_every, lookup_every):
+    per_thread = tokens // threads
+    workers = [
+        threading.Thread(target=drive, args=(store, per_thread, rotate_every, lookup_every))
+        for _ in range(threads)
+    ]
+    start = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - start
+    issued = per_thread * threads
+    print(f"  {name:<12} {issued / elapsed:>10.0f} tokens/s  {elapsed / issued * 1e6:8.2f} us/token  {elapsed:6.2f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tokens", type=int, default=50000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--rotate-every", type=int, default=10, help="0 disables refresh rotations")
+    parser.add_argument("--lookup-every", type=int, default=2, help="0 disables access token lookups")
+    parser.add_argument("--fsync", action="store_true", help="fsync the log on every append")
+    args = parser.parse_args(argv)
+
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench.db")
+    init_db(path)
+    sqlite = SQLiteStorage(ConnectionPool(path, DB_POOL["size"], DB_POOL["timeout"], DB_PRAGMAS))
+    log = TokenLog(os.path.join(directory, "tokens"), fsync=args.fsync)
+
+    print(f"{args.tokens} tokens, {args.threads} threads, synchronous={DB_PRAGMAS['synchronous']}, log fsync={args.fsync}:")
+    try:
+        measure("sqlite", sqlite, args.tokens, args.threads, args.rotate_every, args.lookup_every)
+        measure("token log", log, args.tokens, args.threads, args.rotate_every, args.lookup_every)
+        start = time.perf_counter()
+        stats = log.compact()
+        print(f"  compaction   {time.perf_counter() - start:6.2f}s  {stats}")
+    finally:
+        sqlite.close()
+        log.close()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,3 +1,5 @@
 from service.auth.authorization import router as auth_router
 from service.auth.device import router as device_router
+from service.auth.introspection import router as introspection_router
+from service.auth.revocation import router as revocation_router
 from service.auth.token import router as token_router
\ No newline at end of file
@@ -1,16 +1,20 @@
 import sqlite3
 import traceback
 from urllib.parse import urlencode, quote, unquote
-from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Form
+from fastapi import APIRouter, HTTPException, status, Query, Request, Form
 from fastapi.responses import RedirectResponse, HTMLResponse
-from datetime import datetime
+from datetime import datetime, timedelta
 
-from service.database.operations import (
-    get_db, validate_redirect_uri, get_client, get_user, get_user_by_id, authenticate_user,
-    create_authorization_code, get_authorization_code, delete_authorization_code
+from service.database.operations import is_redirect_uri_allowed
+from service.database.async_operations import (
+    get_client, get_user, get_user_by_id, authenticate_user,
+    create_authorization_code, get_authorization_code, redeem_authorization_code
 )
-from service.utils.security import verify_code_challenge
+from service.utils.hashing import PasswordPoolSaturated
+from service.utils.security import verify_code_challenge, create_access_token, generate_token
+from service.utils.templates import page
 from service.models.schemas import TokenRequest, TokenResponse
+from service.config import TOKEN_EXPIRATION
 
 
 router = APIRouter(
@@ -28,8 +32,7 @@ async def authorize(
     scope: str = Query(None),
     state: str = Query(None),
     code_challenge: str = Query(None),
-    code_challenge_method: str = Query(None),
-    db = Depends(get_db)
+    code_challenge_method: str = Query(None)
 ):
     try:
         if response_type != "code":
@@ -43,7 +46,7 @@ async def authorize(
                 detail=error_summary
             )
         
-        client = get_client(client_id, db)
+        client = await get_client(client_id)
         if not client:
             error_summary = {
                 "error_type": "ValidationError",
@@ -55,7 +58,7 @@ async def authorize(
                 detail=error_summary
             )
         
-        if not validate_redirect_uri(client_id, redirect_uri, db):
+        if not is_redirect_uri_allowed(client.redirect_uris, redirect_uri):
             error_summary = {
                 "error_type": "ValidationError",
                 "error_message": "Invalid redirect_uri",
@@ -73,7 +76,7 @@ async def authorize(
             login_url = f"/oauth2/login?next={next_url}"
             return RedirectResponse(url=login_url)
 
-        user = get_user_by_id(user_id, db)
+        user = await get_user_by_id(user_id)
         if not user:
             raise HTTPException(status_code=400, detail="User not found")
 
@@ -89,14 +92,13 @@ async def authorize(
                 detail=error_summary
             )
         
-        code = create_authorization_code(
+        code = await create_authorization_code(
             client_id=client_id,
             redirect_uri=redirect_uri,
-            user_id=user["id"],
+            user_id=user.id,
             scope=scope,
             code_challenge=code_challenge,
-            code_challenge_method=code_challenge_method,
-            db=db
+            code_challenge_method=code_challenge_method
         )
         
         params = {"code": code}
@@ -126,8 +128,7 @@ async def authorize(
 
 @router.post("/token", response_model=TokenResponse)
 async def token(
-    data: TokenRequest,
-    db = Depends(get_db)
+    data: TokenRequest
 ):
     try:
         if data.grant_type != "authorization_code":
@@ -141,7 +142,8 @@ async def token(
                 detail=error_summary
             )
         
-        auth_code = get_authorization_code(data.code, db)
+        client = await get_client(data.client_id)
+        auth_code = await get_authorization_code(data.code)
         if not auth_code:
             error_summary = {
                 "error_type": "ValidationError",
@@ -153,94 +155,79 @@ async def token(
                 detail=error_summary
             )
 
-        print("\n\n date times: \n", datetime.now(), "-------", datetime.fromisoformat(auth_code["expires_at"]))
-        print("\n\n datetime condition \n", datetime.now() > datetime.fromisoformat(auth_code["expires_at"]))
-        if datetime.now() > datetime.fromisoformat(auth_code["expires_at"]):
-            delete_authorization_code(data.code, db)
+        if not client or client.client_id != auth_code.client_id:
             error_summary = {
                 "error_type": "ValidationError",
-                "error_message": "Authorization code expired",
-                "details": f"Code '{data.code}' expired at {auth_code['expires_at']}"
+                "error_message": "Invalid client_id",
+                "details": f"Client '{data.client_id}' not found or doesn't match authorization code"
             }
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=error_summary
             )
-        
-        client = get_client(data.client_id, db)
-        if not client or client["client_id"] != auth_code["client_id"]:
+
+        if data.redirect_uri != auth_code.redirect_uri:
             error_summary = {
                 "error_type": "ValidationError",
-                "error_message": "Invalid client_id",
-                "details": f"Client '{data.client_id}' not found or doesn't match authorization code"
+                "error_message": "Invalid redirect_uri",
+                "details": f"Redirect URI '{data.redirect_uri}' doesn't match authorization code"
             }
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=error_summary
             )
 
-        if data.redirect_uri != auth_code["redirect_uri"]:
+        # Signed before the redemption transaction, which only compares rows
+        issued = {
+            "access_token": create_access_token(
+                data={"sub": str(auth_code.user_id)},
+                expires_delta=timedelta(minutes=30)
+            ),
+            "refresh_token": generate_token(),
+            "token_type": "Bearer",
+            "expires_at": datetime.now() + timedelta(minutes=30),
+            "refresh_expires_at": datetime.now() + TOKEN_EXPIRATION["refresh_token"],
+            "scope": auth_code.scope,
+            "client_id": data.client_id,
+            "user_id": auth_code.user_id
+        }
+
+        def issue(consumed):
+            # Runs inside the redemption transaction; None consumes the code without a token
+            if consumed != auth_code or datetime.now() > datetime.fromisoformat(consumed.expires_at):
+                return None
+            return issued
+
+        redeemed = await redeem_authorization_code(data.code, issue)
+        if not redeemed:
             error_summary = {
                 "error_type": "ValidationError",
-                "error_message": "Invalid redirect_uri",
-                "details": f"Redirect URI '{data.redirect_uri}' doesn't match authorization code"
+                "error_message": "Invalid authorization code",
+                "details": f"Code '{data.code}' not found"
             }
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=error_summary
             )
-        
-        # if auth_code["code_challenge"]:
-        #     if not data.code_verifier:
-        #         error_summary = {
-        #             "error_type": "ValidationError",
-        #             "error_message": "code_verifier required",
-        #             "details": "PKCE code_verifier is required for this authorization code"
-        #         }
-        #         raise HTTPException(
-        #             status_code=status.HTTP_400_BAD_REQUEST,
-        #             detail=error_summary
-        #         )
-        #     if not verify_code_challenge(data.code_verifier, auth_code["code_challenge"]):
-        #         error_summary = {
-        #             "error_type": "ValidationError",
-        #             "error_message": "Invalid code_verifier",
-        #             "details": "PKCE code_verifier doesn't match code_challenge"
-        #         }
-        #         raise HTTPException(
-        #             status_code=status.HTTP_400_BAD_REQUEST,
-        #             detail=error_summary
-        #         )
-        
-        from service.utils.security import create_access_token, generate_token
-        from datetime import timedelta
-        
-        access_token = create_access_token(
-            data={"sub": str(auth_code["user_id"])},
-            expires_delta=timedelta(minutes=30)
-        )
-        refresh_token = generate_token()
-        
-        from service.database.operations import create_token
-        create_token(
-            access_token=access_token,
-            refresh_token=refresh_token,
-            token_type="Bearer",
-            expires_at=datetime.now() + timedelta(minutes=30),
-            scope=auth_code["scope"],
-            client_id=data.client_id,
-            user_id=auth_code["user_id"],
-            db=db
-        )
-        
-        delete_authorization_code(data.code, db)
-        print("\n\n here is creating the token \n\n") 
+
+        auth_code, token = redeemed
+        if token is None:
+            error_summary = {
+                "error_type": "ValidationError",
+                "error_message": "Authorization code expired",
+                "details": f"Code '{data.code}' expired at {auth_code.expires_at}"
+            }
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=error_summary
+            )
+
         return TokenResponse(
-            access_token=access_token,
+            access_token=token["access_token"],
             token_type="Bearer",
             expires_in=1800,
-            refresh_token=refresh_token,
-            scope=auth_code["scope"]
+            refresh_token=token["refresh_token"],
+            scope=auth_code.scope
         )
 
     except sqlite3.Error as e:
@@ -264,58 +251,29 @@ async def token(
 
         
 @router.get("/login")
-async def login_page(next: str = "/"):
-    html_content = """
-<html>
-    <head>
-        <title>Login</title>
-        <style>
-            body { font-family: Arial, sans-serif; margin: 50px; }
-            form { max-width: 300px; margin: auto; }
-            input[type=text], input[type=password] {
-                width: 100%;
-                padding: 12px 20px;
-                margin: 8px 0;
-                box-sizing: border-box;
-            }
-            input[type=submit] {
-                width: 100%;
-                background-color: #4CAF50;
-                color: white;
-                padding: 14px 20px;
-                margin: 8px 0;
-                border: none;
-                cursor: pointer;
-            }
-        </style>
-    </head>
-    <body>
-        <h2 style="text-align:center;">Login</h2>
-        <form method="post" action="">
-            <label>Username:</label><br>
-            <input type="text" name="username" required><br>
-            <label>Password:</label><br>
-            <input type="password" name="password" required><br>
-            <input type="submit" value="Login">
-        </form>
-    </body>
-</html>
-    """
-    return HTMLResponse(content=html_content)
+async def login_page(request: Request, next: str = "/"):
+    # The form posts back to this URL, so ``next`` travels in the query string
+    return page("login", request)
 
 
 @router.post("/login")
 async def login(
     request: Request,
     username: str = Form(...),
-    password: str = Form(...),
-    db = Depends(get_db)
+    password: str = Form(...)
 ):
     next_url = request.query_params.get("next")
-    user = authenticate_user(username, password, db)
+    try:
+        user = await authenticate_user(username, password)
+    except PasswordPoolSaturated:
+        return HTMLResponse(
+            content="Too many logins in progress, please retry shortly.",
+            status_code=503,
+            headers={"Retry-After": "1"}
+        )
     if not user:
         return HTMLResponse(content="Invalid username or password.", status_code=401)
 
-    request.session["user_id"] = user["id"]
+    request.session["user_id"] = user.id
 
     return RedirectResponse(url=next_url, status_code=302)
@@ -0,0 +1,38 @@
+import hmac
+from fastapi import HTTPException, status
+from fastapi.security import HTTPBasic
+
+from service.database.async_operations import get_client_credentials
+
+
+basic_auth = HTTPBasic(auto_error=False)
+
+
+async def authenticate_client(client_id, client_secret, credentials, allow_public=False):
+    """Client credentials from HTTP Basic or the request body; returns the client id.
+
+    Confidential clients must present their secret. Public clients, when
+    allowed, only identify themselves.
+    """
+    if credentials is not None:
+        client_id, client_secret = credentials.username, credentials.password
+    client = await get_client_credentials(client_id) if client_id else None
+    if client and client.client_type == "public" and allow_public:
+        return client.client_id
+    if (
+        not client
+        or client.client_type != "confidential"
+        or not hmac.compare_digest((client.client_secret or "").encode(), (client_secret or "").encode())
+    ):
+        error_summary = {
+            "error_type": "AuthenticationError",
+            "error_message": "Invalid client credentials",
+            "details": "A confidential client's id and secret are required" if not allow_public
+            else "Unknown client or wrong client_secret"
+        }
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail=error_summary,
+            headers={"WWW-Authenticate": "Basic"}
+        )
+    return client.client_id
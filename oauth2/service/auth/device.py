@@ -1,17 +1,22 @@
 import sqlite3
 import traceback
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Query
+from urllib.parse import urlencode
+from fastapi import APIRouter, HTTPException, status, Request, Query
 from fastapi.responses import HTMLResponse
 from datetime import datetime, timedelta
 
-from service.database.operations import (
-    get_db, get_client, get_user, create_device_code,
+from service.database.async_operations import (
+    get_client, get_user, create_device_code,
     get_device_code, get_device_code_by_user_code,
     approve_device_code, create_token
 )
+from service.database import events
+from service.database.device_approvals import device_waiters
+from service.utils.poll_tracker import device_polls
 from service.utils.security import generate_token
+from service.utils.templates import page
 from service.models.schemas import DeviceAuthorizationResponse, TokenResponse
-from service.config import DEVICE_FLOW
+from service.config import DEVICE_FLOW, TOKEN_EXPIRATION
 
 
 router = APIRouter(
@@ -23,11 +28,10 @@ router = APIRouter(
 @router.post("/authorize", response_model=DeviceAuthorizationResponse)
 async def device_authorize(
     client_id: str,
-    scope: str = None,
-    db = Depends(get_db)
+    scope: str = None
 ):
     try:
-        client = get_client(client_id, db)
+        client = await get_client(client_id)
         if not client:
             error_summary = {
                 "error_type": "ValidationError",
@@ -43,15 +47,14 @@ async def device_authorize(
         user_code = generate_token(6)  # Shorter code for user input
         
         expires_at = datetime.now() + timedelta(minutes=30)
-        create_device_code(
+        await create_device_code(
             device_code=device_code,
             user_code=user_code,
             client_id=client_id,
             scope=scope,
             expires_at=expires_at,
             verification_uri=DEVICE_FLOW["verification_uri"],
-            interval=DEVICE_FLOW["interval"],
-            db=db
+            interval=DEVICE_FLOW["interval"]
         )
         
         return DeviceAuthorizationResponse(
@@ -86,76 +89,34 @@ async def device_authorize(
 @router.get("/verify", response_class=HTMLResponse)
 async def device_verification(
     request: Request,
-    user_code: str = Query(None),
-    db = Depends(get_db)
+    user_code: str = Query(None)
 ):
     if not user_code:
-        return """
-        <html>
-            <body>
-                <h1>Device Authorization</h1>
-                <form method="get">
-                    <label for="user_code">Enter your code:</label>
-                    <input type="text" id="user_code" name="user_code" required>
-                    <button type="submit">Submit</button>
-                </form>
-            </body>
-        </html>
-        """
-    
-    device_code = get_device_code_by_user_code(user_code, db)
+        return page("device_code", request)
+
+    device_code = await get_device_code_by_user_code(user_code)
     if not device_code:
-        return """
-        <html>
-            <body>
-                <h1>Invalid Code</h1>
-                <p>The code you entered is invalid. Please try again.</p>
-                <a href="/device">Back</a>
-            </body>
-        </html>
-        """
-    
-    if datetime.now() > datetime.fromisoformat(device_code["expires_at"]):
-        return """
-        <html>
-            <body>
-                <h1>Code Expired</h1>
-                <p>The code you entered has expired. Please request a new code.</p>
-            </body>
-        </html>
-        """
-    
-    if device_code["is_approved"]:
-        return """
-        <html>
-            <body>
-                <h1>Already Approved</h1>
-                <p>This code has already been approved.</p>
-            </body>
-        </html>
-        """
-    
-    return f"""
-    <html>
-        <body>
-            <h1>Approve Device</h1>
-            <p>Code: {user_code}</p>
-            <form method="post" action="/device/approve">
-                <input type="hidden" name="user_code" value="{user_code}">
-                <button type="submit">Approve</button>
-            </form>
-        </body>
-    </html>
-    """
+        return page("device_invalid", request)
+
+    if datetime.now() > datetime.fromisoformat(device_code.expires_at):
+        return page("device_expired", request)
+
+    if device_code.is_approved:
+        return page("device_approved", request)
+
+    return page(
+        "device_approve", request,
+        user_code=user_code,
+        approve_query=urlencode({"user_code": user_code})
+    )
 
 
 @router.post("/approve")
 async def approve_device(
-    user_code: str,
-    db = Depends(get_db)
+    user_code: str
 ):
     try:
-        device_code = get_device_code_by_user_code(user_code, db)
+        device_code = await get_device_code_by_user_code(user_code)
         if not device_code:
             error_summary = {
                 "error_type": "ValidationError",
@@ -167,18 +128,18 @@ async def approve_device(
                 detail=error_summary
             )
         
-        if datetime.now() > datetime.fromisoformat(device_code["expires_at"]):
+        if datetime.now() > datetime.fromisoformat(device_code.expires_at):
             error_summary = {
                 "error_type": "ValidationError",
                 "error_message": "Code expired",
-                "details": f"Code '{user_code}' expired at {device_code['expires_at']}"
+                "details": f"Code '{user_code}' expired at {device_code.expires_at}"
             }
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=error_summary
             )
         
-        user = get_user("testuser", db)
+        user = await get_user("testuser")
         if not user:
             error_summary = {
                 "error_type": "ValidationError",
@@ -190,9 +151,12 @@ async def approve_device(
                 detail=error_summary
             )
         
-        approve_device_code(user_code, user["id"], db)
+        await approve_device_code(user_code, user.id)
+        events.publish(events.DEVICE_APPROVED, device_code.device_code)
         
         return {"status": "approved"}
+    except HTTPException:
+        raise
     except sqlite3.Error as e:
         error_summary = {
             "error_type": "DatabaseError",
@@ -214,8 +178,7 @@ async def approve_device(
 async def device_token(
     grant_type: str,
     device_code: str,
-    client_id: str,
-    db = Depends(get_db)
+    client_id: str
 ):
     try:
         if grant_type != "urn:ietf:params:oauth:grant-type:device_code":
@@ -229,7 +192,21 @@ async def device_token(
                 detail=error_summary
             )
         
-        device = get_device_code(device_code, db)
+        # Checked before the lookup so over-eager devices cost no DB work
+        interval = device_polls.poll(device_code)
+        if interval is not None:
+            error_summary = {
+                "error_type": "ValidationError",
+                "error_message": "slow_down",
+                "details": f"Polling too fast, wait at least {interval} seconds between requests",
+                "interval": interval
+            }
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=error_summary
+            )
+
+        device = await get_device_code(device_code)
         if not device:
             error_summary = {
                 "error_type": "ValidationError",
@@ -241,18 +218,25 @@ async def device_token(
                 detail=error_summary
             )
         
-        if datetime.now() > datetime.fromisoformat(device["expires_at"]):
+        if datetime.now() > datetime.fromisoformat(device.expires_at):
             error_summary = {
                 "error_type": "ValidationError",
                 "error_message": "Code expired",
-                "details": f"Code '{device_code}' expired at {device['expires_at']}"
+                "details": f"Code '{device_code}' expired at {device.expires_at}"
             }
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail=error_summary
             )
         
-        if not device["is_approved"]:
+        if not device.is_approved and DEVICE_FLOW["long_poll_timeout"] > 0:
+            remaining = (datetime.fromisoformat(device.expires_at) - datetime.now()).total_seconds()
+            await device_waiters.wait(device_code, min(DEVICE_FLOW["long_poll_timeout"], remaining))
+            device_polls.touch(device_code)
+            # Read again either way: an approval may have landed before the wait began
+            device = await get_device_code(device_code) or device
+
+        if not device.is_approved:
             error_summary = {
                 "error_type": "ValidationError",
                 "error_message": "Authorization pending",
@@ -263,22 +247,23 @@ async def device_token(
                 detail=error_summary
             )
         
+        device_polls.forget(device_code)
         from service.utils.security import create_access_token
         access_token = create_access_token(
-            data={"sub": str(device["user_id"])},
+            data={"sub": str(device.user_id)},
             expires_delta=timedelta(minutes=30)
         )
         refresh_token = generate_token()
         
-        create_token(
+        await create_token(
             access_token=access_token,
             refresh_token=refresh_token,
             token_type="Bearer",
-            expires_at=datetime.utcnow() + timedelta(minutes=30),
-            scope=device["scope"],
+            expires_at=datetime.now() + timedelta(minutes=30),
+            refresh_expires_at=datetime.now() + TOKEN_EXPIRATION["refresh_token"],
+            scope=device.scope,
             client_id=client_id,
-            user_id=device["user_id"],
-            db=db
+            user_id=device.user_id
         )
         
         return TokenResponse(
@@ -286,8 +271,10 @@ async def device_token(
             token_type="Bearer",
             expires_in=1800,
             refresh_token=refresh_token,
-            scope=device["scope"]
+            scope=device.scope
         )
+    except HTTPException:
+        raise
     except sqlite3.Error as e:
         error_summary = {
             "error_type": "DatabaseError",
@@ -0,0 +1,152 @@
+import asyncio
+import sqlite3
+import time
+import traceback
+from fastapi import APIRouter, Depends, HTTPException, status, Form
+from fastapi.security import HTTPBasicCredentials
+
+from service.config import ALGORITHM, INTROSPECTION
+from service.auth.client_auth import authenticate_client, basic_auth
+from service.database.async_operations import get_tokens, get_users_by_id
+from service.database.revocations import revocation_filter
+from service.models.schemas import IntrospectionRequest
+from service.utils.hashing import PasswordPoolSaturated, password_hasher
+from service.utils.jwt_codec import HMAC_ALGORITHMS, TokenError, decode_token
+from service.utils.security import is_reference_token, reference_token_claims, token_digest
+
+
+router = APIRouter(
+    prefix="/oauth2",
+    tags=["Introspection"],
+)
+
+
+def _decode_all(tokens, now):
+    claims = []
+    for token in tokens:
+        try:
+            claims.append(decode_token(token, now))
+        except TokenError:
+            claims.append(None)
+    return claims
+
+
+async def _verify(tokens):
+    # HMAC checks take microseconds, so only big batches of RS256/EdDSA
+    # tokens are worth shipping to the worker processes
+    now = time.time()
+    if ALGORITHM in HMAC_ALGORITHMS or len(tokens) < INTROSPECTION["parallel_threshold"]:
+        return _decode_all(tokens, now)
+    size = -(-len(tokens) // password_hasher.workers)
+    chunks = await asyncio.gather(*[
+        password_hasher.run(_decode_all, tokens[start:start + size], now)
+        for start in range(0, len(tokens), size)
+    ])
+    return [claims for chunk in chunks for claims in chunk]
+
+
+async def introspect(tokens):
+    """RFC 7662 responses for ``tokens``, in order.
+
+    A token is active when its row still exists, i.e. it has not been rotated
+    or deleted, it has not expired and it is not revoked; JWTs must also
+    carry a valid signature, while opaque tokens take sub and exp from the
+    row. Rows and users are each resolved with one bulk lookup for the whole
+    batch.
+    """
+    jwts = [token for token in tokens if not is_reference_token(token)]
+    claims = dict(zip(jwts, await _verify(jwts))) if jwts else {}
+    candidates = [
+        token for token in tokens
+        if (is_reference_token(token) or claims[token] is not None)
+        and not await revocation_filter.is_revoked(token_digest(token))
+    ]
+    rows = dict(zip(candidates, await get_tokens(candidates))) if candidates else {}
+    user_ids = sorted({row.user_id for row in rows.values() if row is not None and row.user_id is not None})
+    users = {user.id: user for user in await get_users_by_id(user_ids) if user is not None} if user_ids else {}
+
+    now = int(time.time())
+    results = []
+    for token in tokens:
+        row = rows.get(token)
+        user = users.get(row.user_id) if row is not None else None
+        token_claims = None
+        if row is not None:
+            token_claims = claims[token] if token in claims else reference_token_claims(row)
+        if token_claims is None or token_claims.get("exp", now) < now or (row.user_id is not None and user is None):
+            results.append({"active": False})
+            continue
+        result = {
+            "active": True,
+            "token_type": "Bearer",
+            "client_id": row.client_id,
+            "sub": token_claims.get("sub"),
+            "exp": token_claims.get("exp"),
+        }
+        if row.scope:
+            result["scope"] = row.scope
+        if "iat" in token_claims:
+            result["iat"] = token_claims["iat"]
+        if user is not None:
+            result["username"] = user.username
+        results.append(result)
+    return results
+
+
+async def _handle(tokens, client_id, client_secret, credentials):
+    try:
+        await authenticate_client(client_id, client_secret, credentials)
+        if len(tokens) > INTROSPECTION["max_batch"]:
+            error_summary = {
+                "error_type": "ValidationError",
+                "error_message": "Too many tokens",
+                "details": f"At most {INTROSPECTION['max_batch']} tokens per request, got {len(tokens)}"
+            }
+            raise HTTPException(
+                status_code=413,
+                detail=error_summary
+            )
+        return await introspect(tokens)
+    except HTTPException:
+        raise
+    except PasswordPoolSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many requests in progress, retry shortly",
+            headers={"Retry-After": "1"}
+        )
+    except sqlite3.Error as e:
+        error_summary = {
+            "error_type": "DatabaseError",
+            "error_message": str(e),
+            "error_code": e.sqlite_errorcode if hasattr(e, 'sqlite_errorcode') else None,
+            "error_name": e.sqlite_errorname if hasattr(e, 'sqlite_errorname') else None
+        }
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_summary)
+    except Exception as e:
+        error_summary = {
+            "error_type": type(e).__name__,
+            "error_message": str(e),
+            "traceback": traceback.format_exc()
+        }
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_summary)
+
+
+@router.post("/introspect")
+async def introspect_token(
+    token: str = Form(...),
+    token_type_hint: str = Form(None),
+    client_id: str = Form(None),
+    client_secret: str = Form(None),
+    credentials: HTTPBasicCredentials = Depends(basic_auth)
+):
+    # Only access tokens are introspectable; anything else is reported inactive
+    return (await _handle([token], client_id, client_secret, credentials))[0]
+
+
+@router.post("/introspect/batch")
+async def introspect_batch(
+    data: IntrospectionRequest,
+    credentials: HTTPBasicCredentials = Depends(basic_auth)
+):
+    return {"results": await _handle(data.tokens, data.client_id, data.client_secret, credentials)}
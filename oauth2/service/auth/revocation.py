@@ -0,0 +1,90 @@
+import sqlite3
+import traceback
+from fastapi import APIRouter, Depends, HTTPException, status, Form
+from fastapi.responses import Response
+from fastapi.security import HTTPBasicCredentials
+
+from service.auth.client_auth import authenticate_client, basic_auth
+from service.database.async_operations import (
+    get_token, get_token_by_refresh_token, revoke_token, delete_token, rotate_refresh_token
+)
+
+
+router = APIRouter(
+    prefix="/oauth2",
+    tags=["Revocation"],
+)
+
+
+def _check_owner(record, client_id):
+    if record.client_id != client_id:
+        error_summary = {
+            "error_type": "ValidationError",
+            "error_message": "unauthorized_client",
+            "details": "The token was not issued to this client"
+        }
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=error_summary)
+
+
+async def _revoke_access_token(token, client_id):
+    record = await get_token(token)
+    if record is None:
+        return False
+    _check_owner(record, client_id)
+    await revoke_token(record)
+    await delete_token(token)
+    return True
+
+
+async def _revoke_refresh_token(token, client_id):
+    record = await get_token_by_refresh_token(token)
+    if record is None:
+        return False
+    _check_owner(record, client_id)
+    await revoke_token(record)
+    # Consumes the row without issuing a replacement
+    await rotate_refresh_token(token, lambda consumed: None)
+    return True
+
+
+@router.post("/revoke")
+async def revoke(
+    token: str = Form(...),
+    token_type_hint: str = Form(None),
+    client_id: str = Form(None),
+    client_secret: str = Form(None),
+    credentials: HTTPBasicCredentials = Depends(basic_auth)
+):
+    """RFC 7009 revocation of an access or refresh token.
+
+    Either kind revokes the whole grant: the token row is deleted, so its
+    refresh token stops working, and the access token's digest is recorded
+    in revoked_tokens so the JWT is refused until it expires. Unknown tokens
+    get the same 200 as revoked ones.
+    """
+    try:
+        client_id = await authenticate_client(client_id, client_secret, credentials, allow_public=True)
+        revokers = [_revoke_access_token, _revoke_refresh_token]
+        if token_type_hint == "refresh_token":
+            revokers.reverse()
+        for revoker in revokers:
+            if await revoker(token, client_id):
+                break
+        return Response(status_code=status.HTTP_200_OK)
+    except HTTPException:
+        raise
+    except sqlite3.Error as e:
+        error_summary = {
+            "error_type": "DatabaseError",
+            "error_message": str(e),
+            "error_code": e.sqlite_errorcode if hasattr(e, 'sqlite_errorcode') else None,
+            "error_name": e.sqlite_errorname if hasattr(e, 'sqlite_errorname') else None
+        }
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_summary)
+    except Exception as e:
+        error_summary = {
+            "error_type": type(e).__name__,
+            "error_message": str(e),
+            "traceback": traceback.format_exc()
+        }
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_summary)
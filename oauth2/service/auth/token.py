@@ -1,12 +1,12 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, HTTPException, status
 from datetime import datetime, timedelta
 
-from service.database.operations import (
-    get_db, get_client, get_token_by_refresh_token,
-    create_token, delete_token
+from service.database.async_operations import (
+    get_client_credentials, create_token, get_token_by_refresh_token, rotate_refresh_token
 )
 from service.utils.security import create_access_token, generate_token
 from service.models.schemas import TokenResponse
+from service.config import TOKEN_EXPIRATION
 
 
 router = APIRouter(
@@ -20,8 +20,7 @@ async def token(
     grant_type: str,
     client_id: str = None,
     client_secret: str = None,
-    refresh_token: str = None,
-    db = Depends(get_db)
+    refresh_token: str = None
 ):
     if grant_type not in ["client_credentials", "refresh_token"]:
         raise HTTPException(
@@ -30,20 +29,20 @@ async def token(
         )
     
     if grant_type == "client_credentials":
-        return await handle_client_credentials(client_id, client_secret, db)
+        return await handle_client_credentials(client_id, client_secret)
     else:
-        return await handle_refresh_token(refresh_token, client_id, db)
+        return await handle_refresh_token(refresh_token, client_id)
 
 
-async def handle_client_credentials(client_id: str, client_secret: str, db):
-    client = get_client(client_id, db)
+async def handle_client_credentials(client_id: str, client_secret: str):
+    client = await get_client_credentials(client_id)
     if not client:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid client_id"
         )
     
-    if client["client_type"] == "confidential" and client["client_secret"] != client_secret:
+    if client.client_type == "confidential" and client.client_secret != client_secret:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid client_secret"
@@ -55,15 +54,15 @@ async def handle_client_credentials(client_id: str, client_secret: str, db):
     )
     refresh_token = generate_token()
     
-    create_token(
+    await create_token(
         access_token=access_token,
         refresh_token=refresh_token,
         token_type="Bearer",
         expires_at=datetime.now() + timedelta(minutes=30),
+        refresh_expires_at=datetime.now() + TOKEN_EXPIRATION["refresh_token"],
         scope="",
         client_id=client_id,
-        user_id=None,  # No user for client credentials
-        db=db
+        user_id=None  # No user for client credentials
     )
     
     return TokenResponse(
@@ -74,49 +73,63 @@ async def handle_client_credentials(client_id: str, client_secret: str, db):
     )
 
 
-async def handle_refresh_token(refresh_token: str, client_id: str, db):
+async def handle_refresh_token(refresh_token: str, client_id: str):
     if not refresh_token:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="refresh_token required"
         )
     
-    token = get_token_by_refresh_token(refresh_token, db)
+    token = await get_token_by_refresh_token(refresh_token)
     if not token:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid refresh_token"
         )
-    
-    if token["client_id"] != client_id:
+
+    if token.client_id != client_id:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid client_id"
         )
-    
-    access_token = create_access_token(
-        data={"sub": str(token["user_id"])},
-        expires_delta=timedelta(minutes=30)
-    )
-    new_refresh_token = generate_token()
-    
-    create_token(
-        access_token=access_token,
-        refresh_token=new_refresh_token,
-        token_type="Bearer",
-        expires_at=datetime.utcnow() + timedelta(minutes=30),
-        scope=token["scope"],
-        client_id=client_id,
-        user_id=token["user_id"],
-        db=db
-    )
-    
-    delete_token(token["access_token"], db)
-    
+
+    if datetime.now() > datetime.fromisoformat(token.refresh_expires_at):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Refresh token expired"
+        )
+
+    # Signed before the rotation transaction, which only compares rows
+    issued = {
+        "access_token": create_access_token(
+            data={"sub": str(token.user_id)},
+            expires_delta=timedelta(minutes=30)
+        ),
+        "refresh_token": generate_token(),
+        "token_type": "Bearer",
+        "expires_at": datetime.now() + timedelta(minutes=30),
+        "refresh_expires_at": datetime.now() + TOKEN_EXPIRATION["refresh_token"],
+        "scope": token.scope,
+        "client_id": client_id,
+        "user_id": token.user_id
+    }
+
+    def issue(consumed):
+        # Runs inside the rotation transaction; None consumes the old token without a new one
+        return issued if consumed == token else None
+
+    rotated = await rotate_refresh_token(refresh_token, issue)
+    if not rotated or rotated[1] is None:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid refresh_token"
+        )
+
+    token, new_token = rotated
     return TokenResponse(
-        access_token=access_token,
+        access_token=new_token["access_token"],
         token_type="Bearer",
         expires_in=1800,
-        refresh_token=new_refresh_token,
-        scope=token["scope"]
-    ) 
\ No newline at end of file
+        refresh_token=new_token["refresh_token"],
+        scope=token.scope
+    )
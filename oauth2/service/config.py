@@ -1,25 +1,195 @@
 from datetime import timedelta
+import hashlib
 import os
+import tempfile
 
 # Security
 SECRET_KEY = os.getenv("SECRET_KEY", "your-very-secure-secret-key-change-me")
+# HS256/HS384/HS512 sign with SECRET_KEY; RS256 and EdDSA sign with the key ring
+# below and publish its public keys at /.well-known/jwks.json
 ALGORITHM = os.getenv("ALGORITHM", "HS256")
 
+SIGNING_KEYS = {
+    "directory": os.getenv("SIGNING_KEYS_DIR", "service/keys"),
+    "reload_interval": float(os.getenv("SIGNING_KEYS_RELOAD_INTERVAL", "5")),  # Seconds between keyring.json checks
+    "jwks_max_age": int(os.getenv("JWKS_MAX_AGE", "3600")),  # Cache-Control max-age for the JWKS
+}
+
+# Public base URL of the provider; the discovery document's endpoints hang off it
+ISSUER = os.getenv("ISSUER", "http://localhost:8000").rstrip("/")
+DISCOVERY_MAX_AGE = int(os.getenv("DISCOVERY_MAX_AGE", "3600"))  # Cache-Control max-age for discovery
+
 # Token Expiration
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.getenv("ACCESS_TOKEN_EXPIRE_MINUTES", "30"))
 REFRESH_TOKEN_EXPIRE_DAYS = int(os.getenv("REFRESH_TOKEN_EXPIRE_DAYS", "7"))
 
+# Cores this process may run on; sched_getaffinity is Linux-only
+CPU_COUNT = len(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else os.cpu_count() or 1
+
+# Production launcher (python -m service.server)
+SERVER = {
+    "host": os.getenv("HOST", "0.0.0.0"),
+    "port": int(os.getenv("PORT", "8000")),
+    "workers": int(os.getenv("WEB_CONCURRENCY", str(CPU_COUNT))),
+    "graceful_timeout": float(os.getenv("GRACEFUL_TIMEOUT", "30")),  # Seconds to drain before SIGKILL
+    "heartbeat_interval": float(os.getenv("WORKER_HEARTBEAT_INTERVAL", "1")),
+}
+
+# Storage backend: "sqlite" (DB_FILE) or "memory" (process-local, for edge nodes and load tests)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "sqlite")
+
 # Database
 DB_FILE = os.getenv("DB_FILE", "service/oauth_provider.db")
 
+# Tokens, authorization codes and device codes can be spread over several
+# SQLite files to add write throughput; users and clients always stay in DB_FILE.
+# After changing DB_SHARDS, move existing rows with `python -m service.database.shards`.
+DB_SHARDS = int(os.getenv("DB_SHARDS", "1"))
+DB_SHARD_FILE = os.getenv("DB_SHARD_FILE", os.path.splitext(DB_FILE)[0] + ".shard{}.db")
+
+# Connection pool shared by the request handlers and standalone helpers
+DB_POOL = {
+    "size": int(os.getenv("DB_POOL_SIZE", "8")),
+    "timeout": float(os.getenv("DB_POOL_TIMEOUT", "5")),  # Seconds to wait for a free connection
+    "health_check_interval": float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30")),
+}
+
+# Applied to every pooled connection
+DB_PRAGMAS = {
+    "journal_mode": os.getenv("DB_JOURNAL_MODE", "WAL"),
+    "synchronous": os.getenv("DB_SYNCHRONOUS", "NORMAL"),
+    "busy_timeout": int(os.getenv("DB_BUSY_TIMEOUT_MS", "5000")),
+    "cache_size": int(os.getenv("DB_CACHE_SIZE", "-16000")),  # Negative means KiB
+    "temp_store": "MEMORY",
+}
+
+# Threads running database calls off the event loop. Writes get their own,
+# one per shard since SQLite admits one writer per file. Reads share the rest
+# of the connection pool, at most one thread per core: past that, threads only
+# contend for the GIL.
+DB_WRITER_WORKERS = int(os.getenv("DB_WRITER_WORKERS", str(DB_SHARDS)))
+DB_EXECUTOR_WORKERS = int(os.getenv(
+    "DB_EXECUTOR_WORKERS", str(max(1, min(DB_POOL["size"] - DB_WRITER_WORKERS, CPU_COUNT)))
+))
+
+# Where the sqlite backend keeps tokens: "sqlite" (the tokens table) or "log"
+# (append-only segment log with a memory-mapped index, one process per directory)
+TOKEN_STORE = {
+    "backend": os.getenv("TOKEN_STORE", "sqlite"),
+    "directory": os.getenv("TOKEN_LOG_DIR", "service/token_log"),
+    "segment_size": int(os.getenv("TOKEN_LOG_SEGMENT_MB", "64")) * 1024 * 1024,
+    "fsync": os.getenv("TOKEN_LOG_FSYNC", "false").lower() == "true",  # fsync every append
+}
+
 # Token Settings
 TOKEN_EXPIRATION = {
     "access_token": timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES),
     "refresh_token": timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
 }
 
+# "jwt" (self-contained, signed) or "opaque" (short random reference to the tokens row)
+ACCESS_TOKEN_FORMAT = os.getenv("ACCESS_TOKEN_FORMAT", "jwt")
+
+# Password hashes are computed on a process pool; calls beyond workers + max_queue get a 503
+PASSWORD_HASHING = {
+    "workers": int(os.getenv("PASSWORD_HASH_WORKERS", str(CPU_COUNT))),
+    "max_queue": int(os.getenv("PASSWORD_HASH_QUEUE", "32")),
+    "scheme": os.getenv("PASSWORD_HASH_SCHEME", "bcrypt"),  # bcrypt or argon2 (needs argon2-cffi)
+    # bcrypt log2 rounds or argon2 time_cost; unset uses the calibrated or passlib default cost
+    "rounds": int(os.getenv("PASSWORD_HASH_ROUNDS", "0")) or None,
+    "argon2_memory_kib": int(os.getenv("PASSWORD_HASH_ARGON2_MEMORY_KIB", "19456")),
+    "calibrate": os.getenv("PASSWORD_HASH_CALIBRATE", "false").lower() == "true",  # at startup
+    "target_ms": float(os.getenv("PASSWORD_HASH_TARGET_MS", "250")),  # per-hash budget for calibration
+}
+
+# Batched token introspection; asymmetric signature checks for batches of
+# parallel_threshold tokens or more are spread over the hashing workers
+INTROSPECTION = {
+    "max_batch": int(os.getenv("INTROSPECTION_MAX_BATCH", "1000")),
+    "parallel_threshold": int(os.getenv("INTROSPECTION_PARALLEL_THRESHOLD", "256")),
+}
+
+# Revoked access tokens: an in-process Bloom filter over revoked_tokens,
+# synced from the database every sync_interval seconds
+REVOCATION = {
+    "capacity": int(os.getenv("REVOCATION_FILTER_CAPACITY", "100000")),
+    "error_rate": float(os.getenv("REVOCATION_FILTER_ERROR_RATE", "0.001")),
+    "sync_interval": float(os.getenv("REVOCATION_SYNC_INTERVAL", "1")),
+    "rebuild_interval": float(os.getenv("REVOCATION_REBUILD_INTERVAL", "3600")),
+}
+
+# Verified userinfo responses, keyed by access token digest
+USERINFO_CACHE = {
+    "enabled": os.getenv("USERINFO_CACHE_ENABLED", "true").lower() == "true",
+    "max_entries": int(os.getenv("USERINFO_CACHE_SIZE", "10000")),
+    "max_ttl": float(os.getenv("USERINFO_CACHE_TTL", "300")),  # Seconds, also capped at the token's exp
+}
+
+# Token rows by access token digest. Deletions in this process evict at once;
+# max_ttl bounds how long another worker's deletion can go unnoticed
+TOKEN_CACHE = {
+    "enabled": os.getenv("TOKEN_CACHE_ENABLED", "true").lower() == "true",
+    "max_entries": int(os.getenv("TOKEN_CACHE_SIZE", "100000")),
+    "max_ttl": float(os.getenv("TOKEN_CACHE_TTL", "30")),
+}
+
+# Where state shared by every worker on the host is memory-mapped from
+SHARED_MEMORY_DIR = os.getenv(
+    "SHARED_MEMORY_DIR", "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+)
+
+
+def _shared_memory_file(name):
+    # Named after DB_FILE, so unrelated deployments on one host never map the same file
+    digest = hashlib.blake2b(os.path.abspath(DB_FILE).encode(), digest_size=4).hexdigest()
+    return os.path.join(SHARED_MEMORY_DIR, f"oauth2_{name}_{digest}")
+
+
+# Token buckets shared by every worker on the host through a memory-mapped file
+RATE_LIMIT = {
+    "enabled": os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true",
+    "file": os.getenv("RATE_LIMIT_FILE", _shared_memory_file("rate_limit")),
+    # Buckets tracked at once, 24 bytes each; every process mapping the file must agree
+    "slots": int(os.getenv("RATE_LIMIT_SLOTS", "65536")),
+    # Take the client address from X-Forwarded-For; only behind a proxy that sets it
+    "trust_forwarded_for": os.getenv("RATE_LIMIT_TRUST_FORWARDED_FOR", "false").lower() == "true",
+}
+
+# "METHOD path" -> {"ip" and/or "client": (requests per second, burst)}.
+# Client ids come from HTTP Basic, the query string or a form or JSON body
+RATE_LIMIT_POLICIES = {
+    "POST /oauth2/login": {"ip": (0.5, 10)},
+    "POST /oauth2/users/register": {"ip": (0.2, 5)},
+    "POST /oauth2/token": {"ip": (10, 50), "client": (50, 200)},
+    "POST /device/token": {"ip": (5, 50)},
+}
+
+# Expired row cleanup
+REAPER = {
+    "enabled": os.getenv("REAPER_ENABLED", "true").lower() == "true",
+    "interval": float(os.getenv("REAPER_INTERVAL", "300")),  # Seconds between runs
+    "batch_size": int(os.getenv("REAPER_BATCH_SIZE", "500")),  # Rows deleted per transaction
+    "batch_pause": float(os.getenv("REAPER_BATCH_PAUSE", "0.05"))  # Seconds between batches
+}
+
 # Device Flow Settings
 DEVICE_FLOW = {
     "verification_uri": "http://localhost:8000/device",
-    "interval": 5  # Polling interval in seconds
+    "interval": 5,  # Polling interval in seconds
+    # RFC 8628 slow_down: a poll sooner than the interval (less the leeway)
+    # is refused and raises that device's interval by slow_down_step
+    "slow_down_step": int(os.getenv("DEVICE_SLOW_DOWN_STEP", "5")),
+    "poll_leeway": float(os.getenv("DEVICE_POLL_LEEWAY", "0.5")),
+    # Last polls are shared by every worker on the host through this file
+    "poll_tracker_file": os.getenv("DEVICE_POLL_TRACKER_FILE", _shared_memory_file("device_polls")),
+    "poll_tracker_ttl": float(os.getenv("DEVICE_POLL_TRACKER_TTL", "300")),
+    "poll_tracker_size": int(os.getenv("DEVICE_POLL_TRACKER_SIZE", "100000")),  # Slots, 24 bytes each
+    # Seconds a pending token request waits for approval before answering
+    # authorization_pending; 0 answers at once
+    "long_poll_timeout": float(os.getenv("DEVICE_LONG_POLL_TIMEOUT", "0")),
+    # How approvals reach waiters: "local" (this process only), "database"
+    # (each worker polls the device codes it has waiters for) or the dotted
+    # path of a notifier class; defaults to "database" with several workers
+    "notifier": os.getenv("DEVICE_NOTIFIER", "database" if SERVER["workers"] > 1 else "local"),
+    "notifier_interval": float(os.getenv("DEVICE_NOTIFIER_INTERVAL", "0.5")),
 } 
\ No newline at end of file
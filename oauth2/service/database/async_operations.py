@@ -0,0 +1,137 @@
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from service.config import DB_EXECUTOR_WORKERS, DB_WRITER_WORKERS, TOKEN_CACHE
+from service.database import events
+from service.storage import get_storage
+from service.utils.hashing import password_hasher
+from service.utils.security import token_digest
+from service.utils.token_cache import token_cache
+
+# Blocking backends (SQLite) run on dedicated threads instead of the event loop;
+# non-blocking ones (in-memory) are called inline. SQLite admits one writer per
+# file, so writes queue on their own threads rather than sleeping in its busy
+# handler while holding a reader's thread and connection.
+_executor = ThreadPoolExecutor(max_workers=DB_EXECUTOR_WORKERS, thread_name_prefix="db")
+_writer = ThreadPoolExecutor(max_workers=DB_WRITER_WORKERS, thread_name_prefix="db-writer")
+
+
+async def run_db(func, *args, **kwargs):
+    """Run a blocking callable on the database executor."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_executor, functools.partial(func, *args, **kwargs))
+
+
+async def run_db_write(func, *args, **kwargs):
+    """Run a blocking callable that writes on the database writer threads."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_writer, functools.partial(func, *args, **kwargs))
+
+
+def shutdown():
+    _executor.shutdown(wait=True)
+    _writer.shutdown(wait=True)
+
+
+def _awaitable(name, write=False):
+    run = run_db_write if write else run_db
+
+    async def wrapper(*args, **kwargs):
+        storage = get_storage()
+        method = getattr(storage, name)
+        if storage.blocking:
+            return await run(method, *args, **kwargs)
+        return method(*args, **kwargs)
+    wrapper.__name__ = wrapper.__qualname__ = name
+    return wrapper
+
+
+validate_redirect_uri = _awaitable("validate_redirect_uri")
+get_client = _awaitable("get_client")
+get_client_credentials = _awaitable("get_client_credentials")
+create_client = _awaitable("create_client", write=True)
+get_user = _awaitable("get_user")
+get_user_by_id = _awaitable("get_user_by_id")
+get_users_by_id = _awaitable("get_users_by_id")
+list_users = _awaitable("list_users")
+create_user = _awaitable("create_user", write=True)
+_update_password_hash = _awaitable("update_password_hash", write=True)
+create_authorization_code = _awaitable("create_authorization_code", write=True)
+get_authorization_code = _awaitable("get_authorization_code")
+delete_authorization_code = _awaitable("delete_authorization_code", write=True)
+redeem_authorization_code = _awaitable("redeem_authorization_code", write=True)
+create_token = _awaitable("create_token", write=True)
+get_token_by_refresh_token = _awaitable("get_token_by_refresh_token")
+create_device_code = _awaitable("create_device_code", write=True)
+get_device_code = _awaitable("get_device_code")
+get_device_codes = _awaitable("get_device_codes")
+get_device_code_by_user_code = _awaitable("get_device_code_by_user_code")
+approve_device_code = _awaitable("approve_device_code", write=True)
+delete_expired = _awaitable("delete_expired", write=True)
+
+is_token_revoked = _awaitable("is_token_revoked")
+list_revoked_tokens = _awaitable("list_revoked_tokens")
+
+_get_tokens = _awaitable("get_tokens")
+_revoke_token = _awaitable("revoke_token", write=True)
+_delete_token = _awaitable("delete_token", write=True)
+_rotate_refresh_token = _awaitable("rotate_refresh_token", write=True)
+
+
+async def get_tokens(access_tokens):
+    if not TOKEN_CACHE["enabled"]:
+        return await _get_tokens(access_tokens)
+    digests = [token_digest(access_token) for access_token in access_tokens]
+    records = [token_cache.get(digest) for digest in digests]
+    missing = [position for position, record in enumerate(records) if record is None]
+    if missing:
+        found = await _get_tokens([access_tokens[position] for position in missing])
+        for position, record in zip(missing, found):
+            if record is not None:
+                exp = datetime.fromisoformat(record.expires_at).timestamp()
+                token_cache.put(digests[position], exp, None, record)
+                records[position] = record
+    return records
+
+
+async def get_token(access_token):
+    return (await get_tokens([access_token]))[0]
+
+
+async def revoke_token(record):
+    """Record ``record``'s access token as revoked; the caller deletes its row afterwards"""
+    await _revoke_token(record.access_token_hash, record.expires_at)
+    events.publish(events.TOKEN_REVOKED, record.access_token_hash)
+
+
+async def delete_token(access_token):
+    await _delete_token(access_token)
+    events.publish(events.TOKEN_DELETED, token_digest(access_token))
+
+
+async def rotate_refresh_token(refresh_token, issue):
+    result = await _rotate_refresh_token(refresh_token, issue)
+    if result is not None:
+        events.publish(events.TOKEN_DELETED, result[0].access_token_hash)
+    return result
+
+
+async def update_password_hash(user_id, hashed_password):
+    await _update_password_hash(user_id, hashed_password)
+    events.publish(events.USER_UPDATED, user_id)
+
+
+async def authenticate_user(username: str, password: str):
+    user = await get_user(username)
+    if user is None:
+        return None
+    valid, new_hash = await password_hasher.verify_and_update(password, user.hashed_password)
+    if not valid:
+        return None
+    if new_hash is not None:
+        # Old scheme or below the configured cost: upgrade while we have the password
+        await update_password_hash(user.id, new_hash)
+        user = user._replace(hashed_password=new_hash)
+    return user
@@ -0,0 +1,111 @@
+"""Wake-ups for device token requests that long-poll for approval.
+
+With DEVICE_FLOW["long_poll_timeout"] set, a pending token request waits on
+an asyncio.Event keyed by its device_code instead of answering
+authorization_pending at once, and approving the code sets the event. The
+notifier decides how approvals made by other workers get here: "local" only
+sees this process, "database" also asks storage which of the device codes
+waited on here are approved, one batched lookup every
+DEVICE_FLOW["notifier_interval"] seconds however many devices are waiting.
+Any other value is the dotted path of a notifier class, built with the
+waiters and expected to provide publish(device_code) and start() like
+LocalNotifier.
+"""
+import asyncio
+import importlib
+import logging
+
+from service.config import DEVICE_FLOW
+from service.database import events
+from service.database.async_operations import get_device_codes
+
+logger = logging.getLogger(__name__)
+
+
+class DeviceWaiters:
+    def __init__(self):
+        self._events = {}  # device_code -> [event, number of waiters]
+
+    def waiting(self):
+        return list(self._events)
+
+    def notify(self, device_code):
+        entry = self._events.get(device_code)
+        if entry is not None:
+            entry[0].set()
+
+    async def wait(self, device_code, timeout):
+        """True if ``device_code`` was approved within ``timeout`` seconds."""
+        entry = self._events.setdefault(device_code, [asyncio.Event(), 0])
+        entry[1] += 1
+        try:
+            await asyncio.wait_for(entry[0].wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._events[device_code]
+
+
+class LocalNotifier:
+    """Delivers approvals to waiters in this process only."""
+
+    def __init__(self, waiters):
+        self.waiters = waiters
+
+    def publish(self, device_code):
+        self.waiters.notify(device_code)
+
+    def start(self):
+        return None
+
+
+class DatabaseNotifier(LocalNotifier):
+    """Also picks up approvals made by other workers from storage."""
+
+    def __init__(self, waiters, interval=DEVICE_FLOW["notifier_interval"]):
+        super().__init__(waiters)
+        self.interval = interval
+
+    async def run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            device_codes = self.waiters.waiting()
+            if not device_codes:
+                continue
+            try:
+                for record in await get_device_codes(device_codes):
+                    if record is not None and record.is_approved:
+                        self.waiters.notify(record.device_code)
+            except Exception:
+                logger.exception("Device approval poll failed")
+
+    def start(self):
+        return asyncio.get_running_loop().create_task(self.run(), name="device-notifier")
+
+
+def create_notifier(waiters, name=None):
+    name = name or DEVICE_FLOW["notifier"]
+    if name == "local":
+        return LocalNotifier(waiters)
+    if name == "database":
+        return DatabaseNotifier(waiters)
+    module, _, attr = name.rpartition(".")
+    try:
+        notifier_class = getattr(importlib.import_module(module), attr)
+    except (ValueError, ImportError, AttributeError) as e:
+        raise ValueError(f"Unknown device notifier '{name}'") from e
+    return notifier_class(waiters)
+
+
+device_waiters = DeviceWaiters()
+device_notifier = create_notifier(device_waiters)
+events.subscribe(events.DEVICE_APPROVED, device_notifier.publish)
+
+
+def start_device_notifier():
+    if DEVICE_FLOW["long_poll_timeout"] <= 0:
+        return None
+    return device_notifier.start()
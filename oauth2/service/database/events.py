@@ -0,0 +1,23 @@
+"""In-process notifications about data changes that caches depend on.
+
+Handlers run synchronously in the publishing thread and only see changes
+made by this process.
+"""
+from collections import defaultdict
+
+TOKEN_DELETED = "token_deleted"  # (access_token_hash,)
+TOKEN_REVOKED = "token_revoked"  # (access_token_hash,)
+USER_UPDATED = "user_updated"  # (user_id,)
+DEVICE_APPROVED = "device_approved"  # (device_code,)
+
+_handlers = defaultdict(list)
+
+
+def subscribe(event, handler):
+    _handlers[event].append(handler)
+    return handler
+
+
+def publish(event, *args):
+    for handler in _handlers[event]:
+        handler(*args)
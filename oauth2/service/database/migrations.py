@@ -0,0 +1,333 @@
+"""Versioned schema migrations tracked with PRAGMA user_version.
+
+    python -m service.database.migrations [--online] [--status] [db_path]
+
+Regular migrations run at startup inside one transaction each. Migrations
+marked online (index builds on tables that may be large) only run on a fresh
+database or when requested with --online, so a deploy never starts a long
+index build implicitly. A pending online migration does not hold back the
+regular ones after it: it is recorded in deferred_migrations and the version
+moves past it, so online migrations must not depend on later schema changes.
+"""
+import argparse
+import logging
+import os
+import sqlite3
+import sys
+from typing import Callable, NamedTuple
+
+from service.config import DB_FILE, TOKEN_EXPIRATION
+from service.database.models import get_index_definitions
+from service.utils.security import token_digest
+
+logger = logging.getLogger(__name__)
+
+
+class Migration(NamedTuple):
+    version: int
+    name: str
+    apply: Callable[[sqlite3.Connection], None]
+    online: bool = False
+
+
+# Indexes as of migration 3; later indexes belong to the migration that adds
+# their table or column
+_TOKEN_INDEXES = ("idx_tokens_expires_at", "idx_tokens_client_id", "idx_tokens_user_id")
+_SECONDARY_INDEXES = (
+    "idx_authorization_codes_expires_at",
+    "idx_device_codes_expires_at",
+    "idx_authorization_codes_client_id",
+    "idx_device_codes_client_id",
+) + _TOKEN_INDEXES
+
+
+# The schema as it stood before migrations were versioned, frozen here so
+# that every database, fresh or upgraded, goes through the same migrations.
+# Never edit these; add a migration and update models.py instead.
+_BASELINE_TABLES = (
+    """
+    CREATE TABLE IF NOT EXISTS users (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE NOT NULL,
+        hashed_password TEXT NOT NULL,
+        email TEXT UNIQUE,
+        is_active BOOLEAN DEFAULT TRUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS clients (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        client_id TEXT UNIQUE NOT NULL,
+        client_secret TEXT NOT NULL,
+        redirect_uris TEXT,
+        name TEXT NOT NULL,
+        client_type TEXT CHECK(client_type IN ('public', 'confidential')) NOT NULL,
+        is_active BOOLEAN DEFAULT TRUE
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS authorization_codes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        code TEXT UNIQUE NOT NULL,
+        client_id TEXT NOT NULL,
+        redirect_uri TEXT,
+        user_id INTEGER NOT NULL,
+        expires_at DATETIME NOT NULL,
+        scope TEXT,
+        code_challenge TEXT,
+        code_challenge_method TEXT
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS tokens (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        access_token TEXT UNIQUE NOT NULL,
+        refresh_token TEXT UNIQUE,
+        token_type TEXT DEFAULT 'Bearer',
+        expires_at DATETIME NOT NULL,
+        scope TEXT,
+        client_id TEXT NOT NULL,
+        user_id INTEGER NOT NULL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS device_codes (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        device_code TEXT UNIQUE NOT NULL,
+        user_code TEXT UNIQUE NOT NULL,
+        client_id TEXT NOT NULL,
+        scope TEXT,
+        expires_at DATETIME NOT NULL,
+        user_id INTEGER,
+        verification_uri TEXT NOT NULL,
+        interval INTEGER DEFAULT 5,
+        is_approved BOOLEAN DEFAULT FALSE
+    )
+    """,
+)
+
+
+def _create_tables(db):
+    for table_def in _BASELINE_TABLES:
+        db.execute(table_def)
+
+
+def _key_tokens_by_digest(db):
+    # Databases created before tokens were stored as SHA-256 digests
+    columns = {row[1] for row in db.execute("PRAGMA table_info(tokens)")}
+    if "access_token" not in columns:
+        return
+    db.create_function(
+        "token_digest", 1,
+        lambda token: token_digest(token) if token is not None else None,
+        deterministic=True
+    )
+    db.execute("""
+        CREATE TABLE tokens_digest (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            access_token_hash BLOB UNIQUE NOT NULL,
+            refresh_token_hash BLOB UNIQUE,
+            token_type TEXT DEFAULT 'Bearer',
+            expires_at DATETIME NOT NULL,
+            scope TEXT,
+            client_id TEXT NOT NULL,
+            user_id INTEGER
+        )
+    """)
+    db.execute("""
+        INSERT INTO tokens_digest
+            (id, access_token_hash, refresh_token_hash, token_type, expires_at, scope, client_id, user_id)
+        SELECT id, token_digest(access_token), token_digest(refresh_token), token_type, expires_at, scope, client_id, user_id
+        FROM tokens
+    """)
+    db.execute("DROP TABLE tokens")
+    db.execute("ALTER TABLE tokens_digest RENAME TO tokens")
+    # Dropping the old table dropped its indexes; the rows are being rewritten
+    # anyway, so rebuild them now rather than waiting for an online migration
+    index_definitions = get_index_definitions()
+    for name in _TOKEN_INDEXES:
+        db.execute(index_definitions[name])
+
+
+def _create_indexes(db):
+    # One short write transaction per index rather than one long one
+    index_definitions = get_index_definitions()
+    for name in _SECONDARY_INDEXES:
+        db.execute("BEGIN IMMEDIATE")
+        db.execute(index_definitions[name])
+        db.execute("COMMIT")
+
+
+def _create_revoked_tokens(db):
+    db.execute("""
+        CREATE TABLE IF NOT EXISTS revoked_tokens (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            token_hash BLOB UNIQUE NOT NULL,
+            expires_at DATETIME NOT NULL
+        )
+    """)
+    # The table is new and empty, so its index is cheap to build here
+    db.execute(get_index_definitions()["idx_revoked_tokens_expires_at"])
+
+
+def _add_refresh_expiry(db):
+    columns = {row[1] for row in db.execute("PRAGMA table_info(tokens)")}
+    if "refresh_expires_at" in columns:
+        return
+    db.execute("ALTER TABLE tokens ADD COLUMN refresh_expires_at DATETIME")
+    # Existing refresh tokens were issued with the access token, so they
+    # expire the configured difference in lifetimes after it
+    extension = (TOKEN_EXPIRATION["refresh_token"] - TOKEN_EXPIRATION["access_token"]).total_seconds()
+    db.execute(
+        """UPDATE tokens SET refresh_expires_at = CASE
+               WHEN refresh_token_hash IS NULL THEN expires_at
+               ELSE datetime(expires_at, ?)
+           END""",
+        (f"+{int(extension)} seconds",)
+    )
+
+
+def _create_refresh_expiry_index(db):
+    db.execute(get_index_definitions()["idx_tokens_refresh_expires_at"])
+
+
+MIGRATIONS = [
+    Migration(1, "create tables", _create_tables),
+    Migration(2, "key tokens by SHA-256 digest", _key_tokens_by_digest),
+    Migration(3, "secondary indexes on expires_at, client_id and user_id", _create_indexes, online=True),
+    Migration(4, "revoked token digests", _create_revoked_tokens),
+    Migration(5, "separate refresh token expiry", _add_refresh_expiry),
+    Migration(6, "index on tokens.refresh_expires_at", _create_refresh_expiry_index, online=True),
+]
+
+LATEST_VERSION = MIGRATIONS[-1].version
+
+
+def current_version(db):
+    return db.execute("PRAGMA user_version").fetchone()[0]
+
+
+def _is_empty(db):
+    return db.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table'").fetchone()[0] == 0
+
+
+def _deferred(db):
+    """Versions of online migrations that were skipped over and still need applying"""
+    exists = db.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'deferred_migrations'"
+    ).fetchone()
+    if not exists:
+        return set()
+    return {row[0] for row in db.execute("SELECT version FROM deferred_migrations")}
+
+
+def _record(db, migration, deferred):
+    if deferred:
+        db.execute("DELETE FROM deferred_migrations WHERE version = ?", (migration.version,))
+    else:
+        db.execute(f"PRAGMA user_version = {migration.version}")
+
+
+def _defer(db, migration):
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        db.execute("CREATE TABLE IF NOT EXISTS deferred_migrations (version INTEGER PRIMARY KEY)")
+        db.execute("INSERT OR IGNORE INTO deferred_migrations (version) VALUES (?)", (migration.version,))
+        db.execute(f"PRAGMA user_version = {migration.version}")
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+
+
+def _apply(db, migration, deferred=False):
+    if migration.online:
+        # Online migrations manage their own transactions
+        migration.apply(db)
+        _record(db, migration, deferred)
+        return
+    db.execute("BEGIN IMMEDIATE")
+    try:
+        migration.apply(db)
+        _record(db, migration, deferred)
+        db.execute("COMMIT")
+    except BaseException:
+        db.execute("ROLLBACK")
+        raise
+
+
+def pending(db_path=DB_FILE):
+    if not os.path.exists(db_path):
+        return list(MIGRATIONS)
+    db = sqlite3.connect(db_path)
+    try:
+        version = current_version(db)
+        deferred = _deferred(db)
+    finally:
+        db.close()
+    return [migration for migration in MIGRATIONS if migration.version > version or migration.version in deferred]
+
+
+def migrate(db_path=DB_FILE, online=False):
+    """Bring ``db_path`` up to date and return the migrations applied.
+
+    When the stored version already matches and ``online`` is not set, this
+    is a single PRAGMA read.
+    """
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db = sqlite3.connect(db_path, isolation_level=None)
+    try:
+        version = current_version(db)
+        if version >= LATEST_VERSION and not online:
+            return []
+        deferred = _deferred(db)
+        online = online or (version == 0 and _is_empty(db))
+        applied = []
+        for migration in MIGRATIONS:
+            was_deferred = migration.version in deferred
+            if migration.version <= version and not was_deferred:
+                continue
+            if migration.online and not online:
+                if not was_deferred:
+                    _defer(db, migration)
+                logger.warning(
+                    "Migration %d (%s) is pending; apply it with "
+                    "`python -m service.database.migrations --online %s`",
+                    migration.version, migration.name, db_path
+                )
+                continue
+            _apply(db, migration, was_deferred)
+            applied.append(migration)
+            logger.info("Applied migration %d to %s: %s", migration.version, db_path, migration.name)
+        return applied
+    finally:
+        db.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply schema migrations")
+    parser.add_argument("db_path", nargs="?", default=DB_FILE)
+    parser.add_argument("--online", action="store_true", help="also apply online (index build) migrations")
+    parser.add_argument("--status", action="store_true", help="list pending migrations and exit")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        for migration in pending(args.db_path):
+            print(f"pending {migration.version}: {migration.name}{' (online)' if migration.online else ''}")
+        return 0
+
+    applied = migrate(args.db_path, online=args.online)
+    for migration in applied:
+        print(f"Applied migration {migration.version}: {migration.name}")
+    remaining = pending(args.db_path)
+    if remaining:
+        print(f"{len(remaining)} online migration(s) pending, rerun with --online")
+    elif not applied:
+        print(f"{args.db_path} is up to date (version {LATEST_VERSION})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
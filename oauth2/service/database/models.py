@@ -36,13 +36,14 @@ def get_table_definitions():
         "tokens": """
             CREATE TABLE IF NOT EXISTS tokens (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
-                access_token TEXT UNIQUE NOT NULL,
-                refresh_token TEXT UNIQUE,
+                access_token_hash BLOB UNIQUE NOT NULL,
+                refresh_token_hash BLOB UNIQUE,
                 token_type TEXT DEFAULT 'Bearer',
                 expires_at DATETIME NOT NULL,
                 scope TEXT,
                 client_id TEXT NOT NULL,
-                user_id INTEGER NOT NULL
+                user_id INTEGER,
+                refresh_expires_at DATETIME
             )
         """,
         "device_codes": """
@@ -58,5 +59,53 @@ def get_table_definitions():
                 interval INTEGER DEFAULT 5,
                 is_approved BOOLEAN DEFAULT FALSE
             )
+        """,
+        "revoked_tokens": """
+            CREATE TABLE IF NOT EXISTS revoked_tokens (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                token_hash BLOB UNIQUE NOT NULL,
+                expires_at DATETIME NOT NULL
+            )
+        """
+    }
+
+
+def get_index_definitions():
+    return {
+        "idx_authorization_codes_expires_at": """
+            CREATE INDEX IF NOT EXISTS idx_authorization_codes_expires_at
+            ON authorization_codes (expires_at)
+        """,
+        "idx_tokens_expires_at": """
+            CREATE INDEX IF NOT EXISTS idx_tokens_expires_at
+            ON tokens (expires_at)
+        """,
+        "idx_device_codes_expires_at": """
+            CREATE INDEX IF NOT EXISTS idx_device_codes_expires_at
+            ON device_codes (expires_at)
+        """,
+        "idx_authorization_codes_client_id": """
+            CREATE INDEX IF NOT EXISTS idx_authorization_codes_client_id
+            ON authorization_codes (client_id)
+        """,
+        "idx_tokens_client_id": """
+            CREATE INDEX IF NOT EXISTS idx_tokens_client_id
+            ON tokens (client_id)
+        """,
+        "idx_tokens_user_id": """
+            CREATE INDEX IF NOT EXISTS idx_tokens_user_id
+            ON tokens (user_id)
+        """,
+        "idx_device_codes_client_id": """
+            CREATE INDEX IF NOT EXISTS idx_device_codes_client_id
+            ON device_codes (client_id)
+        """,
+        "idx_tokens_refresh_expires_at": """
+            CREATE INDEX IF NOT EXISTS idx_tokens_refresh_expires_at
+            ON tokens (refresh_expires_at)
+        """,
+        "idx_revoked_tokens_expires_at": """
+            CREATE INDEX IF NOT EXISTS idx_revoked_tokens_expires_at
+            ON revoked_tokens (expires_at)
         """
-    } 
\ No newline at end of file
+    }
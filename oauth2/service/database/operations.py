@@ -1,70 +1,140 @@
-import os
-import sqlite3
+import logging
 import threading
 from datetime import datetime, timedelta
 from contextlib import contextmanager
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.ext.declarative import declarative_base
 
-from service.config import DB_FILE
-from service.utils.security import verify_password
+from service.config import DB_FILE, DB_POOL, DB_PRAGMAS
+from service.database.migrations import migrate
+from service.database.pool import ConnectionPool
+from service.database.shards import init_shards
+from service.database.records import (
+    ClientRecord, ClientCredentials, UserCredentials, UserProfile, UserSummary,
+    AuthorizationCodeRecord, TokenRecord, DeviceCodeRecord
+)
+from service.utils.security import token_digest
 
-local_storage = threading.local()
+logger = logging.getLogger(__name__)
 
-Base = declarative_base()
+_pool = None
+_pool_lock = threading.Lock()
 
-def get_db():
-    if not hasattr(local_storage, 'connection'):
-        local_storage.connection = sqlite3.connect(DB_FILE, check_same_thread=False)
-        local_storage.connection.row_factory = sqlite3.Row
-    return local_storage.connection
+def get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool(DB_FILE, pragmas=DB_PRAGMAS, **DB_POOL)
+    return _pool
 
 def close_db():
-    if hasattr(local_storage, 'connection'):
-        local_storage.connection.close()
-        del local_storage.connection
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
 
-def init_db(db_path="service/oauth_provider.db"):
-    os.makedirs(os.path.dirname(db_path), exist_ok=True)
-    
-    engine = create_engine(f"sqlite:///{db_path}")
-    Base.metadata.create_all(engine)
-    return sessionmaker(bind=engine)()
+def _select(record, table, where=None):
+    query = f"SELECT {', '.join(record._fields)} FROM {table}"
+    return f"{query} WHERE {where}" if where else query
+
+def _fetch_one(db, record, query, params):
+    row = db.execute(query, params).fetchone()
+    return record._make(row) if row else None
+
+# Keys per IN (...) query; older SQLite builds allow at most 999 parameters
+_IN_CHUNK = 500
+
+def _fetch_in(db, record, table, column, keys):
+    rows = []
+    for start in range(0, len(keys), _IN_CHUNK):
+        chunk = keys[start:start + _IN_CHUNK]
+        query = _select(record, table, f"{column} IN ({', '.join('?' * len(chunk))})")
+        rows.extend(record._make(row) for row in db.execute(query, chunk))
+    return rows
+
+# Per-call-site projections, built once at import time
+_GET_CLIENT = _select(ClientRecord, "clients", "client_id = ?")
+_GET_CLIENT_CREDENTIALS = _select(ClientCredentials, "clients", "client_id = ?")
+_GET_USER = _select(UserCredentials, "users", "username = ?")
+_GET_USER_BY_ID = _select(UserProfile, "users", "id = ?")
+_LIST_USERS = _select(UserSummary, "users")
+_GET_AUTHORIZATION_CODE = _select(AuthorizationCodeRecord, "authorization_codes", "code = ?")
+_GET_TOKEN = _select(TokenRecord, "tokens", "access_token_hash = ?")
+_GET_TOKEN_BY_REFRESH_TOKEN = _select(TokenRecord, "tokens", "refresh_token_hash = ?")
+_CONSUME_AUTHORIZATION_CODE = (
+    f"DELETE FROM authorization_codes WHERE code = ? RETURNING {', '.join(AuthorizationCodeRecord._fields)}"
+)
+_CONSUME_REFRESH_TOKEN = (
+    f"DELETE FROM tokens WHERE refresh_token_hash = ? RETURNING {', '.join(TokenRecord._fields)}"
+)
+_GET_DEVICE_CODE = _select(DeviceCodeRecord, "device_codes", "device_code = ?")
+_GET_DEVICE_CODE_BY_USER_CODE = _select(DeviceCodeRecord, "device_codes", "user_code = ?")
+
+def init_db(db_path=DB_FILE):
+    applied = migrate(db_path)
+    init_shards()
+    return applied
 
 def validate_redirect_uri(client_id, redirect_uri, db):
-    cursor = db.cursor()
-    cursor.execute("SELECT redirect_uris FROM clients WHERE client_id = ?", (client_id,))
-    client = cursor.fetchone()
-    if not client:
+    row = db.execute("SELECT redirect_uris FROM clients WHERE client_id = ?", (client_id,)).fetchone()
+    if not row:
         return False
-    allowed_uris = client["redirect_uris"].split(",") if client["redirect_uris"] else []
+    return is_redirect_uri_allowed(row[0], redirect_uri)
+
+def is_redirect_uri_allowed(redirect_uris, redirect_uri):
+    allowed_uris = redirect_uris.split(",") if redirect_uris else []
     return redirect_uri in allowed_uris
 
 def get_client(client_id, db):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM clients WHERE client_id = ?", (client_id,))
-    return cursor.fetchone()
+    return _fetch_one(db, ClientRecord, _GET_CLIENT, (client_id,))
+
+def get_client_credentials(client_id, db):
+    return _fetch_one(db, ClientCredentials, _GET_CLIENT_CREDENTIALS, (client_id,))
 
 def get_user(username, db):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-    return cursor.fetchone()
+    return _fetch_one(db, UserCredentials, _GET_USER, (username,))
 
 def get_user_by_id(id, db):
+    return _fetch_one(db, UserProfile, _GET_USER_BY_ID, (id,))
+
+def get_users_by_id(ids, db):
+    """UserProfiles for ``ids`` in order, None for unknown ids"""
+    users = {user.id: user for user in _fetch_in(db, UserProfile, "users", "id", list(set(ids)))}
+    return [users.get(id) for id in ids]
+
+def list_users(db):
+    rows = db.execute(_LIST_USERS).fetchall()
+    return [UserSummary._make(row) for row in rows]
+
+def create_user(username, hashed_password, email, db):
     cursor = db.cursor()
-    cursor.execute("SELECT * FROM users WHERE id = ?", (id,))
-    return cursor.fetchone()
+    cursor.execute(
+        """INSERT INTO users 
+           (username, hashed_password, email)
+           VALUES (?, ?, ?)""",
+        (username, hashed_password, email)
+    )
+    db.commit()
+    return cursor.lastrowid
 
-def authenticate_user(username: str, password: str, db):
-    user = get_user(username, db)
-    if user and verify_password(password, user["hashed_password"]):
-        return user
-    return None
+def update_password_hash(id, hashed_password, db):
+    db.execute("UPDATE users SET hashed_password = ? WHERE id = ?", (hashed_password, id))
+    db.commit()
+
+def create_client(client_id, client_secret, redirect_uris, name, client_type, db):
+    cursor = db.cursor()
+    cursor.execute(
+        """INSERT INTO clients 
+           (client_id, client_secret, redirect_uris, name, client_type)
+           VALUES (?, ?, ?, ?, ?)""",
+        (client_id, client_secret, redirect_uris, name, client_type)
+    )
+    db.commit()
+    return cursor.lastrowid
 
-def create_authorization_code(client_id, redirect_uri, user_id, scope, code_challenge, code_challenge_method, db):
+def create_authorization_code(client_id, redirect_uri, user_id, scope, code_challenge, code_challenge_method, db, code=None):
     from service.utils.security import generate_token
-    code = generate_token()
+    code = code or generate_token()
     expires_at = datetime.now() + timedelta(minutes=10)
     
     cursor = db.cursor()
@@ -78,40 +148,112 @@ def create_authorization_code(client_id, redirect_uri, user_id, scope, code_chal
     return code
 
 def get_authorization_code(code, db):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM authorization_codes WHERE code = ?", (code,))
-    return cursor.fetchone()
+    return _fetch_one(db, AuthorizationCodeRecord, _GET_AUTHORIZATION_CODE, (code,))
 
 def delete_authorization_code(code, db):
     cursor = db.cursor()
     cursor.execute("DELETE FROM authorization_codes WHERE code = ?", (code,))
     db.commit()
 
-def create_token(access_token, refresh_token, token_type, expires_at, scope, client_id, user_id, db):
-    cursor = db.cursor()
-    cursor.execute(
+def _consume_and_issue(db, query, key, record, issue, store_token=True):
+    # DELETE ... RETURNING claims the row; the issued token is inserted in the
+    # same transaction, so one commit covers both and a concurrent redemption
+    # of the same key finds nothing to delete.
+    try:
+        rows = db.execute(query, (key,)).fetchall()
+        if not rows:
+            db.rollback()
+            return None
+        consumed = record._make(rows[0])
+        token = issue(consumed)
+        if token is not None and store_token:
+            _insert_token(db, **token)
+        db.commit()
+        return consumed, token
+    except BaseException:
+        db.rollback()
+        raise
+
+def redeem_authorization_code(code, issue, db, store_token=True):
+    """Consume ``code`` and store the token issued for it in one transaction.
+
+    ``issue`` gets the consumed AuthorizationCodeRecord and returns the
+    create_token arguments, or None to consume the code without issuing a
+    token. If it raises, nothing is committed and the code stays valid.
+    It runs while the write lock is held, so it should only compare the
+    consumed row with one read beforehand; sign the token before calling.
+    Returns ``(auth_code, token)``, or None if the code does not exist.
+    With ``store_token=False`` only the code is consumed and the caller
+    stores the token elsewhere.
+    """
+    return _consume_and_issue(db, _CONSUME_AUTHORIZATION_CODE, code, AuthorizationCodeRecord, issue, store_token)
+
+def rotate_refresh_token(refresh_token, issue, db, store_token=True):
+    """Replace the token row owning ``refresh_token`` with the one ``issue`` returns.
+
+    Same contract as redeem_authorization_code, with the old TokenRecord
+    passed to ``issue``.
+    """
+    return _consume_and_issue(
+        db, _CONSUME_REFRESH_TOKEN, token_digest(refresh_token), TokenRecord, issue, store_token
+    )
+
+def _insert_token(db, access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id):
+    # Only digests are stored; the raw tokens never reach the database
+    db.execute(
         """INSERT INTO tokens 
-           (access_token, refresh_token, token_type, expires_at, scope, client_id, user_id)
-           VALUES (?, ?, ?, ?, ?, ?, ?)""",
-        (access_token, refresh_token, token_type, expires_at, scope, client_id, user_id)
+           (access_token_hash, refresh_token_hash, token_type, expires_at, refresh_expires_at, scope, client_id, user_id)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+        (
+            token_digest(access_token),
+            token_digest(refresh_token) if refresh_token is not None else None,
+            token_type, expires_at, refresh_expiry(refresh_token, expires_at, refresh_expires_at),
+            scope, client_id, user_id
+        )
     )
+
+def refresh_expiry(refresh_token, expires_at, refresh_expires_at):
+    """When the row stops being useful: the later of the two expiries, or
+    expires_at alone for a token without a refresh token"""
+    if refresh_token is None or refresh_expires_at is None:
+        return expires_at
+    return max(expires_at, refresh_expires_at)
+
+def create_token(access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id, db):
+    _insert_token(db, access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id)
     db.commit()
 
 def get_token(access_token, db):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM tokens WHERE access_token = ?", (access_token,))
-    return cursor.fetchone()
+    return _fetch_one(db, TokenRecord, _GET_TOKEN, (token_digest(access_token),))
+
+def get_tokens(access_tokens, db):
+    """TokenRecords for ``access_tokens`` in order, None where there is no row"""
+    digests = [token_digest(access_token) for access_token in access_tokens]
+    rows = {row.access_token_hash: row for row in _fetch_in(db, TokenRecord, "tokens", "access_token_hash", list(set(digests)))}
+    return [rows.get(digest) for digest in digests]
 
 def get_token_by_refresh_token(refresh_token, db):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM tokens WHERE refresh_token = ?", (refresh_token,))
-    return cursor.fetchone()
+    return _fetch_one(db, TokenRecord, _GET_TOKEN_BY_REFRESH_TOKEN, (token_digest(refresh_token),))
 
 def delete_token(access_token, db):
     cursor = db.cursor()
-    cursor.execute("DELETE FROM tokens WHERE access_token = ?", (access_token,))
+    cursor.execute("DELETE FROM tokens WHERE access_token_hash = ?", (token_digest(access_token),))
+    db.commit()
+
+def revoke_token(access_token_hash, expires_at, db):
+    db.execute(
+        "INSERT OR IGNORE INTO revoked_tokens (token_hash, expires_at) VALUES (?, ?)",
+        (access_token_hash, expires_at)
+    )
     db.commit()
 
+def is_token_revoked(access_token_hash, db):
+    return db.execute("SELECT 1 FROM revoked_tokens WHERE token_hash = ?", (access_token_hash,)).fetchone() is not None
+
+def list_revoked_tokens(after_id, db):
+    """(id, token_hash) of revocations recorded after ``after_id``, oldest first"""
+    return db.execute("SELECT id, token_hash FROM revoked_tokens WHERE id > ? ORDER BY id", (after_id,)).fetchall()
+
 def create_device_code(device_code, user_code, client_id, scope, expires_at, verification_uri, interval, db):
     cursor = db.cursor()
     cursor.execute(
@@ -123,14 +265,15 @@ def create_device_code(device_code, user_code, client_id, scope, expires_at, ver
     db.commit()
 
 def get_device_code(device_code, db):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM device_codes WHERE device_code = ?", (device_code,))
-    return cursor.fetchone()
+    return _fetch_one(db, DeviceCodeRecord, _GET_DEVICE_CODE, (device_code,))
+
+def get_device_codes(device_codes, db):
+    """DeviceCodeRecords for ``device_codes`` in order, None where there is no row"""
+    rows = {row.device_code: row for row in _fetch_in(db, DeviceCodeRecord, "device_codes", "device_code", list(set(device_codes)))}
+    return [rows.get(device_code) for device_code in device_codes]
 
 def get_device_code_by_user_code(user_code, db):
-    cursor = db.cursor()
-    cursor.execute("SELECT * FROM device_codes WHERE user_code = ?", (user_code,))
-    return cursor.fetchone()
+    return _fetch_one(db, DeviceCodeRecord, _GET_DEVICE_CODE_BY_USER_CODE, (user_code,))
 
 def approve_device_code(user_code, user_id, db):
     cursor = db.cursor()
@@ -140,14 +283,44 @@ def approve_device_code(user_code, user_id, db):
     )
     db.commit()
 
+# Column a row is reaped by. A token row also carries the refresh token, so it
+# stays until that has expired too; refresh_expires_at is never earlier than
+# expires_at.
+EXPIRES_BY = {"tokens": "refresh_expires_at"}
+
+# Without these every batch would scan its table while holding the write lock.
+# Migrations 3 and 6 build them online, so an upgraded database can lack them.
+EXPIRY_INDEXES = {
+    "authorization_codes": "idx_authorization_codes_expires_at",
+    "tokens": "idx_tokens_refresh_expires_at",
+    "device_codes": "idx_device_codes_expires_at",
+    "revoked_tokens": "idx_revoked_tokens_expires_at",
+}
+
+def delete_expired(table, now, batch_size, db):
+    index = EXPIRY_INDEXES[table]
+    if not db.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = ?", (index,)).fetchone():
+        logger.warning(
+            "Not reaping %s until %s exists; build it with `python -m service.database.migrations --online`",
+            table, index
+        )
+        return 0
+    column = EXPIRES_BY.get(table, "expires_at")
+    cursor = db.execute(
+        f"""DELETE FROM {table} WHERE id IN
+            (SELECT id FROM {table} WHERE {column} < ? LIMIT ?)""",
+        (now, batch_size)
+    )
+    db.commit()
+    return cursor.rowcount
+
 @contextmanager
 def get_db_context():
-    db = get_db()
-    try:
+    with get_pool().connection() as db:
         yield db
-    finally:
-        pass  # Don't close the connection here, it's managed by the thread-local storage
 
-def get_db_dependency():
+def get_db():
     with get_db_context() as db:
-        yield db 
\ No newline at end of file
+        yield db
+
+get_db_dependency = get_db
@@ -0,0 +1,146 @@
+import sqlite3
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+
+class PoolTimeout(sqlite3.OperationalError):
+    """No connection became available within the pool timeout."""
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections sharing the same pragma setup.
+
+    Connections are created lazily up to ``size`` and handed out LIFO so the
+    warmest page cache is reused. Idle connections older than
+    ``health_check_interval`` seconds are pinged before being returned.
+    """
+
+    def __init__(self, path, size=8, timeout=5.0, pragmas=None, health_check_interval=30.0):
+        self.path = path
+        self.size = size
+        self.timeout = timeout
+        self.pragmas = pragmas or {}
+        self.health_check_interval = health_check_interval
+        self._idle = deque()
+        self._created = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "checkouts": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "discarded": 0,
+            "wait_time": 0.0,
+        }
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, check_same_thread=False, timeout=self.timeout)
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        return conn
+
+    def _healthy(self, conn):
+        try:
+            conn.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        deadline = None
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise sqlite3.ProgrammingError("Connection pool is closed")
+                if self._idle:
+                    conn, idle_since = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    conn, idle_since = None, None
+                    break
+                if deadline is None:
+                    deadline = time.monotonic() + self.timeout
+                    self._stats["waits"] += 1
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._cond.wait(remaining)
+            self._stats["checkouts"] += 1
+            if deadline is not None:
+                self._stats["wait_time"] += self.timeout - (deadline - time.monotonic())
+
+        if conn is not None and time.monotonic() - idle_since > self.health_check_interval:
+            if not self._healthy(conn):
+                # Keep the slot reserved and reconnect in place.
+                self._close_quietly(conn)
+                with self._cond:
+                    self._stats["discarded"] += 1
+                conn = None
+        if conn is None:
+            try:
+                conn = self._connect()
+            except Exception:
+                with self._cond:
+                    self._created -= 1
+                    self._cond.notify()
+                raise
+        return conn
+
+    def release(self, conn):
+        if conn.in_transaction:
+            try:
+                conn.rollback()
+            except sqlite3.Error:
+                self._discard(conn)
+                return
+        with self._cond:
+            if self._closed:
+                conn.close()
+                self._created -= 1
+                return
+            self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    def _close_quietly(self, conn):
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _discard(self, conn):
+        self._close_quietly(conn)
+        with self._cond:
+            self._created -= 1
+            self._stats["discarded"] += 1
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "in_use": self._created - len(self._idle),
+                **self._stats,
+            }
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                conn.close()
+                self._created -= 1
+            self._cond.notify_all()
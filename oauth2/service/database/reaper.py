@@ -0,0 +1,50 @@
+import asyncio
+import logging
+from datetime import datetime
+
+from service.config import REAPER
+from service.database.async_operations import delete_expired
+
+logger = logging.getLogger(__name__)
+
+# Token rows stay until their refresh token has expired too (operations.EXPIRES_BY)
+EXPIRING_TABLES = ("authorization_codes", "tokens", "device_codes", "revoked_tokens")
+
+# Outcome of the most recent run, for diagnostics
+last_run = {}
+
+
+async def reap_expired(batch_size=REAPER["batch_size"], batch_pause=REAPER["batch_pause"]):
+    """Delete expired rows from every expiring table, one small batch per transaction.
+
+    Each batch commits separately and the loop yields between batches, so
+    token issuance never waits on the write lock for longer than one batch.
+    """
+    now = datetime.now()
+    removed = {}
+    for table in EXPIRING_TABLES:
+        removed[table] = 0
+        while True:
+            count = await delete_expired(table, now, batch_size)
+            removed[table] += count
+            if count < batch_size:
+                break
+            await asyncio.sleep(batch_pause)
+    return removed
+
+
+async def run_reaper(interval=REAPER["interval"], batch_size=REAPER["batch_size"], batch_pause=REAPER["batch_pause"]):
+    while True:
+        started = datetime.now()
+        try:
+            removed = await reap_expired(batch_size, batch_pause)
+            last_run.update(started_at=started.isoformat(), removed=removed, error=None)
+            logger.info("Expiry reaper removed %s (%d rows)", removed, sum(removed.values()))
+        except Exception as e:
+            last_run.update(started_at=started.isoformat(), removed=None, error=str(e))
+            logger.exception("Expiry reaper run failed")
+        await asyncio.sleep(interval)
+
+
+def start_reaper():
+    return asyncio.get_running_loop().create_task(run_reaper(), name="expiry-reaper")
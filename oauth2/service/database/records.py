@@ -0,0 +1,64 @@
+from typing import NamedTuple, Optional
+
+# Tuple-backed rows returned by operations.py. Each one mirrors the column
+# list of the query that builds it, so keep field order in sync with the SQL.
+
+
+class ClientRecord(NamedTuple):
+    client_id: str
+    client_type: str
+    redirect_uris: Optional[str]
+
+
+class ClientCredentials(NamedTuple):
+    client_id: str
+    client_type: str
+    client_secret: str
+
+
+class UserCredentials(NamedTuple):
+    id: int
+    hashed_password: str
+
+
+class UserProfile(NamedTuple):
+    id: int
+    username: str
+    email: Optional[str]
+
+
+class UserSummary(NamedTuple):
+    id: int
+    username: str
+    email: Optional[str]
+    is_active: bool
+
+
+class AuthorizationCodeRecord(NamedTuple):
+    client_id: str
+    redirect_uri: Optional[str]
+    user_id: int
+    expires_at: str
+    scope: Optional[str]
+    code_challenge: Optional[str]
+    code_challenge_method: Optional[str]
+
+
+class TokenRecord(NamedTuple):
+    access_token_hash: bytes
+    client_id: str
+    user_id: Optional[int]
+    scope: Optional[str]
+    expires_at: str
+    # Never earlier than expires_at; equal to it when there is no refresh token
+    refresh_expires_at: str
+
+
+class DeviceCodeRecord(NamedTuple):
+    device_code: str
+    client_id: str
+    scope: Optional[str]
+    expires_at: str
+    user_id: Optional[int]
+    interval: int
+    is_approved: bool
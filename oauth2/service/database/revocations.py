@@ -0,0 +1,113 @@
+"""Revoked access tokens, checked through an in-process Bloom filter.
+
+The filter holds the digest of every token in revoked_tokens. Tokens that
+were never revoked, i.e. nearly all of them, are cleared by the filter
+alone; only a possible hit reads the table. Each worker loads the filter at
+startup, adds its own revocations immediately and picks up other workers'
+every REVOCATION["sync_interval"] seconds. Bloom filters cannot forget, so
+the filter is rebuilt every REVOCATION["rebuild_interval"] seconds (or when
+it outgrows its capacity) to drop the digests the reaper has removed.
+"""
+import asyncio
+import logging
+import time
+
+from service.config import REVOCATION
+from service.database import events
+from service.database.async_operations import is_token_revoked, list_revoked_tokens
+from service.utils.bloom import BloomFilter
+
+logger = logging.getLogger(__name__)
+
+
+class RevocationFilter:
+    def __init__(self, capacity=REVOCATION["capacity"], error_rate=REVOCATION["error_rate"]):
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.loaded = False
+        self.checks = 0
+        self.possible_hits = 0
+        self._filter = BloomFilter(capacity, error_rate)
+        self._last_id = 0
+        self._added_during_rebuild = None
+
+    def add(self, digest):
+        self._filter.add(digest)
+        if self._added_during_rebuild is not None:
+            self._added_during_rebuild.append(digest)
+
+    @property
+    def full(self):
+        return self._filter.count > self._filter.capacity
+
+    async def sync(self, rebuild=False):
+        """Add revocations recorded since the last sync, or reload them all."""
+        if not rebuild:
+            rows = await list_revoked_tokens(self._last_id)
+            for _, digest in rows:
+                self._filter.add(digest)
+            if rows:
+                self._last_id = rows[-1][0]
+            return len(rows)
+
+        self._added_during_rebuild = []
+        try:
+            rows = await list_revoked_tokens(0)
+            bloom = BloomFilter(max(self.capacity, 2 * len(rows)), self.error_rate)
+            for _, digest in rows:
+                bloom.add(digest)
+        finally:
+            added, self._added_during_rebuild = self._added_during_rebuild, None
+        # Local revocations that raced the reload are already in the table too
+        for digest in added:
+            bloom.add(digest)
+        self._filter = bloom
+        self._last_id = rows[-1][0] if rows else 0
+        self.loaded = True
+        return len(rows)
+
+    async def is_revoked(self, digest):
+        self.checks += 1
+        if self.loaded and digest not in self._filter:
+            return False
+        self.possible_hits += 1
+        return await is_token_revoked(digest)
+
+    def stats(self):
+        return {
+            "entries": self._filter.count,
+            "capacity": self._filter.capacity,
+            "checks": self.checks,
+            "possible_hits": self.possible_hits,
+        }
+
+
+revocation_filter = RevocationFilter()
+events.subscribe(events.TOKEN_REVOKED, revocation_filter.add)
+
+
+async def run_sync(interval=REVOCATION["sync_interval"], rebuild_interval=REVOCATION["rebuild_interval"]):
+    rebuilt_at = time.monotonic()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            # An unloaded filter (the startup load failed) is retried as a rebuild
+            rebuild = (
+                not revocation_filter.loaded
+                or revocation_filter.full
+                or time.monotonic() - rebuilt_at >= rebuild_interval
+            )
+            await revocation_filter.sync(rebuild)
+            if rebuild:
+                rebuilt_at = time.monotonic()
+        except Exception:
+            logger.exception("Revocation filter sync failed")
+
+
+async def start_revocation_sync():
+    try:
+        await revocation_filter.sync(rebuild=True)
+    except Exception:
+        # Until a load succeeds every check reads revoked_tokens, so keep serving
+        logger.exception("Initial revocation filter load failed, retrying in the background")
+    return asyncio.get_running_loop().create_task(run_sync(), name="revocation-sync")
@@ -0,0 +1,132 @@
+"""Shard layout for tokens, authorization codes and device codes.
+
+Rows live in shard ``digest % DB_SHARDS``, where the digest is the stored
+access_token_hash for tokens and the SHA-256 of the code or device_code for
+the other two tables. Users and clients stay in DB_FILE. With DB_SHARDS=1
+everything is in DB_FILE.
+
+Moving to a different shard count is an offline step:
+
+    python -m service.database.shards --shards 4 [--from 1]
+
+then restart the service with DB_SHARDS=4.
+"""
+import argparse
+import os
+import sqlite3
+import sys
+
+from service.config import DB_FILE, DB_SHARDS, DB_SHARD_FILE
+from service.database.migrations import migrate
+from service.utils.security import token_digest
+
+# Table -> column the shard is chosen by
+SHARDED_TABLES = {
+    "tokens": "access_token_hash",
+    "authorization_codes": "code",
+    "device_codes": "device_code",
+}
+
+
+def shard_paths(count=DB_SHARDS, pattern=DB_SHARD_FILE):
+    return [pattern.format(i) for i in range(count)] if count > 1 else []
+
+
+def shard_index(digest, count):
+    return int.from_bytes(digest[:8], "big") % count
+
+
+def _row_digest(table, key):
+    # tokens already store the digest; codes are stored as issued
+    return key if table == "tokens" else token_digest(key)
+
+
+def init_shards(count=DB_SHARDS, pattern=DB_SHARD_FILE, online=False):
+    return {path: migrate(path, online=online) for path in shard_paths(count, pattern)}
+
+
+def _remove(path):
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+
+def reshard(count, source_count=DB_SHARDS, db_path=DB_FILE, pattern=DB_SHARD_FILE):
+    """Redistribute every sharded row over ``count`` shards; returns rows moved per table.
+
+    New shard files are built next to the old ones and swapped in once all
+    rows are copied, so an interrupted run leaves the old layout intact.
+    Run it with the service stopped.
+    """
+    sources = [path for path in shard_paths(source_count, pattern) or [db_path] if os.path.exists(path)]
+    for path in sources:
+        migrate(path, online=True)
+    targets = shard_paths(count, pattern) or [db_path]
+    if sources == targets:
+        return {table: 0 for table in SHARDED_TABLES}
+
+    # Going back to a single file writes straight into DB_FILE, which is
+    # never a source in that case
+    staged = targets if targets == [db_path] else [path + ".reshard" for path in targets]
+    for path in staged:
+        if path != db_path:
+            _remove(path)
+        migrate(path, online=True)
+    outputs = [sqlite3.connect(path) for path in staged]
+    moved = {}
+    try:
+        for table, key in SHARDED_TABLES.items():
+            columns = [row[1] for row in outputs[0].execute(f"PRAGMA table_info({table})") if row[1] != "id"]
+            select = f"SELECT {', '.join(columns)} FROM {table}"
+            insert = f"INSERT INTO {table} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))})"
+            key_column = columns.index(key)
+            moved[table] = 0
+            for path in sources:
+                source = sqlite3.connect(path)
+                try:
+                    for row in source.execute(select):
+                        output = outputs[shard_index(_row_digest(table, row[key_column]), len(outputs))]
+                        output.execute(insert, row)
+                        moved[table] += 1
+                finally:
+                    source.close()
+        for output in outputs:
+            output.commit()
+    finally:
+        for output in outputs:
+            output.close()
+
+    for staged_path, path in zip(staged, targets):
+        if staged_path != path:
+            _remove(path)
+            os.replace(staged_path, path)
+    for path in sources:
+        if path == db_path:
+            # Was unsharded: users and clients stay, the moved tables are emptied
+            db = sqlite3.connect(db_path)
+            with db:
+                for table in SHARDED_TABLES:
+                    db.execute(f"DELETE FROM {table}")
+            db.close()
+        elif path not in targets:
+            _remove(path)
+    return moved
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move token, code and device code rows to a new shard count")
+    parser.add_argument("--shards", type=int, required=True, help="target shard count (1 = unsharded)")
+    parser.add_argument("--from", dest="source", type=int, default=DB_SHARDS, help="current shard count (default: DB_SHARDS)")
+    parser.add_argument("--db", default=DB_FILE, help="primary database (default: DB_FILE)")
+    parser.add_argument("--pattern", default=DB_SHARD_FILE, help="shard file name pattern (default: DB_SHARD_FILE)")
+    args = parser.parse_args(argv)
+
+    moved = reshard(args.shards, args.source, args.db, args.pattern)
+    for table, count in moved.items():
+        print(f"{table}: {count} rows")
+    print(f"Restart the service with DB_SHARDS={args.shards}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
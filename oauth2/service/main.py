@@ -3,15 +3,27 @@ from fastapi.middleware.cors import CORSMiddleware
 from starlette.middleware.sessions import SessionMiddleware
 
 
-from service.database.operations import init_db
-from service.auth import auth_router, token_router, device_router
+from service.database.operations import init_db, close_db
+from service.database import async_operations
+from service.database.reaper import start_reaper
+from service.database.revocations import start_revocation_sync
+from service.database.device_approvals import start_device_notifier
+from service.storage import close_storage
+from service.config import REAPER, RATE_LIMIT
+from service.utils.hashing import password_hasher
+from service.utils.rate_limit import RateLimitMiddleware
+from service.utils.templates import compile_pages
+from service.utils.workers import start_heartbeat
+from service.auth import auth_router, token_router, device_router, introspection_router, revocation_router
 
-from service.routes import user_router, client_router, openid_router
-
-init_db("service/oauth_provider.db")
+from service.routes import user_router, client_router, openid_router, health_router
+from service.routes.openid import build_discovery
 
 app = FastAPI(title="OAuth2 Server")
 
+if RATE_LIMIT["enabled"]:
+    # Innermost, so rejections still carry CORS headers
+    app.add_middleware(RateLimitMiddleware)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -25,10 +37,59 @@ app.add_middleware(SessionMiddleware, secret_key="your-very-secret-key")
 # app.include_router(token_router)
 app.include_router(device_router)
 app.include_router(auth_router)
+app.include_router(introspection_router)
+app.include_router(revocation_router)
 
 app.include_router(user_router)
 app.include_router(client_router)
 app.include_router(openid_router)
+app.include_router(health_router)
+
+
+@app.on_event("startup")
+def init_database():
+    # service.server migrates once in the parent before forking workers
+    if not getattr(app.state, "db_initialized", False):
+        init_db()
+
+
+@app.on_event("startup")
+def build_static_responses():
+    build_discovery()
+    compile_pages()
+
+
+@app.on_event("startup")
+async def start_password_hasher():
+    # Before anything else starts threads, since the workers are forked
+    password_hasher.start()
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    app.state.reaper = start_reaper() if REAPER["enabled"] else None
+    app.state.revocation_sync = await start_revocation_sync()
+    app.state.device_notifier = start_device_notifier()
+    app.state.heartbeat = start_heartbeat()
+
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    if app.state.reaper:
+        app.state.reaper.cancel()
+    app.state.revocation_sync.cancel()
+    if app.state.device_notifier:
+        app.state.device_notifier.cancel()
+    if app.state.heartbeat:
+        app.state.heartbeat.cancel()
+
+
+@app.on_event("shutdown")
+def shutdown_db():
+    password_hasher.shutdown()
+    async_operations.shutdown()
+    close_storage()
+    close_db()
 
 
 if __name__ == "__main__":
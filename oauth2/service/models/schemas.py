@@ -1,5 +1,5 @@
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 
 
 class UserCreate(BaseModel):
@@ -50,6 +50,11 @@ class TokenResponse(BaseModel):
     refresh_token: Optional[str] = None
     scope: Optional[str] = None
 
+class IntrospectionRequest(BaseModel):
+    tokens: List[str]
+    client_id: str = None
+    client_secret: str = None
+
 class DeviceAuthorizationResponse(BaseModel):
     device_code: str
     user_code: str
@@ -69,6 +74,8 @@ class OpenIDConfiguration(BaseModel):
     token_endpoint: str
     userinfo_endpoint: str
     device_authorization_endpoint: str
+    introspection_endpoint: str
+    revocation_endpoint: str
     jwks_uri: str
     response_types_supported: list
     subject_types_supported: list
@@ -1,8 +1,8 @@
 import sqlite3
 import traceback
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, HTTPException, status
 
-from service.database.operations import get_db
+from service.database.async_operations import create_client
 from service.models.schemas import ClientCreate, ClientResponse
 from service.utils.security import generate_token
 
@@ -11,21 +11,19 @@ router = APIRouter(prefix="/client", tags=["client"])
 
 
 @router.post("/oauth/register", response_model=ClientResponse)
-async def register_client(client: ClientCreate, db = Depends(get_db)):
+async def register_client(client: ClientCreate):
     try:
         client_id = generate_token()
         client_secret = generate_token() if client.client_type == "confidential" else ""
         
-        cursor = db.cursor()
-        cursor.execute(
-            """INSERT INTO clients 
-            (client_id, client_secret, redirect_uris, name, client_type)
-            VALUES (?, ?, ?, ?, ?)""",
-            (client_id, client_secret, client.redirect_uris, client.name, client.client_type)
+        id = await create_client(
+            client_id=client_id,
+            client_secret=client_secret,
+            redirect_uris=client.redirect_uris,
+            name=client.name,
+            client_type=client.client_type
         )
-        db.commit()
     except sqlite3.Error as e:
-        db.rollback()
         error_summary = {
             "error_type": "DatabaseError",
             "error_message": str(e),
@@ -34,7 +32,6 @@ async def register_client(client: ClientCreate, db = Depends(get_db)):
         }
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_summary)
     except Exception as e:
-        db.rollback()
         error_summary = {
             "error_type": type(e).__name__,
             "error_message": str(e),
@@ -43,7 +40,7 @@ async def register_client(client: ClientCreate, db = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_summary)
     
     return {
-        "id": cursor.lastrowid,
+        "id": id,
         "client_id": client_id,
         "name": client.name,
         "client_type": client.client_type,
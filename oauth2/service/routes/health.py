@@ -0,0 +1,30 @@
+import os
+
+from fastapi import APIRouter
+
+from ..storage import get_storage
+from ..utils import workers
+from ..utils.hashing import password_hasher
+from ..utils.token_cache import token_cache
+from ..utils.userinfo_cache import userinfo_cache
+
+router = APIRouter(tags=["health"])
+
+
+@router.get("/healthz")
+async def healthz():
+    """Liveness of the answering worker, plus every sibling's heartbeat under the launcher."""
+    return workers.health()
+
+
+@router.get("/metrics")
+async def metrics():
+    """Counters of the answering worker; each worker has its own pools, so sample every one."""
+    return {
+        "pid": os.getpid(),
+        "worker": workers.worker_table.index if workers.worker_table is not None else None,
+        "password_hashing": password_hasher.metrics(),
+        "storage": get_storage().stats(),
+        "userinfo_cache": userinfo_cache.stats(),
+        "token_cache": token_cache.stats(),
+    }
@@ -1,21 +1,50 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Request
 from ..models.schemas import OpenIDConfiguration
+from ..config import ALGORITHM, DISCOVERY_MAX_AGE, ISSUER, SIGNING_KEYS
+from ..utils.keys import get_jwks
+from ..utils.static_response import StaticResponse
 
 router = APIRouter(tags=["openid"])
 
+_discovery = None
+_jwks = None
+
+
+def build_discovery(issuer=ISSUER):
+    """Validate and serialize the discovery document once; main calls this at startup."""
+    global _discovery
+    document = OpenIDConfiguration(
+        issuer=issuer,
+        authorization_endpoint=f"{issuer}/oauth2/authorize",
+        token_endpoint=f"{issuer}/oauth2/token",
+        userinfo_endpoint=f"{issuer}/oauth2/users/info",
+        device_authorization_endpoint=f"{issuer}/device/authorize",
+        introspection_endpoint=f"{issuer}/oauth2/introspect",
+        revocation_endpoint=f"{issuer}/oauth2/revoke",
+        jwks_uri=f"{issuer}/.well-known/jwks.json",
+        response_types_supported=["code"],
+        subject_types_supported=["public"],
+        id_token_signing_alg_values_supported=[ALGORITHM],
+        scopes_supported=["openid", "profile", "email"],
+        token_endpoint_auth_methods_supported=["client_secret_basic", "none"],
+        claims_supported=["sub", "username", "email"]
+    )
+    _discovery = StaticResponse(document.dict(), f"public, max-age={DISCOVERY_MAX_AGE}")
+    return _discovery
+
+
 @router.get("/.well-known/openid-configuration", response_model=OpenIDConfiguration)
-async def openid_configuration():
-    return {
-        "issuer": "http://localhost:8000",
-        "authorization_endpoint": "http://localhost:8000/oauth2/authorize",
-        "token_endpoint": "http://localhost:8000/oauth2/token",
-        "userinfo_endpoint": "http://localhost:8000/oauth2/userinfo",
-        "device_authorization_endpoint": "http://localhost:8000/oauth2/device_authorize",
-        "jwks_uri": "http://localhost:8000/.well-known/jwks.json",
-        "response_types_supported": ["code"],
-        "subject_types_supported": ["public"],
-        "id_token_signing_alg_values_supported": ["HS256"],
-        "scopes_supported": ["openid", "profile", "email"],
-        "token_endpoint_auth_methods_supported": ["client_secret_basic", "none"],
-        "claims_supported": ["sub", "username", "email"]
-    } 
\ No newline at end of file
+async def openid_configuration(request: Request):
+    return (_discovery or build_discovery()).respond(request)
+
+
+@router.get("/.well-known/jwks.json")
+async def jwks(request: Request):
+    # Retired and next keys are listed too, so caching for max-age is safe
+    # as long as rotations are further apart than that
+    global _jwks
+    keys = get_jwks()
+    if _jwks is None or _jwks.payload is not keys:
+        # The key ring hands out a new dict only when it reloads
+        _jwks = StaticResponse(keys, f"public, max-age={SIGNING_KEYS['jwks_max_age']}")
+    return _jwks.respond(request)
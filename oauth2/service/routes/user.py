@@ -1,13 +1,17 @@
 import sqlite3
+import time
 import traceback
-from jose import JWTError, jwt
 from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 
-from service.database.operations import get_db
+from service.database.async_operations import get_user_by_id, create_user, list_users, get_token
 from service.models.schemas import UserCreate, UserResponse, UserInfoResponse
-from service.config import SECRET_KEY, ALGORITHM
-from service.database.operations import get_db_dependency
+from service.config import USERINFO_CACHE
+from service.database.revocations import revocation_filter
+from service.utils.jwt_codec import TokenError, decode_token
+from service.utils.hashing import PasswordPoolSaturated, password_hasher
+from service.utils.security import is_reference_token, reference_token_claims, token_digest
+from service.utils.userinfo_cache import userinfo_cache
 
 
 router = APIRouter(prefix="/oauth2", tags=["user"])
@@ -15,19 +19,38 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="oauth2/token")
 
 
 @router.get("/users/info", response_model=UserInfoResponse)
-async def userinfo(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
+async def userinfo(token: str = Depends(oauth2_scheme)):
     try:
         credentials_exception = HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Could not validate credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
+        digest = token_digest(token)
+        if await revocation_filter.is_revoked(digest):
+            raise credentials_exception
+
+        # Repeat calls with the same bearer token skip verification and the DB
+        if USERINFO_CACHE["enabled"]:
+            cached = userinfo_cache.get(digest)
+            if cached is not None:
+                return cached
+
         try:
-            payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+            if is_reference_token(token):
+                # Opaque tokens are only as valid as their row, read through the token cache
+                record = await get_token(token)
+                if record is None:
+                    raise credentials_exception
+                payload = reference_token_claims(record)
+                if payload["exp"] < int(time.time()):
+                    raise credentials_exception
+            else:
+                payload = decode_token(token)
             user_id: str = payload.get("sub")
             if user_id is None:
                 raise credentials_exception
-        except JWTError as e:
+        except TokenError as e:
             error_summary = {
                 "error_type": "JWTError",
                 "error_message": str(e),
@@ -41,24 +64,26 @@ async def userinfo(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
         
         # For client credentials flow, the "sub" is the client ID
         if user_id.startswith("client:"):
-            return {"sub": user_id}
-        
-        # For normal user tokens, fetch user info
-        cursor = db.cursor()
-        cursor.execute(
-            "SELECT username, email FROM users WHERE id = ?",
-            (int(user_id),)
-        )
-        user = cursor.fetchone()
-        
-        if not user:
-            raise credentials_exception
-        
-        return {
-            "sub": user_id,
-            "username": user["username"],
-            "email": user["email"]
-        }
+            response = {"sub": user_id}
+            user = None
+        else:
+            # For normal user tokens, fetch user info
+            user = await get_user_by_id(int(user_id))
+
+            if not user:
+                raise credentials_exception
+
+            response = {
+                "sub": user_id,
+                "username": user.username,
+                "email": user.email
+            }
+
+        if USERINFO_CACHE["enabled"]:
+            userinfo_cache.put(digest, payload.get("exp"), user.id if user else None, response)
+        return response
+    except HTTPException:
+        raise
     except sqlite3.Error as e:
         error_summary = {
             "error_type": "DatabaseError",
@@ -77,22 +102,22 @@ async def userinfo(token: str = Depends(oauth2_scheme), db = Depends(get_db)):
 
 
 @router.post("/users/register", response_model=UserResponse)
-async def register_user(user: UserCreate, db = Depends(get_db)):
+async def register_user(user: UserCreate):
     try:
-        from service.utils.security import get_password_hash
+        hashed_password = await password_hasher.hash(user.password)
         
-        hashed_password = get_password_hash(user.password)
-        
-        cursor = db.cursor()
-        cursor.execute(
-            """INSERT INTO users 
-            (username, hashed_password, email)
-            VALUES (?, ?, ?)""",
-            (user.username, hashed_password, user.email)
+        id = await create_user(
+            username=user.username,
+            hashed_password=hashed_password,
+            email=user.email
+        )
+    except PasswordPoolSaturated:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many registrations in progress, retry shortly",
+            headers={"Retry-After": "1"}
         )
-        db.commit()
     except sqlite3.Error as e:
-        db.rollback()
         error_summary = {
             "error_type": "DatabaseError",
             "error_message": str(e),
@@ -101,7 +126,6 @@ async def register_user(user: UserCreate, db = Depends(get_db)):
         }
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_summary)
     except Exception as e:
-        db.rollback()
         error_summary = {
             "error_type": type(e).__name__,
             "error_message": str(e),
@@ -110,7 +134,7 @@ async def register_user(user: UserCreate, db = Depends(get_db)):
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=error_summary)
     
     return {
-        "id": cursor.lastrowid,
+        "id": id,
         "username": user.username,
         "email": user.email,
         "is_active": True
@@ -118,12 +142,10 @@ async def register_user(user: UserCreate, db = Depends(get_db)):
 
 
 @router.get("/users")
-async def get_users(db: sqlite3.Connection = Depends(get_db_dependency)):
+async def get_users():
     try:
-        cursor = db.cursor()
-        cursor.execute("SELECT * FROM users")
-        users = cursor.fetchall()
-        return users
+        users = await list_users()
+        return [user._asdict() for user in users]
     except sqlite3.Error as e:
         error_summary = {
             "error_type": "DatabaseError",
@@ -0,0 +1,165 @@
+"""Production entry point: migrate once, preload the app, fork the workers.
+
+    python -m service.server --workers 4
+
+The parent applies migrations, imports the app and binds the listening
+socket, then forks the workers, which share the socket and the imported
+code. Each worker runs uvicorn and its own startup hooks. The parent
+restarts workers that die. On SIGTERM or SIGINT it asks every worker to
+stop accepting and finish its in-flight requests, and kills any that are
+still running after SERVER["graceful_timeout"] seconds.
+
+Storage that lives in one process (STORAGE_BACKEND=memory, TOKEN_STORE=log)
+runs a single worker by default and refuses more.
+"""
+import argparse
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from service.config import CPU_COUNT, DEVICE_FLOW, PASSWORD_HASHING, SERVER, STORAGE_BACKEND, TOKEN_STORE
+
+logger = logging.getLogger("service.server")
+
+
+def _single_process_storage():
+    """Why the configured storage cannot be shared by several workers, or None."""
+    if STORAGE_BACKEND == "memory":
+        return "STORAGE_BACKEND=memory keeps separate data in each worker"
+    if TOKEN_STORE["backend"] == "log":
+        return "TOKEN_STORE=log can only be opened by one process"
+    return None
+
+
+def _bind(host, port):
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def _serve(app, sock, index, table, log_level):
+    import uvicorn
+    from service.utils import workers
+
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, signal.SIG_DFL)
+    table.index = index
+    workers.worker_table = table
+    server = uvicorn.Server(uvicorn.Config(app, lifespan="on", log_level=log_level))
+    server.run(sockets=[sock])
+
+
+class Launcher:
+    def __init__(self, app, sock, workers, graceful_timeout, log_level):
+        from service.utils.workers import WorkerTable
+
+        self.app = app
+        self.sock = sock
+        self.workers = workers
+        self.graceful_timeout = graceful_timeout
+        self.log_level = log_level
+        self.table = WorkerTable(workers)
+        self.children = {}  # pid -> (index, started)
+        self.stopping = False
+
+    def spawn(self, index):
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                _serve(self.app, self.sock, index, self.table, self.log_level)
+                status = 0
+            finally:
+                os._exit(status)
+        self.table.spawned(index, pid)
+        self.children[pid] = (index, time.monotonic())
+        logger.info("Started worker %d (pid %d)", index, pid)
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _reap(self):
+        while self.children:
+            pid, status = os.waitpid(-1, os.WNOHANG)
+            if pid == 0:
+                return
+            index, started = self.children.pop(pid, (None, None))
+            if index is None or self.stopping:
+                continue
+            logger.warning("Worker %d (pid %d) exited with status %d", index, pid, os.waitstatus_to_exitcode(status))
+            if time.monotonic() - started < 1:
+                # Crashing at startup; don't spin
+                time.sleep(1)
+            self.spawn(index)
+
+    def run(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for index in range(self.workers):
+            self.spawn(index)
+        while not self.stopping:
+            self._reap()
+            time.sleep(0.2)
+        self.shutdown()
+
+    def shutdown(self):
+        logger.info("Stopping %d workers", len(self.children))
+        for pid in self.children:
+            os.kill(pid, signal.SIGTERM)
+        deadline = time.monotonic() + self.graceful_timeout
+        while self.children and time.monotonic() < deadline:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+            if pid:
+                self.children.pop(pid, None)
+            else:
+                time.sleep(0.1)
+        for pid in self.children:
+            logger.warning("Worker pid %d did not drain in time, killing it", pid)
+            os.kill(pid, signal.SIGKILL)
+            os.waitpid(pid, 0)
+        self.children.clear()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default=SERVER["host"])
+    parser.add_argument("--port", type=int, default=SERVER["port"])
+    parser.add_argument("--workers", type=int)
+    parser.add_argument("--graceful-timeout", type=float, default=SERVER["graceful_timeout"])
+    parser.add_argument("--log-level", default="info")
+    args = parser.parse_args(argv)
+    single_process = _single_process_storage()
+    if args.workers is None:
+        args.workers = 1 if single_process and "WEB_CONCURRENCY" not in os.environ else SERVER["workers"]
+    if single_process and args.workers > 1:
+        parser.error(f"{single_process}; run with --workers 1")
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s %(name)s %(levelname)s %(message)s")
+
+    # Each worker starts its own hashing pool; share the cores between them
+    if "PASSWORD_HASH_WORKERS" not in os.environ:
+        PASSWORD_HASHING["workers"] = max(1, CPU_COUNT // args.workers)
+    # Approvals only reach waiters in other workers through storage
+    if "DEVICE_NOTIFIER" not in os.environ:
+        DEVICE_FLOW["notifier"] = "database" if args.workers > 1 else "local"
+
+    from service.database.create_db import init_db
+    init_db()
+
+    from service.main import app
+    app.state.db_initialized = True
+
+    sock = _bind(args.host, args.port)
+    logger.info("Listening on %s:%d with %d workers", args.host, args.port, args.workers)
+    Launcher(app, sock, args.workers, args.graceful_timeout, args.log_level).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,46 @@
+import threading
+
+from service.config import STORAGE_BACKEND, TOKEN_STORE, DB_SHARDS
+from service.storage.base import StorageBackend
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def create_token_store(name=TOKEN_STORE["backend"]):
+    if name == "sqlite":
+        return None
+    if name == "log":
+        from service.storage.tokenlog import TokenLog
+        return TokenLog(TOKEN_STORE["directory"], TOKEN_STORE["segment_size"], TOKEN_STORE["fsync"])
+    raise ValueError(f"Unknown token store '{name}'")
+
+
+def create_storage(name=STORAGE_BACKEND) -> StorageBackend:
+    if name == "sqlite":
+        if DB_SHARDS > 1:
+            from service.storage.sharded import ShardedSQLiteStorage
+            return ShardedSQLiteStorage(tokens=create_token_store())
+        from service.storage.sqlite import SQLiteStorage
+        return SQLiteStorage(tokens=create_token_store())
+    if name == "memory":
+        from service.storage.memory import MemoryStorage
+        return MemoryStorage()
+    raise ValueError(f"Unknown storage backend '{name}'")
+
+
+def get_storage() -> StorageBackend:
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage()
+    return _storage
+
+
+def close_storage():
+    global _storage
+    with _storage_lock:
+        if _storage is not None:
+            _storage.close()
+            _storage = None
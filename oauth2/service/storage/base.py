@@ -0,0 +1,71 @@
+from datetime import datetime
+from typing import Callable, List, Optional, Protocol, Tuple
+
+from service.database.records import (
+    ClientRecord, ClientCredentials, UserCredentials, UserProfile, UserSummary,
+    AuthorizationCodeRecord, TokenRecord, DeviceCodeRecord
+)
+
+
+def timestamp(value):
+    """``value`` in the text form the sqlite3 datetime adapter writes, for backends that store text."""
+    return value.isoformat(" ") if isinstance(value, datetime) else value
+
+
+class StorageBackend(Protocol):
+    """Persistence used by the routers, independent of where rows live.
+
+    ``blocking`` tells the async layer whether calls must be pushed to the
+    database executor or can run directly on the event loop. Timestamps are
+    returned in the same ISO text form SQLite stores.
+    """
+
+    blocking: bool
+
+    def validate_redirect_uri(self, client_id: str, redirect_uri: str) -> bool: ...
+    def get_client(self, client_id: str) -> Optional[ClientRecord]: ...
+    def get_client_credentials(self, client_id: str) -> Optional[ClientCredentials]: ...
+    def create_client(self, client_id, client_secret, redirect_uris, name, client_type) -> int: ...
+
+    def get_user(self, username: str) -> Optional[UserCredentials]: ...
+    def get_user_by_id(self, id: int) -> Optional[UserProfile]: ...
+    def get_users_by_id(self, ids: List[int]) -> List[Optional[UserProfile]]: ...
+    def list_users(self) -> List[UserSummary]: ...
+    def create_user(self, username, hashed_password, email) -> int: ...
+    def update_password_hash(self, id: int, hashed_password: str) -> None: ...
+
+    def create_authorization_code(self, client_id, redirect_uri, user_id, scope, code_challenge, code_challenge_method) -> str: ...
+    def get_authorization_code(self, code: str) -> Optional[AuthorizationCodeRecord]: ...
+    def delete_authorization_code(self, code: str) -> None: ...
+    def redeem_authorization_code(
+        self, code: str, issue: Callable[[AuthorizationCodeRecord], Optional[dict]]
+    ) -> Optional[Tuple[AuthorizationCodeRecord, Optional[dict]]]: ...
+
+    def create_token(
+        self, access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id
+    ) -> None: ...
+    def get_token(self, access_token: str) -> Optional[TokenRecord]: ...
+    def get_tokens(self, access_tokens: List[str]) -> List[Optional[TokenRecord]]: ...
+    def get_token_by_refresh_token(self, refresh_token: str) -> Optional[TokenRecord]: ...
+    def delete_token(self, access_token: str) -> None: ...
+    def rotate_refresh_token(
+        self, refresh_token: str, issue: Callable[[TokenRecord], Optional[dict]]
+    ) -> Optional[Tuple[TokenRecord, Optional[dict]]]: ...
+
+    def revoke_token(self, access_token_hash: bytes, expires_at) -> None: ...
+    def is_token_revoked(self, access_token_hash: bytes) -> bool: ...
+    def list_revoked_tokens(self, after_id: int) -> List[Tuple[int, bytes]]: ...
+
+    def create_device_code(self, device_code, user_code, client_id, scope, expires_at, verification_uri, interval) -> None: ...
+    def get_device_code(self, device_code: str) -> Optional[DeviceCodeRecord]: ...
+    def get_device_codes(self, device_codes: List[str]) -> List[Optional[DeviceCodeRecord]]: ...
+    def get_device_code_by_user_code(self, user_code: str) -> Optional[DeviceCodeRecord]: ...
+    def approve_device_code(self, user_code: str, user_id: int) -> None: ...
+
+    # Token rows are reaped by refresh_expires_at, every other table by expires_at
+    def delete_expired(self, table: str, now, batch_size: int) -> int: ...
+
+    # Connection pool and token store counters for /metrics; empty when there are none
+    def stats(self) -> dict: ...
+
+    def close(self) -> None: ...
@@ -0,0 +1,319 @@
+import heapq
+import itertools
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+from service.database.operations import EXPIRES_BY, is_redirect_uri_allowed, refresh_expiry
+from service.database.records import (
+    ClientRecord, ClientCredentials, UserCredentials, UserProfile, UserSummary,
+    AuthorizationCodeRecord, TokenRecord, DeviceCodeRecord
+)
+from service.storage.base import timestamp
+from service.utils.security import generate_token, token_digest
+
+
+def _project(record, row):
+    return record._make([row[field] for field in record._fields])
+
+
+def _unique_violation(column):
+    # Raised as sqlite3 errors so routers handle both backends the same way
+    return sqlite3.IntegrityError(f"UNIQUE constraint failed: {column}")
+
+
+class MemoryStorage:
+    """StorageBackend keeping every table in dicts behind a single lock.
+
+    Expiring rows are also pushed onto a per-table heap ordered by the
+    column they are reaped by (``expires_at``, or ``refresh_expires_at`` for
+    tokens) so delete_expired only touches rows that are due. Like the
+    SQLite backend, expired rows stay readable until they are reaped.
+    """
+
+    blocking = False
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ids = {table: itertools.count(1) for table in ("users", "clients")}
+        self._users = {}
+        self._user_ids_by_name = {}
+        self._user_emails = set()
+        self._clients = {}
+        self._authorization_codes = {}
+        self._tokens = {}  # Keyed by access token digest, like the SQLite index
+        self._access_hashes_by_refresh_hash = {}
+        self._device_codes = {}
+        self._device_codes_by_user_code = {}
+        self._revoked_tokens = {}  # token_hash -> row; ids grow like AUTOINCREMENT
+        self._revoked_ids = itertools.count(1)
+        self._expiry = {"authorization_codes": [], "tokens": [], "device_codes": [], "revoked_tokens": []}
+
+    def validate_redirect_uri(self, client_id, redirect_uri):
+        client = self._clients.get(client_id)
+        return bool(client) and is_redirect_uri_allowed(client["redirect_uris"], redirect_uri)
+
+    def get_client(self, client_id):
+        client = self._clients.get(client_id)
+        return _project(ClientRecord, client) if client else None
+
+    def get_client_credentials(self, client_id):
+        client = self._clients.get(client_id)
+        return _project(ClientCredentials, client) if client else None
+
+    def create_client(self, client_id, client_secret, redirect_uris, name, client_type):
+        with self._lock:
+            if client_id in self._clients:
+                raise _unique_violation("clients.client_id")
+            id = next(self._ids["clients"])
+            self._clients[client_id] = {
+                "id": id,
+                "client_id": client_id,
+                "client_secret": client_secret,
+                "redirect_uris": redirect_uris,
+                "name": name,
+                "client_type": client_type,
+                "is_active": True,
+            }
+            return id
+
+    def get_user(self, username):
+        id = self._user_ids_by_name.get(username)
+        return _project(UserCredentials, self._users[id]) if id else None
+
+    def get_user_by_id(self, id):
+        user = self._users.get(id)
+        return _project(UserProfile, user) if user else None
+
+    def get_users_by_id(self, ids):
+        return [self.get_user_by_id(id) for id in ids]
+
+    def list_users(self):
+        with self._lock:
+            return [_project(UserSummary, user) for user in self._users.values()]
+
+    def create_user(self, username, hashed_password, email):
+        with self._lock:
+            if username in self._user_ids_by_name:
+                raise _unique_violation("users.username")
+            if email is not None and email in self._user_emails:
+                raise _unique_violation("users.email")
+            id = next(self._ids["users"])
+            self._users[id] = {
+                "id": id,
+                "username": username,
+                "hashed_password": hashed_password,
+                "email": email,
+                "is_active": True,
+            }
+            self._user_ids_by_name[username] = id
+            if email is not None:
+                self._user_emails.add(email)
+            return id
+
+    def update_password_hash(self, id, hashed_password):
+        with self._lock:
+            user = self._users.get(id)
+            if user is not None:
+                user["hashed_password"] = hashed_password
+
+    def create_authorization_code(self, client_id, redirect_uri, user_id, scope, code_challenge, code_challenge_method):
+        code = generate_token()
+        expires_at = timestamp(datetime.now() + timedelta(minutes=10))
+        with self._lock:
+            self._authorization_codes[code] = {
+                "code": code,
+                "client_id": client_id,
+                "redirect_uri": redirect_uri,
+                "user_id": user_id,
+                "expires_at": expires_at,
+                "scope": scope,
+                "code_challenge": code_challenge,
+                "code_challenge_method": code_challenge_method,
+            }
+            heapq.heappush(self._expiry["authorization_codes"], (expires_at, code))
+        return code
+
+    def get_authorization_code(self, code):
+        row = self._authorization_codes.get(code)
+        return _project(AuthorizationCodeRecord, row) if row else None
+
+    def delete_authorization_code(self, code):
+        with self._lock:
+            self._authorization_codes.pop(code, None)
+
+    def redeem_authorization_code(self, code, issue):
+        with self._lock:
+            row = self._authorization_codes.pop(code, None)
+            if row is None:
+                return None
+            try:
+                return self._issue(_project(AuthorizationCodeRecord, row), issue)
+            except BaseException:
+                self._authorization_codes[code] = row
+                raise
+
+    def create_token(self, access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id):
+        with self._lock:
+            self._create_token(
+                access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id
+            )
+
+    def _create_token(self, access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id):
+        refresh_expires_at = timestamp(refresh_expiry(refresh_token, expires_at, refresh_expires_at))
+        expires_at = timestamp(expires_at)
+        access_token_hash = token_digest(access_token)
+        refresh_token_hash = token_digest(refresh_token) if refresh_token is not None else None
+        if access_token_hash in self._tokens:
+            raise _unique_violation("tokens.access_token_hash")
+        if refresh_token_hash is not None and refresh_token_hash in self._access_hashes_by_refresh_hash:
+            raise _unique_violation("tokens.refresh_token_hash")
+        self._tokens[access_token_hash] = {
+            "access_token_hash": access_token_hash,
+            "refresh_token_hash": refresh_token_hash,
+            "token_type": token_type,
+            "expires_at": expires_at,
+            "refresh_expires_at": refresh_expires_at,
+            "scope": scope,
+            "client_id": client_id,
+            "user_id": user_id,
+        }
+        if refresh_token_hash is not None:
+            self._access_hashes_by_refresh_hash[refresh_token_hash] = access_token_hash
+        heapq.heappush(self._expiry["tokens"], (refresh_expires_at, access_token_hash))
+
+    def _issue(self, consumed, issue):
+        # Caller holds the lock and restores the consumed row if this raises
+        token = issue(consumed)
+        if token is not None:
+            self._create_token(**token)
+        return consumed, token
+
+    def get_token(self, access_token):
+        row = self._tokens.get(token_digest(access_token))
+        return _project(TokenRecord, row) if row else None
+
+    def get_tokens(self, access_tokens):
+        return [self.get_token(access_token) for access_token in access_tokens]
+
+    def get_token_by_refresh_token(self, refresh_token):
+        access_token_hash = self._access_hashes_by_refresh_hash.get(token_digest(refresh_token))
+        row = self._tokens.get(access_token_hash) if access_token_hash else None
+        return _project(TokenRecord, row) if row else None
+
+    def delete_token(self, access_token):
+        with self._lock:
+            self._delete_token(token_digest(access_token))
+
+    def _delete_token(self, access_token_hash):
+        row = self._tokens.pop(access_token_hash, None)
+        if row and row["refresh_token_hash"] is not None:
+            self._access_hashes_by_refresh_hash.pop(row["refresh_token_hash"], None)
+        return row
+
+    def rotate_refresh_token(self, refresh_token, issue):
+        with self._lock:
+            refresh_token_hash = token_digest(refresh_token)
+            access_token_hash = self._access_hashes_by_refresh_hash.get(refresh_token_hash)
+            if access_token_hash is None:
+                return None
+            row = self._delete_token(access_token_hash)
+            try:
+                return self._issue(_project(TokenRecord, row), issue)
+            except BaseException:
+                self._tokens[access_token_hash] = row
+                self._access_hashes_by_refresh_hash[refresh_token_hash] = access_token_hash
+                raise
+
+    def revoke_token(self, access_token_hash, expires_at):
+        expires_at = timestamp(expires_at)
+        with self._lock:
+            if access_token_hash in self._revoked_tokens:
+                return
+            self._revoked_tokens[access_token_hash] = {
+                "id": next(self._revoked_ids),
+                "token_hash": access_token_hash,
+                "expires_at": expires_at,
+            }
+            heapq.heappush(self._expiry["revoked_tokens"], (expires_at, access_token_hash))
+
+    def is_token_revoked(self, access_token_hash):
+        return access_token_hash in self._revoked_tokens
+
+    def list_revoked_tokens(self, after_id):
+        with self._lock:
+            rows = [row for row in self._revoked_tokens.values() if row["id"] > after_id]
+        return sorted((row["id"], row["token_hash"]) for row in rows)
+
+    def create_device_code(self, device_code, user_code, client_id, scope, expires_at, verification_uri, interval):
+        expires_at = timestamp(expires_at)
+        with self._lock:
+            if device_code in self._device_codes:
+                raise _unique_violation("device_codes.device_code")
+            if user_code in self._device_codes_by_user_code:
+                raise _unique_violation("device_codes.user_code")
+            self._device_codes[device_code] = {
+                "device_code": device_code,
+                "user_code": user_code,
+                "client_id": client_id,
+                "scope": scope,
+                "expires_at": expires_at,
+                "user_id": None,
+                "verification_uri": verification_uri,
+                "interval": interval,
+                "is_approved": False,
+            }
+            self._device_codes_by_user_code[user_code] = device_code
+            heapq.heappush(self._expiry["device_codes"], (expires_at, device_code))
+
+    def get_device_code(self, device_code):
+        row = self._device_codes.get(device_code)
+        return _project(DeviceCodeRecord, row) if row else None
+
+    def get_device_codes(self, device_codes):
+        return [self.get_device_code(device_code) for device_code in device_codes]
+
+    def get_device_code_by_user_code(self, user_code):
+        device_code = self._device_codes_by_user_code.get(user_code)
+        return self.get_device_code(device_code) if device_code else None
+
+    def approve_device_code(self, user_code, user_id):
+        with self._lock:
+            device_code = self._device_codes_by_user_code.get(user_code)
+            if device_code:
+                row = self._device_codes[device_code]
+                self._device_codes[device_code] = {**row, "is_approved": True, "user_id": user_id}
+
+    def delete_expired(self, table, now, batch_size):
+        now = timestamp(now)
+        rows = {
+            "authorization_codes": self._authorization_codes,
+            "tokens": self._tokens,
+            "device_codes": self._device_codes,
+            "revoked_tokens": self._revoked_tokens,
+        }[table]
+        heap = self._expiry[table]
+        column = EXPIRES_BY.get(table, "expires_at")
+        removed = 0
+        with self._lock:
+            while heap and heap[0][0] < now and removed < batch_size:
+                expires_at, key = heapq.heappop(heap)
+                row = rows.get(key)
+                # Skip heap entries for rows that were already deleted
+                if row is None or row[column] != expires_at:
+                    continue
+                if table == "tokens":
+                    self._delete_token(key)
+                elif table == "device_codes":
+                    del rows[key]
+                    self._device_codes_by_user_code.pop(row["user_code"], None)
+                else:
+                    del rows[key]
+                removed += 1
+        return removed
+
+    def stats(self):
+        return {}
+
+    def close(self):
+        pass
@@ -0,0 +1,155 @@
+import mmap
+import os
+import struct
+
+_MAGIC = b"TKIDX001"
+_HEADER = struct.Struct("<8sQQQIQB")  # magic, capacity, used, tombstones, checkpoint segment/offset, clean
+_HEADER_SIZE = 64
+_SLOT = struct.Struct("<32sIQ")  # key, segment, offset
+_EMPTY = 0
+_TOMBSTONE = 0xFFFFFFFF
+_MAX_LOAD = 0.7
+
+
+class MmapHashIndex:
+    """Open-addressing hash table from 32-byte digests to log locations.
+
+    The table lives in a memory-mapped file so it survives restarts without a
+    full log replay. Keys are SHA-256 digests and already uniformly
+    distributed, so their first 8 bytes are used directly as the hash. Slots
+    with segment 0 are empty; segment numbers start at 1.
+    """
+
+    def __init__(self, path, capacity=1 << 16):
+        self.path = path
+        if not os.path.exists(path):
+            self._create(path, capacity)
+        self._open()
+        if self._read_header()[0] != _MAGIC:
+            self.close()
+            self._create(path, capacity)
+            self._open()
+
+    @staticmethod
+    def _create(path, capacity):
+        with open(path, "wb") as f:
+            f.truncate(_HEADER_SIZE + capacity * _SLOT.size)
+            f.write(_HEADER.pack(_MAGIC, capacity, 0, 0, 0, 0, 0))
+
+    def _open(self):
+        self._file = open(self.path, "r+b")
+        self._map = mmap.mmap(self._file.fileno(), 0)
+        _, self.capacity, self._used, self._tombstones, _, _, _ = self._read_header()
+
+    def _read_header(self):
+        return _HEADER.unpack_from(self._map, 0)
+
+    def _write_header(self, checkpoint=None, clean=None):
+        _, _, _, _, segment, offset, was_clean = self._read_header()
+        if checkpoint is not None:
+            segment, offset = checkpoint
+        _HEADER.pack_into(
+            self._map, 0, _MAGIC, self.capacity, self._used, self._tombstones,
+            segment, offset, was_clean if clean is None else int(clean)
+        )
+
+    @property
+    def clean(self):
+        return bool(self._read_header()[6])
+
+    @property
+    def checkpoint(self):
+        _, _, _, _, segment, offset, _ = self._read_header()
+        return segment, offset
+
+    def mark_dirty(self):
+        self._write_header(clean=False)
+
+    def mark_clean(self, checkpoint):
+        self._write_header(checkpoint=checkpoint, clean=True)
+        self._map.flush()
+
+    def __len__(self):
+        return self._used - self._tombstones
+
+    def _slots(self, key):
+        index = int.from_bytes(key[:8], "little") % self.capacity
+        for _ in range(self.capacity):
+            yield _HEADER_SIZE + index * _SLOT.size
+            index = (index + 1) % self.capacity
+
+    def get(self, key):
+        for position in self._slots(key):
+            slot_key, segment, offset = _SLOT.unpack_from(self._map, position)
+            if segment == _EMPTY:
+                return None
+            if segment != _TOMBSTONE and slot_key == key:
+                return segment, offset
+        return None
+
+    def put(self, key, segment, offset):
+        # _used counts occupied slots, tombstones included, since both lengthen probes
+        if self._used + 1 > self.capacity * _MAX_LOAD:
+            self._grow()
+        tombstone = None
+        for position in self._slots(key):
+            slot_key, slot_segment, _ = _SLOT.unpack_from(self._map, position)
+            if slot_segment == _EMPTY:
+                if tombstone is not None:
+                    position = tombstone
+                    self._tombstones -= 1
+                else:
+                    self._used += 1
+                break
+            if slot_segment == _TOMBSTONE:
+                if tombstone is None:
+                    tombstone = position
+            elif slot_key == key:
+                break
+        else:
+            position = tombstone
+            self._tombstones -= 1
+        _SLOT.pack_into(self._map, position, key, segment, offset)
+
+    def delete(self, key):
+        for position in self._slots(key):
+            slot_key, segment, _ = _SLOT.unpack_from(self._map, position)
+            if segment == _EMPTY:
+                return False
+            if segment != _TOMBSTONE and slot_key == key:
+                _SLOT.pack_into(self._map, position, slot_key, _TOMBSTONE, 0)
+                self._tombstones += 1
+                return True
+        return False
+
+    def items(self):
+        for i in range(self.capacity):
+            key, segment, offset = _SLOT.unpack_from(self._map, _HEADER_SIZE + i * _SLOT.size)
+            if segment not in (_EMPTY, _TOMBSTONE):
+                yield key, segment, offset
+
+    def clear(self):
+        capacity = self.capacity
+        self.close()
+        self._create(self.path, capacity)
+        self._open()
+
+    def _grow(self):
+        # Rehash live entries into a table twice the size (tombstones are dropped)
+        entries = list(self.items())
+        capacity = self.capacity * 2 if len(entries) > self.capacity * _MAX_LOAD / 2 else self.capacity
+        checkpoint = self.checkpoint
+        tmp_path = self.path + ".tmp"
+        self._create(tmp_path, capacity)
+        self.close()
+        os.replace(tmp_path, self.path)
+        self._open()
+        for key, segment, offset in entries:
+            self.put(key, segment, offset)
+        self._write_header(checkpoint=checkpoint, clean=False)
+
+    def close(self):
+        self._write_header()
+        self._map.flush()
+        self._map.close()
+        self._file.close()
@@ -0,0 +1,139 @@
+import sqlite3
+
+from service.config import DB_POOL, DB_PRAGMAS
+from service.database import operations
+from service.database.pool import ConnectionPool
+from service.database.shards import SHARDED_TABLES, shard_paths, shard_index
+from service.storage.sqlite import SQLiteStorage
+from service.utils.security import generate_token, token_digest
+
+
+def _run(pool, func, *args, **kwargs):
+    with pool.connection() as db:
+        return func(*args, db=db, **kwargs)
+
+
+class ShardedSQLiteStorage(SQLiteStorage):
+    """SQLiteStorage with tokens, authorization codes and device codes in shard files.
+
+    Each shard has its own file and pool, so writers to different shards do
+    not wait on one another's write lock. Lookups by the routing key (access
+    token, code, device_code) go to one shard; lookups by refresh token or
+    user_code ask each shard in turn. Redeeming a code or rotating a refresh
+    token consumes the old row in its shard first and then stores the new
+    token in the token's shard, so a failure between the two can cost the
+    client its grant but never yields two tokens for one.
+    """
+
+    def __init__(self, shards=None, pool=None, tokens=None):
+        super().__init__(pool, tokens)
+        self.shards = shards or [ConnectionPool(path, pragmas=DB_PRAGMAS, **DB_POOL) for path in shard_paths()]
+
+    def _shard(self, key):
+        return self.shards[shard_index(token_digest(key), len(self.shards))]
+
+    def _scatter(self, func, *args):
+        for pool in self.shards:
+            result = _run(pool, func, *args)
+            if result is not None:
+                return pool, result
+        return None, None
+
+    def _gather(self, func, keys):
+        # One batched lookup per shard holding any of the keys, results in key order
+        positions = {}
+        for position, key in enumerate(keys):
+            positions.setdefault(shard_index(token_digest(key), len(self.shards)), []).append(position)
+        records = [None] * len(keys)
+        for shard, shard_positions in positions.items():
+            found = _run(self.shards[shard], func, [keys[p] for p in shard_positions])
+            for position, record in zip(shard_positions, found):
+                records[position] = record
+        return records
+
+    def create_authorization_code(self, client_id, redirect_uri, user_id, scope, code_challenge, code_challenge_method):
+        code = generate_token()
+        return _run(
+            self._shard(code), operations.create_authorization_code,
+            client_id, redirect_uri, user_id, scope, code_challenge, code_challenge_method, code=code
+        )
+
+    def get_authorization_code(self, code):
+        return _run(self._shard(code), operations.get_authorization_code, code)
+
+    def delete_authorization_code(self, code):
+        _run(self._shard(code), operations.delete_authorization_code, code)
+
+    def redeem_authorization_code(self, code, issue):
+        result = _run(self._shard(code), operations.redeem_authorization_code, code, issue, store_token=False)
+        if result is not None and result[1] is not None:
+            self.create_token(**result[1])
+        return result
+
+    def create_token(self, access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id):
+        _run(
+            self._shard(access_token), operations.create_token,
+            access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id
+        )
+
+    def get_token(self, access_token):
+        return _run(self._shard(access_token), operations.get_token, access_token)
+
+    def get_tokens(self, access_tokens):
+        return self._gather(operations.get_tokens, access_tokens)
+
+    def get_token_by_refresh_token(self, refresh_token):
+        return self._scatter(operations.get_token_by_refresh_token, refresh_token)[1]
+
+    def delete_token(self, access_token):
+        _run(self._shard(access_token), operations.delete_token, access_token)
+
+    def rotate_refresh_token(self, refresh_token, issue):
+        # Find the shard with a read, then consume there; a concurrent rotation
+        # that got there first leaves nothing to delete and this returns None
+        pool, _ = self._scatter(operations.get_token_by_refresh_token, refresh_token)
+        if pool is None:
+            return None
+        result = _run(pool, operations.rotate_refresh_token, refresh_token, issue, store_token=False)
+        if result is not None and result[1] is not None:
+            self.create_token(**result[1])
+        return result
+
+    def create_device_code(self, device_code, user_code, client_id, scope, expires_at, verification_uri, interval):
+        # UNIQUE(user_code) only holds within a shard, so check the others first
+        if self._scatter(operations.get_device_code_by_user_code, user_code)[0] is not None:
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: device_codes.user_code")
+        _run(
+            self._shard(device_code), operations.create_device_code,
+            device_code, user_code, client_id, scope, expires_at, verification_uri, interval
+        )
+
+    def get_device_code(self, device_code):
+        return _run(self._shard(device_code), operations.get_device_code, device_code)
+
+    def get_device_codes(self, device_codes):
+        return self._gather(operations.get_device_codes, device_codes)
+
+    def get_device_code_by_user_code(self, user_code):
+        return self._scatter(operations.get_device_code_by_user_code, user_code)[1]
+
+    def approve_device_code(self, user_code, user_id):
+        pool, _ = self._scatter(operations.get_device_code_by_user_code, user_code)
+        if pool is not None:
+            _run(pool, operations.approve_device_code, user_code, user_id)
+
+    def delete_expired(self, table, now, batch_size):
+        if table == "tokens" and self.tokens is not None:
+            return self.tokens.delete_expired(now, batch_size)
+        if table not in SHARDED_TABLES:
+            return super().delete_expired(table, now, batch_size)
+        # One batch per shard; the reaper calls again while the total fills a batch
+        return sum(_run(pool, operations.delete_expired, table, now, batch_size) for pool in self.shards)
+
+    def stats(self):
+        return {**super().stats(), "shards": [pool.stats() for pool in self.shards]}
+
+    def close(self):
+        for pool in self.shards:
+            pool.close()
+        super().close()
@@ -0,0 +1,90 @@
+import functools
+
+from service.database import operations
+
+
+def _pooled(func):
+    @functools.wraps(func)
+    def method(self, *args, **kwargs):
+        with self.pool.connection() as db:
+            return func(*args, db=db, **kwargs)
+    return method
+
+
+class SQLiteStorage:
+    """StorageBackend over operations.py, one pooled connection per call."""
+
+    blocking = True
+
+    def __init__(self, pool=None, tokens=None):
+        self.pool = pool or operations.get_pool()
+        self.tokens = tokens
+        if tokens is not None:
+            # Token rows live in the token store; codes, clients and users stay here
+            self.create_token = tokens.create_token
+            self.get_token = tokens.get_token
+            self.get_tokens = tokens.get_tokens
+            self.get_token_by_refresh_token = tokens.get_token_by_refresh_token
+            self.delete_token = tokens.delete_token
+            self.rotate_refresh_token = tokens.rotate_refresh_token
+
+    validate_redirect_uri = _pooled(operations.validate_redirect_uri)
+    get_client = _pooled(operations.get_client)
+    get_client_credentials = _pooled(operations.get_client_credentials)
+    create_client = _pooled(operations.create_client)
+
+    get_user = _pooled(operations.get_user)
+    get_user_by_id = _pooled(operations.get_user_by_id)
+    get_users_by_id = _pooled(operations.get_users_by_id)
+    list_users = _pooled(operations.list_users)
+    create_user = _pooled(operations.create_user)
+    update_password_hash = _pooled(operations.update_password_hash)
+
+    create_authorization_code = _pooled(operations.create_authorization_code)
+    get_authorization_code = _pooled(operations.get_authorization_code)
+    delete_authorization_code = _pooled(operations.delete_authorization_code)
+
+    create_token = _pooled(operations.create_token)
+    get_token = _pooled(operations.get_token)
+    get_tokens = _pooled(operations.get_tokens)
+    get_token_by_refresh_token = _pooled(operations.get_token_by_refresh_token)
+    delete_token = _pooled(operations.delete_token)
+    rotate_refresh_token = _pooled(operations.rotate_refresh_token)
+
+    revoke_token = _pooled(operations.revoke_token)
+    is_token_revoked = _pooled(operations.is_token_revoked)
+    list_revoked_tokens = _pooled(operations.list_revoked_tokens)
+
+    create_device_code = _pooled(operations.create_device_code)
+    get_device_code = _pooled(operations.get_device_code)
+    get_device_codes = _pooled(operations.get_device_codes)
+    get_device_code_by_user_code = _pooled(operations.get_device_code_by_user_code)
+    approve_device_code = _pooled(operations.approve_device_code)
+
+    def redeem_authorization_code(self, code, issue):
+        with self.pool.connection() as db:
+            if self.tokens is None:
+                return operations.redeem_authorization_code(code, issue, db)
+            result = operations.redeem_authorization_code(code, issue, db, store_token=False)
+        # The code is consumed before the token is stored, so a failed append
+        # can cost the client its code but never yields two tokens for one
+        if result is not None and result[1] is not None:
+            self.tokens.create_token(**result[1])
+        return result
+
+    def delete_expired(self, table, now, batch_size):
+        if table == "tokens" and self.tokens is not None:
+            return self.tokens.delete_expired(now, batch_size)
+        with self.pool.connection() as db:
+            return operations.delete_expired(table, now, batch_size, db)
+
+    def stats(self):
+        stats = {"pool": self.pool.stats()}
+        if self.tokens is not None:
+            stats["token_log"] = self.tokens.stats()
+        return stats
+
+    def close(self):
+        if self.tokens is not None:
+            self.tokens.close()
+        self.pool.close()
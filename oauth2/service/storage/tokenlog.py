@@ -0,0 +1,498 @@
+"""Append-only, log-structured token store.
+
+Tokens are written as CRC-checked records to numbered segment files and
+located through two memory-mapped hash indexes (access digest and refresh
+digest -> segment/offset). Deletes append a tombstone record. Compaction
+rewrites the sealed segments keeping only live tokens whose refresh token
+has not expired.
+
+On a clean shutdown the indexes are checkpointed and reopen as-is. After a
+crash they are rebuilt by replaying every segment; a torn record at the tail
+of the last segment is truncated away.
+
+Compaction commits by renaming its output to ``<segment>.log.compact``. The
+segments it replaces are removed before that file takes their place, and a
+crash anywhere in between is finished on the next open, so a sealed PUT is
+never replayed without the tombstones that were compacted away with it.
+
+One process owns a log directory at a time (enforced with flock), so this
+store suits a single worker. Code and device flows stay in SQLite.
+"""
+import fcntl
+import os
+import sqlite3
+import struct
+import threading
+import zlib
+from datetime import datetime
+
+from service.config import TOKEN_EXPIRATION
+from service.database.operations import refresh_expiry
+from service.database.records import TokenRecord
+from service.storage.base import timestamp
+from service.storage.mmap_index import MmapHashIndex
+from service.utils.security import token_digest
+
+_RECORD = struct.Struct("<IBI")  # crc32 of everything after it, op, payload length
+_DIGESTS = struct.Struct("<32s32sB")  # access hash, refresh hash, flags
+_USER_ID = struct.Struct("<q")
+_STRING = struct.Struct("<H")
+_NONE = 0xFFFF
+
+_PUT = 1
+_DEL = 2
+
+_HAS_REFRESH = 1
+_HAS_USER = 2
+_HAS_REFRESH_EXPIRY = 4
+
+# Records written before the refresh expiry was stored get the configured
+# lifetimes, like rows backfilled by migration 5
+_LEGACY_REFRESH_EXTENSION = TOKEN_EXPIRATION["refresh_token"] - TOKEN_EXPIRATION["access_token"]
+
+_NO_DIGEST = bytes(32)
+
+
+def _fsync_directory(directory):
+    fd = os.open(directory, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _segment_number(name):
+    return int(name.split(".")[0])
+
+
+def _finish_compaction(directory):
+    """Roll an interrupted compaction forward if it committed, else back."""
+    names = os.listdir(directory)
+    for name in names:
+        if name.endswith(".compact.tmp"):
+            os.remove(os.path.join(directory, name))
+    for name in names:
+        if not name.endswith(".log.compact"):
+            continue
+        target = _segment_number(name)
+        for other in names:
+            if other.endswith(".log") and _segment_number(other) <= target:
+                os.remove(os.path.join(directory, other))
+        _fsync_directory(directory)
+        os.replace(os.path.join(directory, name), os.path.join(directory, name[:-len(".compact")]))
+    _fsync_directory(directory)
+
+
+def _pack_str(value):
+    if value is None:
+        return _STRING.pack(_NONE)
+    data = value.encode()
+    return _STRING.pack(len(data)) + data
+
+
+def _unpack_str(buffer, offset):
+    (length,) = _STRING.unpack_from(buffer, offset)
+    offset += _STRING.size
+    if length == _NONE:
+        return None, offset
+    return bytes(buffer[offset:offset + length]).decode(), offset + length
+
+
+def _record(op, payload):
+    body = bytes([op]) + len(payload).to_bytes(4, "little") + payload
+    return zlib.crc32(body).to_bytes(4, "little") + body
+
+
+def _put_payload(access_token_hash, refresh_token_hash, token_type, expires_at, refresh_expires_at,
+                 scope, client_id, user_id):
+    flags = (_HAS_REFRESH if refresh_token_hash else 0) | (_HAS_USER if user_id is not None else 0) \
+        | _HAS_REFRESH_EXPIRY
+    return b"".join((
+        _DIGESTS.pack(access_token_hash, refresh_token_hash or _NO_DIGEST, flags),
+        _USER_ID.pack(user_id if user_id is not None else 0),
+        _pack_str(client_id),
+        _pack_str(scope),
+        _pack_str(expires_at),
+        _pack_str(token_type),
+        _pack_str(refresh_expires_at),
+    ))
+
+
+def _parse_put(payload):
+    access_token_hash, refresh_token_hash, flags = _DIGESTS.unpack_from(payload, 0)
+    offset = _DIGESTS.size
+    (user_id,) = _USER_ID.unpack_from(payload, offset)
+    offset += _USER_ID.size
+    client_id, offset = _unpack_str(payload, offset)
+    scope, offset = _unpack_str(payload, offset)
+    expires_at, offset = _unpack_str(payload, offset)
+    if flags & _HAS_REFRESH_EXPIRY:
+        _, offset = _unpack_str(payload, offset)  # token_type
+        refresh_expires_at, offset = _unpack_str(payload, offset)
+    elif flags & _HAS_REFRESH:
+        refresh_expires_at = timestamp(datetime.fromisoformat(expires_at) + _LEGACY_REFRESH_EXTENSION)
+    else:
+        refresh_expires_at = expires_at
+    record = TokenRecord(
+        access_token_hash, client_id, user_id if flags & _HAS_USER else None, scope, expires_at, refresh_expires_at
+    )
+    return record, refresh_token_hash if flags & _HAS_REFRESH else None
+
+
+def _parse_digests(payload):
+    access_token_hash, refresh_token_hash, flags = _DIGESTS.unpack_from(payload, 0)
+    return access_token_hash, refresh_token_hash if flags & _HAS_REFRESH else None
+
+
+class TokenLog:
+    """Token half of the storage backend, backed by an append-only segment log."""
+
+    def __init__(self, directory, segment_size=64 * 1024 * 1024, fsync=False, index_capacity=1 << 16,
+                 garbage_ratio=0.5):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.fsync = fsync
+        self.garbage_ratio = garbage_ratio
+        self._lock = threading.RLock()
+        self._compact_lock = threading.Lock()
+        # Compaction is skipped while nothing has expired and little is dead.
+        # Both are unknown after a restart, so the first run always compacts.
+        self._earliest_expiry = ""
+        self._garbage = 0
+        os.makedirs(directory, exist_ok=True)
+
+        self._lock_file = open(os.path.join(directory, "LOCK"), "w")
+        try:
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self._lock_file.close()
+            raise RuntimeError(f"Token log {directory} is in use by another process")
+
+        self._readers = {}
+        _finish_compaction(directory)
+        self._segments = sorted(
+            _segment_number(name) for name in os.listdir(directory) if name.endswith(".log")
+        ) or [1]
+        self._access = MmapHashIndex(os.path.join(directory, "access.idx"), index_capacity)
+        self._refresh = MmapHashIndex(os.path.join(directory, "refresh.idx"), index_capacity)
+        self._recover()
+        self._open_active(self._segments[-1])
+
+    def _path(self, segment):
+        return os.path.join(self.directory, f"{segment:08d}.log")
+
+    # Recovery
+
+    def _recover(self):
+        checkpoint = self._access.checkpoint
+        if self._access.clean and self._refresh.clean and checkpoint == self._refresh.checkpoint \
+                and checkpoint[0] in self._segments:
+            replay = [(segment, checkpoint[1] if segment == checkpoint[0] else 0)
+                      for segment in self._segments if segment >= checkpoint[0]]
+        else:
+            self._access.clear()
+            self._refresh.clear()
+            replay = [(segment, 0) for segment in self._segments]
+        self._access.mark_dirty()
+        self._refresh.mark_dirty()
+        for segment, start in replay:
+            self._replay(segment, start)
+
+    def _scan(self, segment, start=0):
+        """Yield ``(offset, op, payload)`` for each intact record from ``start``.
+
+        Stops at the first short or corrupt record and yields its offset as
+        ``(offset, None, None)`` so the caller can truncate the tail.
+        """
+        path = self._path(segment)
+        if not os.path.exists(path):
+            return
+        with open(path, "rb") as f:
+            data = f.read()
+        offset = start
+        while offset < len(data):
+            if offset + _RECORD.size > len(data):
+                yield offset, None, None
+                return
+            crc, op, length = _RECORD.unpack_from(data, offset)
+            end = offset + _RECORD.size + length
+            if end > len(data) or zlib.crc32(data[offset + 4:end]) != crc:
+                yield offset, None, None
+                return
+            yield offset, op, memoryview(data)[offset + _RECORD.size:end]
+            offset = end
+
+    def _replay(self, segment, start):
+        for offset, op, payload in self._scan(segment, start):
+            if op is None:
+                with open(self._path(segment), "r+b") as f:
+                    f.truncate(offset)
+                return
+            self._apply(op, payload, segment, offset)
+
+    def _apply(self, op, payload, segment, offset):
+        access_token_hash, refresh_token_hash = _parse_digests(payload)
+        if op == _PUT:
+            self._access.put(access_token_hash, segment, offset)
+            if refresh_token_hash:
+                self._refresh.put(refresh_token_hash, segment, offset)
+        elif op == _DEL:
+            self._access.delete(access_token_hash)
+            if refresh_token_hash:
+                self._refresh.delete(refresh_token_hash)
+
+    # Segment files
+
+    def _open_active(self, segment):
+        self._active = segment
+        self._active_fd = os.open(self._path(segment), os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._active_size = os.fstat(self._active_fd).st_size
+
+    def _roll(self):
+        os.close(self._active_fd)
+        self._segments.append(self._active + 1)
+        self._open_active(self._active + 1)
+
+    def _append(self, data):
+        if self._active_size + len(data) > self.segment_size and self._active_size:
+            self._roll()
+        offset = self._active_size
+        os.write(self._active_fd, data)
+        if self.fsync:
+            os.fsync(self._active_fd)
+        self._active_size += len(data)
+        return self._active, offset
+
+    def _reader(self, segment):
+        fd = self._readers.get(segment)
+        if fd is None:
+            fd = self._readers[segment] = os.open(self._path(segment), os.O_RDONLY)
+        return fd
+
+    def _read(self, location):
+        segment, offset = location
+        fd = self._reader(segment)
+        _, _, length = _RECORD.unpack(os.pread(fd, _RECORD.size, offset))
+        return os.pread(fd, length, offset + _RECORD.size)
+
+    # Token operations
+
+    def _check_unique(self, access_token_hash, refresh_token_hash):
+        # Same errors the UNIQUE indexes raise on the SQLite tokens table
+        if self._access.get(access_token_hash) is not None:
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: tokens.access_token_hash")
+        if refresh_token_hash is not None and self._refresh.get(refresh_token_hash) is not None:
+            raise sqlite3.IntegrityError("UNIQUE constraint failed: tokens.refresh_token_hash")
+
+    def _create_token(self, access_token, refresh_token, token_type, expires_at, refresh_expires_at,
+                      scope, client_id, user_id):
+        access_token_hash = token_digest(access_token)
+        refresh_token_hash = token_digest(refresh_token) if refresh_token is not None else None
+        self._check_unique(access_token_hash, refresh_token_hash)
+        refresh_expires_at = timestamp(refresh_expiry(refresh_token, expires_at, refresh_expires_at))
+        payload = _put_payload(
+            access_token_hash, refresh_token_hash, token_type, timestamp(expires_at), refresh_expires_at,
+            scope, client_id, user_id
+        )
+        segment, offset = self._append(_record(_PUT, payload))
+        self._apply(_PUT, payload, segment, offset)
+        # A token is only dropped once its refresh token has expired as well
+        if self._earliest_expiry is None or refresh_expires_at < self._earliest_expiry:
+            self._earliest_expiry = refresh_expires_at
+
+    def _delete(self, access_token_hash, refresh_token_hash, put_size):
+        payload = _DIGESTS.pack(
+            access_token_hash, refresh_token_hash or _NO_DIGEST, _HAS_REFRESH if refresh_token_hash else 0
+        )
+        record = _record(_DEL, payload)
+        segment, offset = self._append(record)
+        self._apply(_DEL, payload, segment, offset)
+        self._garbage += put_size + len(record)
+
+    def create_token(self, access_token, refresh_token, token_type, expires_at, refresh_expires_at,
+                     scope, client_id, user_id):
+        with self._lock:
+            self._create_token(
+                access_token, refresh_token, token_type, expires_at, refresh_expires_at, scope, client_id, user_id
+            )
+
+    def get_token(self, access_token):
+        with self._lock:
+            location = self._access.get(token_digest(access_token))
+            return _parse_put(self._read(location))[0] if location else None
+
+    def get_tokens(self, access_tokens):
+        digests = [token_digest(access_token) for access_token in access_tokens]
+        with self._lock:
+            locations = [self._access.get(digest) for digest in digests]
+            return [_parse_put(self._read(location))[0] if location else None for location in locations]
+
+    def get_token_by_refresh_token(self, refresh_token):
+        with self._lock:
+            location = self._refresh.get(token_digest(refresh_token))
+            return _parse_put(self._read(location))[0] if location else None
+
+    def delete_token(self, access_token):
+        with self._lock:
+            location = self._access.get(token_digest(access_token))
+            if location:
+                payload = self._read(location)
+                record, refresh_token_hash = _parse_put(payload)
+                self._delete(record.access_token_hash, refresh_token_hash, _RECORD.size + len(payload))
+
+    def rotate_refresh_token(self, refresh_token, issue):
+        # Holding the lock across issue() makes the rotation atomic; nothing is
+        # appended until it returns and the new token is known not to collide
+        with self._lock:
+            location = self._refresh.get(token_digest(refresh_token))
+            if location is None:
+                return None
+            payload = self._read(location)
+            consumed, refresh_token_hash = _parse_put(payload)
+            token = issue(consumed)
+            if token is not None:
+                refresh_token = token["refresh_token"]
+                self._check_unique(
+                    token_digest(token["access_token"]),
+                    token_digest(refresh_token) if refresh_token is not None else None
+                )
+            self._delete(consumed.access_token_hash, refresh_token_hash, _RECORD.size + len(payload))
+            if token is not None:
+                self._create_token(**token)
+            return consumed, token
+
+    def delete_expired(self, now, batch_size=None):
+        """Compact the log if a token has expired or enough of it is dead.
+
+        Returns how many expired tokens were dropped. Space is reclaimed a
+        segment at a time rather than row by row, so ``batch_size`` is
+        accepted for interface parity and ignored.
+        """
+        now = timestamp(now)
+        with self._lock:
+            due = self._earliest_expiry is not None and self._earliest_expiry < now
+            wasteful = self._garbage > self.garbage_ratio * self._size()
+        if not (due or wasteful):
+            return 0
+        return self.compact(now)["expired"]
+
+    # Compaction
+
+    def _size(self):
+        return sum(os.path.getsize(self._path(segment)) for segment in self._segments)
+
+    def compact(self, now=None):
+        with self._compact_lock:
+            try:
+                return self._compact(timestamp(now or datetime.now()))
+            except BaseException:
+                # Estimates were reset for a pass that did not finish; retry next run
+                with self._lock:
+                    self._earliest_expiry = ""
+                raise
+
+    def _compact(self, now):
+        """Rewrite the sealed segments into one, keeping live unexpired tokens.
+
+        The active segment is sealed first so writers carry on in a fresh
+        one. Sealed segments are immutable, so they are read without the
+        lock; only the liveness check, the rewrite and the index update hold
+        it. The output takes the number of the newest sealed segment, which
+        keeps it ahead of every later delete during replay. It is committed
+        under its own name and only replaces the sealed segments once they
+        are all gone; see _finish_compaction for the recovery side.
+        """
+        with self._lock:
+            if self._active_size:
+                self._roll()
+            sealed = self._segments[:-1]
+            # From here on both estimates only track the active segment
+            self._garbage = 0
+            self._earliest_expiry = None
+        stats = {"segments": len(sealed), "live": 0, "expired": 0, "bytes_before": 0, "bytes_after": 0}
+        if not sealed:
+            return stats
+
+        candidates = []
+        for segment in sealed:
+            stats["bytes_before"] += os.path.getsize(self._path(segment))
+            for offset, op, payload in self._scan(segment):
+                if op == _PUT:
+                    candidates.append((segment, offset, bytes(payload)))
+
+        target = sealed[-1]
+        compact_path = self._path(target) + ".compact"
+        tmp_path = compact_path + ".tmp"
+        with self._lock:
+            buffer = bytearray()
+            moved = []
+            earliest = None
+            for segment, offset, payload in candidates:
+                record, refresh_token_hash = _parse_put(payload)
+                if self._access.get(record.access_token_hash) != (segment, offset):
+                    continue
+                if record.refresh_expires_at < now:
+                    self._access.delete(record.access_token_hash)
+                    if refresh_token_hash:
+                        self._refresh.delete(refresh_token_hash)
+                    stats["expired"] += 1
+                    continue
+                if earliest is None or record.refresh_expires_at < earliest:
+                    earliest = record.refresh_expires_at
+                moved.append((record.access_token_hash, refresh_token_hash, len(buffer)))
+                buffer += _record(_PUT, payload)
+
+            with open(tmp_path, "wb") as f:
+                f.write(buffer)
+                f.flush()
+                os.fsync(f.fileno())
+            for segment in sealed:
+                fd = self._readers.pop(segment, None)
+                if fd is not None:
+                    os.close(fd)
+            # Commit point: from here a reopen finishes the swap
+            os.replace(tmp_path, compact_path)
+            _fsync_directory(self.directory)
+            for segment in sealed:
+                os.remove(self._path(segment))
+            _fsync_directory(self.directory)
+            os.replace(compact_path, self._path(target))
+            _fsync_directory(self.directory)
+            self._segments = [target] + self._segments[len(sealed):]
+            if earliest is not None and (self._earliest_expiry is None or earliest < self._earliest_expiry):
+                self._earliest_expiry = earliest
+
+            for access_token_hash, refresh_token_hash, offset in moved:
+                self._access.put(access_token_hash, target, offset)
+                if refresh_token_hash:
+                    self._refresh.put(refresh_token_hash, target, offset)
+
+        stats["live"] = len(moved)
+        stats["bytes_after"] = len(buffer)
+        return stats
+
+    def stats(self):
+        with self._lock:
+            return {
+                "segments": len(self._segments),
+                "tokens": len(self._access),
+                "bytes": self._size(),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._active_fd is None:
+                return
+            os.fsync(self._active_fd)
+            os.close(self._active_fd)
+            self._active_fd = None
+            for fd in self._readers.values():
+                os.close(fd)
+            self._readers.clear()
+            checkpoint = (self._active, self._active_size)
+            self._access.mark_clean(checkpoint)
+            self._refresh.mark_clean(checkpoint)
+            self._access.close()
+            self._refresh.close()
+            fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+            self._lock_file.close()
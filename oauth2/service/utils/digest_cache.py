@@ -0,0 +1,83 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class DigestCache:
+    """LRU of values derived from an access token, keyed by its digest.
+
+    An entry lives until the token's ``exp`` or ``max_ttl`` seconds,
+    whichever comes first, so a cached value is never served for an expired
+    token. The TTL also bounds how stale an entry can get when the token or
+    its user is changed by another worker, since invalidation events are
+    per process.
+    """
+
+    def __init__(self, max_entries, max_ttl):
+        self.max_entries = max_entries
+        self.max_ttl = max_ttl
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()  # digest -> (expires_at, user_id, value)
+        self._digests_by_user = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, digest):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(digest)
+            if entry is None or entry[0] <= now:
+                if entry is not None:
+                    self._remove(digest)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(digest)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, digest, exp, user_id, value):
+        expires_at = time.time() + self.max_ttl
+        if exp is not None:
+            expires_at = min(expires_at, exp)
+        with self._lock:
+            self._remove(digest)
+            self._entries[digest] = (expires_at, user_id, value)
+            if user_id is not None:
+                self._digests_by_user.setdefault(user_id, set()).add(digest)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, digest):
+        entry = self._entries.pop(digest, None)
+        if entry is not None and entry[1] is not None:
+            digests = self._digests_by_user.get(entry[1])
+            if digests is not None:
+                digests.discard(digest)
+                if not digests:
+                    del self._digests_by_user[entry[1]]
+
+    def invalidate_token(self, digest):
+        with self._lock:
+            self._remove(digest)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            for digest in self._digests_by_user.pop(user_id, ()):
+                self._entries.pop(digest, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._digests_by_user.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
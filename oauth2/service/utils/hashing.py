@@ -0,0 +1,123 @@
+import asyncio
+import functools
+import multiprocessing
+import statistics
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from service.config import PASSWORD_HASHING
+from service.utils.security import (
+    configure_password_context, get_password_hash, password_context, verify_and_update_password, verify_password
+)
+
+
+class PasswordPoolSaturated(Exception):
+    """Every hashing worker is busy and the wait queue is full."""
+
+
+def _timed(func, *args):
+    # Runs in the worker; time.monotonic is system-wide on Linux, so the
+    # start time can be compared with the submit time in the parent
+    started = time.monotonic()
+    result = func(*args)
+    return started, time.monotonic() - started, result
+
+
+def _warm_up():
+    # Loads passlib in each worker, so neither the server process nor the
+    # first login pays for the import
+    password_context()
+
+
+def _summary(samples):
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p99_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))] * 1000,
+    }
+
+
+class PasswordHasher:
+    """bcrypt on a process pool, so hashing never holds the event loop or the GIL.
+
+    At most ``workers + max_queue`` calls are admitted at once; past that
+    hash/verify raise PasswordPoolSaturated straight away instead of queueing
+    without bound. Queue wait and hash time are sampled separately.
+    """
+
+    def __init__(self, workers=PASSWORD_HASHING["workers"], max_queue=PASSWORD_HASHING["max_queue"], samples=1024):
+        self.workers = workers
+        self.limit = workers + max_queue
+        self.pending = 0
+        self.rejected = 0
+        self._executor = None
+        self._queue_wait = deque(maxlen=samples)
+        self._hash_time = deque(maxlen=samples)
+
+    def start(self):
+        # Fork the workers up front, before the process has other threads;
+        # they inherit the hashing policy, so calibration happens first
+        if self._executor is None:
+            if PASSWORD_HASHING["calibrate"] and PASSWORD_HASHING["rounds"] is None:
+                from service.utils.password_cost import calibrate
+                configure_password_context(rounds=calibrate())
+            self._executor = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("fork"))
+            # With fork, the first submit starts every worker; the warm-ups
+            # finish in the background
+            for _ in range(self.workers):
+                self._executor.submit(_warm_up)
+        return self
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    async def _run(self, func, *args):
+        if self.pending >= self.limit:
+            self.rejected += 1
+            raise PasswordPoolSaturated(f"{self.pending} password hashes in progress")
+        self.start()
+        self.pending += 1
+        submitted = time.monotonic()
+        try:
+            loop = asyncio.get_running_loop()
+            started, elapsed, result = await loop.run_in_executor(
+                self._executor, functools.partial(_timed, func, *args)
+            )
+        finally:
+            self.pending -= 1
+        self._queue_wait.append(max(0.0, started - submitted))
+        self._hash_time.append(elapsed)
+        return result
+
+    async def run(self, func, *args):
+        """Other CPU-bound work that should share these cores and the admission limit."""
+        return await self._run(func, *args)
+
+    async def hash(self, password):
+        return await self._run(get_password_hash, password)
+
+    async def verify(self, password, hashed_password):
+        return await self._run(verify_password, password, hashed_password)
+
+    async def verify_and_update(self, password, hashed_password):
+        return await self._run(verify_and_update_password, password, hashed_password)
+
+    def metrics(self):
+        return {
+            "workers": self.workers,
+            "pending": self.pending,
+            "limit": self.limit,
+            "rejected": self.rejected,
+            "queue_wait": _summary(self._queue_wait),
+            "hash_time": _summary(self._hash_time),
+        }
+
+
+password_hasher = PasswordHasher()
@@ -0,0 +1,209 @@
+"""Compact JWT codec.
+
+HS256/384/512 tokens are byte-for-byte what python-jose produced for our
+claims: the header is the sorted, compact JSON jose writes, and claims are
+compact JSON. The base64 header and the keyed HMAC object are built once per
+codec, so encoding is one JSON dump, one HMAC copy and two base64 calls.
+orjson is used for claims when it is installed.
+
+RS256 and EdDSA codecs wrap a ``cryptography`` key; they sign with a private
+key and verify with either. Those keys come from the key ring in
+service.utils.keys.
+"""
+import base64
+import binascii
+import hashlib
+import hmac
+import json
+import time
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from service.config import SECRET_KEY, ALGORITHM
+
+HMAC_ALGORITHMS = {"HS256": hashlib.sha256, "HS384": hashlib.sha384, "HS512": hashlib.sha512}
+ASYMMETRIC_ALGORITHMS = ("RS256", "EdDSA")
+
+if orjson is not None:
+    _dumps = orjson.dumps
+    _loads = orjson.loads
+else:
+    def _dumps(value):
+        return json.dumps(value, separators=(",", ":")).encode()
+    _loads = json.loads
+
+
+class TokenError(Exception):
+    """The token is malformed, its signature does not match or a claim is invalid."""
+
+
+class ExpiredTokenError(TokenError):
+    pass
+
+
+def _b64encode(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=")
+
+
+def _b64decode(data):
+    return base64.urlsafe_b64decode(data + b"=" * (-len(data) % 4))
+
+
+def _numeric(claims, name):
+    value = claims.get(name)
+    if value is not None and (isinstance(value, bool) or not isinstance(value, (int, float))):
+        raise TokenError(f"Invalid {name} claim, it must be a number")
+    return value
+
+
+class _HMACKey:
+    def __init__(self, secret, digest):
+        self._mac = hmac.new(secret.encode() if isinstance(secret, str) else secret, digestmod=digest)
+
+    def sign(self, signing_input):
+        mac = self._mac.copy()
+        mac.update(signing_input)
+        return mac.digest()
+
+    def verify(self, signing_input, signature):
+        return hmac.compare_digest(self.sign(signing_input), signature)
+
+
+class _AsymmetricKey:
+    def __init__(self, key, algorithm):
+        from cryptography.exceptions import InvalidSignature
+        from cryptography.hazmat.primitives import hashes
+        from cryptography.hazmat.primitives.asymmetric import padding
+
+        self._invalid = InvalidSignature
+        self._private = key if hasattr(key, "public_key") else None
+        self._public = key.public_key() if self._private else key
+        # RS256 is PKCS#1 v1.5 with SHA-256; Ed25519 takes no parameters
+        self._args = (padding.PKCS1v15(), hashes.SHA256()) if algorithm == "RS256" else ()
+
+    def sign(self, signing_input):
+        if self._private is None:
+            raise TokenError("Key can only verify")
+        return self._private.sign(signing_input, *self._args)
+
+    def verify(self, signing_input, signature):
+        try:
+            self._public.verify(signature, signing_input, *self._args)
+            return True
+        except self._invalid:
+            return False
+
+
+class JWTCodec:
+    def __init__(self, key, algorithm=ALGORITHM, kid=None):
+        if algorithm in HMAC_ALGORITHMS:
+            self._key = _HMACKey(key, HMAC_ALGORITHMS[algorithm])
+        elif algorithm in ASYMMETRIC_ALGORITHMS:
+            self._key = _AsymmetricKey(key, algorithm)
+        else:
+            raise ValueError(f"Unsupported algorithm '{algorithm}'")
+        self.algorithm = algorithm
+        self.kid = kid
+        header = {"alg": algorithm, "typ": "JWT"}
+        if kid is not None:
+            header["kid"] = kid
+        self.header = _b64encode(json.dumps(header, separators=(",", ":"), sort_keys=True).encode())
+        self._prefix = self.header + b"."
+
+    def encode(self, claims):
+        signing_input = self._prefix + _b64encode(_dumps(claims))
+        return (signing_input + b"." + _b64encode(self._key.sign(signing_input))).decode()
+
+    def _check_header(self, header):
+        # Anything other than our own serialized header is parsed and must
+        # still name this codec's algorithm (and key, when both carry a kid)
+        if header == self.header:
+            return
+        fields = _loads(_b64decode(header))
+        if not isinstance(fields, dict) or fields.get("alg") != self.algorithm:
+            raise TokenError("The specified alg value is not allowed")
+        if self.kid is not None and fields.get("kid", self.kid) != self.kid:
+            raise TokenError("Token was signed with a different key")
+
+    def decode(self, token, now=None):
+        """Verify ``token`` and return its claims.
+
+        exp, nbf and iat are checked the way jose checked them, with no
+        leeway: a token is valid up to and including its exp second.
+        """
+        try:
+            data = token.encode("ascii") if isinstance(token, str) else token
+            signing_input, _, signature = data.rpartition(b".")
+            header, _, payload = signing_input.partition(b".")
+            if not header or not payload:
+                raise TokenError("Not enough segments")
+            self._check_header(header)
+            if not self._key.verify(signing_input, _b64decode(signature)):
+                raise TokenError("Signature verification failed")
+            claims = _loads(_b64decode(payload))
+        except (binascii.Error, ValueError, UnicodeError) as e:
+            raise TokenError(f"Error decoding token: {e}")
+        if not isinstance(claims, dict):
+            raise TokenError("Invalid payload")
+
+        now = time.time() if now is None else now
+        exp = _numeric(claims, "exp")
+        if exp is not None and exp < int(now):
+            raise ExpiredTokenError("Signature has expired")
+        nbf = _numeric(claims, "nbf")
+        if nbf is not None and nbf > now:
+            raise TokenError("The token is not yet valid (nbf)")
+        _numeric(claims, "iat")
+        return claims
+
+
+class CodecSet:
+    """Signs with one codec and verifies with whichever codec issued the token.
+
+    The verifier is found by the token's raw header segment, which is unique
+    per key, so the header is only parsed for tokens from other issuers.
+    """
+
+    def __init__(self, signer, verifiers):
+        self.signer = signer
+        self._by_header = {codec.header: codec for codec in verifiers}
+        self._by_kid = {codec.kid: codec for codec in verifiers}
+
+    def encode(self, claims):
+        return self.signer.encode(claims)
+
+    def decode(self, token, now=None):
+        data = token.encode("ascii", "replace") if isinstance(token, str) else token
+        header = data.partition(b".")[0]
+        codec = self._by_header.get(header)
+        if codec is None:
+            try:
+                kid = _loads(_b64decode(header)).get("kid")
+            except (binascii.Error, ValueError, AttributeError):
+                raise TokenError("Error decoding token headers")
+            codec = self._by_kid.get(kid)
+            if codec is None:
+                raise TokenError("Unknown signing key")
+        return codec.decode(data, now)
+
+
+_hmac_codec = JWTCodec(SECRET_KEY, ALGORITHM) if ALGORITHM in HMAC_ALGORITHMS else None
+
+
+def _active_codec():
+    if _hmac_codec is not None:
+        return _hmac_codec
+    # Asymmetric algorithms sign with the key ring, which follows rotations on disk
+    from service.utils.keys import get_codecs
+    return get_codecs()
+
+
+def encode_token(claims):
+    return _active_codec().encode(claims)
+
+
+def decode_token(token, now=None):
+    return _active_codec().decode(token, now)
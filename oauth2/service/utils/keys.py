@@ -0,0 +1,266 @@
+"""Signing key ring for RS256 / EdDSA access tokens.
+
+    python -m service.utils.keys init|rotate|prune|show
+
+The ring lives in SIGNING_KEYS["directory"] as one PEM file per key plus
+keyring.json, which records each key's kid, algorithm and status:
+
+- current: signs new tokens
+- next: published in the JWKS but not used yet, so resource servers already
+  hold it when a rotation promotes it
+- retired: no longer signs, still published until the tokens it signed have
+  expired; ``prune`` removes it after that
+
+Rotations should be further apart than JWKS_MAX_AGE so every cached JWKS has
+seen the next key before it starts signing. Running workers pick up a
+rotation within SIGNING_KEYS["reload_interval"] seconds.
+"""
+import argparse
+import base64
+import fcntl
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+from service.config import ALGORITHM, SIGNING_KEYS, TOKEN_EXPIRATION
+from service.utils.jwt_codec import ASYMMETRIC_ALGORITHMS, CodecSet, JWTCodec
+
+_RING_FILE = "keyring.json"
+
+
+def _b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _int_b64(value):
+    return _b64(value.to_bytes((value.bit_length() + 7) // 8, "big"))
+
+
+def generate_key(algorithm):
+    if algorithm == "RS256":
+        from cryptography.hazmat.primitives.asymmetric import rsa
+        return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    if algorithm == "EdDSA":
+        from cryptography.hazmat.primitives.asymmetric import ed25519
+        return ed25519.Ed25519PrivateKey.generate()
+    raise ValueError(f"Unsupported signing algorithm '{algorithm}'")
+
+
+def public_jwk(key, algorithm):
+    """Public JWK for ``key``; the kid is its RFC 7638 thumbprint."""
+    public = key.public_key()
+    if algorithm == "RS256":
+        numbers = public.public_numbers()
+        required = {"e": _int_b64(numbers.e), "kty": "RSA", "n": _int_b64(numbers.n)}
+    else:
+        from cryptography.hazmat.primitives import serialization
+        raw = public.public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        required = {"crv": "Ed25519", "kty": "OKP", "x": _b64(raw)}
+    thumbprint = hashlib.sha256(json.dumps(required, separators=(",", ":"), sort_keys=True).encode()).digest()
+    return {**required, "kid": _b64(thumbprint), "use": "sig", "alg": algorithm}
+
+
+class KeyRing:
+    def __init__(self, directory=SIGNING_KEYS["directory"], algorithm=ALGORITHM):
+        self.directory = directory
+        self.algorithm = algorithm
+        self.entries = []
+        self._keys = {}
+
+    @property
+    def _ring_path(self):
+        return os.path.join(self.directory, _RING_FILE)
+
+    def _key_path(self, kid):
+        return os.path.join(self.directory, f"{kid}.pem")
+
+    @contextmanager
+    def _locked(self):
+        # Serialises init/rotate/prune between workers and the CLI
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, "LOCK"), "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.load()
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def load(self):
+        from cryptography.hazmat.primitives import serialization
+
+        if not os.path.exists(self._ring_path):
+            self.entries, self._keys = [], {}
+            return self
+        with open(self._ring_path) as f:
+            entries = json.load(f)["keys"]
+        keys = {}
+        for entry in entries:
+            with open(self._key_path(entry["kid"]), "rb") as f:
+                keys[entry["kid"]] = serialization.load_pem_private_key(f.read(), password=None)
+        self.entries, self._keys = entries, keys
+        return self
+
+    def _save(self):
+        tmp_path = self._ring_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"keys": self.entries}, f, indent=2)
+        os.replace(tmp_path, self._ring_path)
+
+    def _add(self, status):
+        from cryptography.hazmat.primitives import serialization
+
+        key = generate_key(self.algorithm)
+        kid = public_jwk(key, self.algorithm)["kid"]
+        pem = key.private_bytes(
+            serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption()
+        )
+        fd = os.open(self._key_path(kid), os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(pem)
+        self.entries.append({"kid": kid, "alg": self.algorithm, "status": status, "created_at": int(time.time())})
+        self._keys[kid] = key
+
+    def _with_status(self, status):
+        return [entry for entry in self.entries if entry["status"] == status]
+
+    def init(self):
+        """Create the current and next keys if the ring does not have them yet."""
+        with self._locked():
+            changed = False
+            for status in ("current", "next"):
+                if not self._with_status(status):
+                    self._add(status)
+                    changed = True
+            if changed:
+                self._save()
+        return self
+
+    def rotate(self):
+        """Retire the current key, promote next and generate a new next key.
+
+        A next key of a different algorithm than ALGORITHM is retired as well,
+        so switching algorithms is a rotation.
+        """
+        with self._locked():
+            now = int(time.time())
+            for entry in self._with_status("current"):
+                entry.update(status="retired", retired_at=now)
+            promoted = [entry for entry in self._with_status("next") if entry["alg"] == self.algorithm]
+            for entry in self._with_status("next"):
+                if entry not in promoted:
+                    entry.update(status="retired", retired_at=now)
+            if promoted:
+                promoted[0]["status"] = "current"
+            else:
+                self._add("current")
+            self._add("next")
+            self._save()
+        return self
+
+    def prune(self, max_age=TOKEN_EXPIRATION["access_token"].total_seconds()):
+        """Drop retired keys older than ``max_age`` seconds; returns their kids."""
+        with self._locked():
+            cutoff = time.time() - max_age
+            pruned = [entry["kid"] for entry in self._with_status("retired") if entry["retired_at"] <= cutoff]
+            if pruned:
+                self.entries = [entry for entry in self.entries if entry["kid"] not in pruned]
+                self._save()
+                for kid in pruned:
+                    self._keys.pop(kid, None)
+                    os.remove(self._key_path(kid))
+        return pruned
+
+    def codecs(self):
+        signer = None
+        verifiers = []
+        for entry in self.entries:
+            codec = JWTCodec(self._keys[entry["kid"]], entry["alg"], entry["kid"])
+            verifiers.append(codec)
+            if entry["status"] == "current":
+                signer = codec
+        if signer is None:
+            raise RuntimeError(f"Key ring {self.directory} has no current key")
+        return CodecSet(signer, verifiers)
+
+    def jwks(self):
+        return {"keys": [public_jwk(self._keys[entry["kid"]], entry["alg"]) for entry in self.entries]}
+
+
+class _Cached:
+    """Key ring state shared by a worker, reloaded when keyring.json changes."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checked_at = 0
+        self.mtime = None
+        self.codecs = None
+        self.jwks = {"keys": []}
+
+    def refresh(self):
+        now = time.monotonic()
+        if self.codecs is not None and now - self.checked_at < SIGNING_KEYS["reload_interval"]:
+            return self
+        with self.lock:
+            if self.codecs is not None and now - self.checked_at < SIGNING_KEYS["reload_interval"]:
+                return self
+            ring = KeyRing()
+            try:
+                mtime = os.stat(ring._ring_path).st_mtime_ns
+            except FileNotFoundError:
+                ring.init()
+                mtime = os.stat(ring._ring_path).st_mtime_ns
+            if mtime != self.mtime:
+                ring.load()
+                self.codecs, self.jwks, self.mtime = ring.codecs(), ring.jwks(), mtime
+            self.checked_at = now
+        return self
+
+
+_cached = _Cached()
+_NO_KEYS = {"keys": []}
+
+
+def get_codecs():
+    return _cached.refresh().codecs
+
+
+def get_jwks():
+    """Public keys to publish; empty for HMAC algorithms, whose key is a shared secret."""
+    if ALGORITHM not in ASYMMETRIC_ALGORITHMS:
+        return _NO_KEYS
+    return _cached.refresh().jwks
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the token signing key ring")
+    parser.add_argument("command", choices=("init", "rotate", "prune", "show"))
+    parser.add_argument("--directory", default=SIGNING_KEYS["directory"])
+    parser.add_argument("--algorithm", default=ALGORITHM, choices=ASYMMETRIC_ALGORITHMS)
+    parser.add_argument(
+        "--max-age", type=float, default=TOKEN_EXPIRATION["access_token"].total_seconds(),
+        help="prune: seconds a key must have been retired (default: access token lifetime)"
+    )
+    args = parser.parse_args(argv)
+
+    ring = KeyRing(args.directory, args.algorithm)
+    if args.command == "init":
+        ring.init()
+    elif args.command == "rotate":
+        ring.rotate()
+    elif args.command == "prune":
+        print(f"Pruned {len(ring.prune(args.max_age))} retired key(s)")
+        ring.load()
+    else:
+        ring.load()
+    for entry in ring.entries:
+        print(f"{entry['status']:<8} {entry['alg']:<6} {entry['kid']}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
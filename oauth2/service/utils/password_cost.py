@@ -0,0 +1,60 @@
+"""Pick the password hashing cost for this hardware.
+
+    python -m service.utils.password_cost [--scheme bcrypt|argon2] [--target-ms 250]
+
+Prints the highest cost (bcrypt log2 rounds or argon2 time_cost) whose hash
+stays within the per-login budget, as the PASSWORD_HASH_ROUNDS line to
+deploy. Setting PASSWORD_HASH_CALIBRATE=true runs the same measurement at
+startup instead; calibrating once per hardware tier with the CLI keeps every
+worker on the same cost.
+
+Existing hashes below the chosen cost are upgraded on the user's next login.
+"""
+import argparse
+import sys
+import time
+
+from service.config import PASSWORD_HASHING
+from service.utils.security import build_password_context
+
+# Never go below these, however slow the machine is
+MIN_ROUNDS = {"bcrypt": 10, "argon2": 2}
+MAX_ROUNDS = {"bcrypt": 16, "argon2": 32}
+
+
+def hash_time(scheme, rounds, samples=2):
+    context = build_password_context(scheme, rounds)
+    best = float("inf")
+    for _ in range(samples):
+        start = time.perf_counter()
+        context.hash("calibration password")
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def calibrate(scheme=PASSWORD_HASHING["scheme"], target_ms=PASSWORD_HASHING["target_ms"]):
+    """Highest cost whose hash time is within ``target_ms``, but at least MIN_ROUNDS."""
+    rounds = MIN_ROUNDS[scheme]
+    while rounds < MAX_ROUNDS[scheme] and hash_time(scheme, rounds + 1) * 1000 <= target_ms:
+        rounds += 1
+    return rounds
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calibrate the password hashing cost")
+    parser.add_argument("--scheme", default=PASSWORD_HASHING["scheme"], choices=sorted(MIN_ROUNDS))
+    parser.add_argument("--target-ms", type=float, default=PASSWORD_HASHING["target_ms"])
+    args = parser.parse_args(argv)
+
+    rounds = calibrate(args.scheme, args.target_ms)
+    elapsed = hash_time(args.scheme, rounds) * 1000
+    print(f"{args.scheme}: cost {rounds} hashes in {elapsed:.0f} ms (budget {args.target_ms:.0f} ms)")
+    if elapsed > args.target_ms:
+        print(f"warning: the minimum cost {MIN_ROUNDS[args.scheme]} is over budget on this machine")
+    print(f"PASSWORD_HASH_SCHEME={args.scheme}")
+    print(f"PASSWORD_HASH_ROUNDS={rounds}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
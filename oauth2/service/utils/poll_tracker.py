@@ -0,0 +1,88 @@
+import struct
+import time
+
+from service.config import DEVICE_FLOW
+from service.utils.shared_table import SharedTable, key_hash
+
+_SLOT = struct.Struct("<Qdd")  # device_code hash, last poll (unix time), interval
+
+
+class PollTracker:
+    """Last poll time and required interval per device_code, shared by every worker.
+
+    Entries live in a SharedTable, so a device whose polls land on different
+    workers is still slowed down. An entry quiet for ``ttl`` seconds counts
+    as a new device, and abandoned entries are the first reused once a probe
+    window fills; size ``slots`` well above the devices polling at once.
+    """
+
+    def __init__(self, path, slots, interval, step, leeway, ttl):
+        self.path = path
+        self.slots = slots
+        self.interval = interval
+        self.step = step
+        self.leeway = leeway
+        self.ttl = ttl
+        self._table = None
+        self.slowed = 0
+
+    @property
+    def table(self):
+        # Opened on first use, so each worker maps the file itself
+        if self._table is None:
+            self._table = SharedTable(self.path, self.slots, _SLOT)
+        return self._table
+
+    def poll(self, device_code):
+        """Record a poll; returns the raised interval if it came too soon, else None."""
+        slot_hash = key_hash(device_code)
+        table = self.table
+        with table.locked() as buffer:
+            now = time.time()
+            offset, found = table.find(slot_hash)
+            interval, too_soon = self.interval, False
+            if found:
+                _, last, last_interval = _SLOT.unpack_from(buffer, offset)
+                if now - last < self.ttl:
+                    # RFC 8628 intervals are whole seconds; the slot stores a double
+                    interval = int(last_interval)
+                    if now - last + self.leeway < interval:
+                        interval += self.step
+                        too_soon = True
+            _SLOT.pack_into(buffer, offset, slot_hash, now, interval)
+        if too_soon:
+            self.slowed += 1
+            return interval
+        return None
+
+    def touch(self, device_code):
+        """Restart the interval, for a poll that was held before being answered."""
+        slot_hash = key_hash(device_code)
+        table = self.table
+        with table.locked() as buffer:
+            offset, found = table.find(slot_hash)
+            if found:
+                _, _, interval = _SLOT.unpack_from(buffer, offset)
+                _SLOT.pack_into(buffer, offset, slot_hash, time.time(), interval)
+
+    def forget(self, device_code):
+        table = self.table
+        with table.locked() as buffer:
+            offset, found = table.find(key_hash(device_code))
+            if found:
+                _SLOT.pack_into(buffer, offset, 0, 0.0, 0.0)
+
+    def close(self):
+        if self._table is not None:
+            self._table.close()
+            self._table = None
+
+
+device_polls = PollTracker(
+    DEVICE_FLOW["poll_tracker_file"],
+    DEVICE_FLOW["poll_tracker_size"],
+    DEVICE_FLOW["interval"],
+    DEVICE_FLOW["slow_down_step"],
+    DEVICE_FLOW["poll_leeway"],
+    DEVICE_FLOW["poll_tracker_ttl"],
+)
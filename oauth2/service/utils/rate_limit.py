@@ -0,0 +1,161 @@
+import base64
+import json
+import math
+import struct
+import time
+from urllib.parse import parse_qs, unquote
+
+from starlette.responses import JSONResponse
+
+from service.config import RATE_LIMIT, RATE_LIMIT_POLICIES
+from service.utils.shared_table import SharedTable, key_hash
+
+_SLOT = struct.Struct("<Qdd")  # key hash, last update (unix time), tokens
+_MAX_BODY = 64 * 1024
+
+
+class SharedBuckets(SharedTable):
+    """Token buckets in a SharedTable, shared by every worker on the host.
+
+    A key pushed out of its probe window restarts its bucket full.
+    """
+
+    def __init__(self, path, slots):
+        super().__init__(path, slots, _SLOT)
+
+    def take(self, key, rate, burst):
+        """Take a token from ``key``'s bucket; returns 0, or the seconds until one is available."""
+        slot_hash = key_hash(key)
+        with self.locked() as buffer:
+            now = time.time()
+            offset, found = self.find(slot_hash)
+            tokens = burst
+            if found:
+                _, updated, slot_tokens = _SLOT.unpack_from(buffer, offset)
+                tokens = min(burst, slot_tokens + max(0.0, now - updated) * rate)
+            if tokens >= 1:
+                tokens -= 1
+                wait = 0
+            else:
+                wait = (1 - tokens) / rate
+            _SLOT.pack_into(buffer, offset, slot_hash, now, tokens)
+        return wait
+
+
+def _client_ip(scope, trust_forwarded_for):
+    if trust_forwarded_for:
+        for name, value in scope["headers"]:
+            if name == b"x-forwarded-for":
+                return value.decode("latin-1").split(",")[0].strip()
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+def _client_id_from_headers(scope):
+    for name, value in scope["headers"]:
+        if name == b"authorization" and value[:6].lower() == b"basic ":
+            try:
+                username = base64.b64decode(value[6:]).decode().split(":", 1)[0]
+            except ValueError:
+                return None
+            return unquote(username)
+    query = parse_qs(scope.get("query_string", b"").decode("latin-1"))
+    return query.get("client_id", [None])[0]
+
+
+def _client_id_from_body(content_type, body):
+    try:
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            return parse_qs(body.decode()).get("client_id", [None])[0]
+        if content_type.startswith("application/json"):
+            data = json.loads(body)
+            client_id = data.get("client_id") if isinstance(data, dict) else None
+            return client_id if isinstance(client_id, str) else None
+    except ValueError:
+        pass
+    return None
+
+
+async def _buffer_body(receive):
+    """Read the request body, returning it and a receive that replays it."""
+    messages = []
+    size = 0
+    while size <= _MAX_BODY:
+        message = await receive()
+        messages.append(message)
+        if message["type"] != "http.request":
+            break
+        size += len(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.request")
+
+    async def replay():
+        if messages:
+            return messages.pop(0)
+        return await receive()
+
+    return body if size <= _MAX_BODY else b"", replay
+
+
+class RateLimitMiddleware:
+    """Per-route token bucket limits by source address and client_id.
+
+    Requests over a limit get a 429 with Retry-After before reaching the
+    application. Routes without a policy pass straight through.
+    """
+
+    def __init__(self, app, policies=RATE_LIMIT_POLICIES, path=RATE_LIMIT["file"], slots=RATE_LIMIT["slots"]):
+        self.app = app
+        self.policies = policies
+        self.path = path
+        self.slots = slots
+        self.trust_forwarded_for = RATE_LIMIT["trust_forwarded_for"]
+        self._buckets = None
+
+    @property
+    def buckets(self):
+        # Opened on first use, so each worker maps the file itself
+        if self._buckets is None:
+            self._buckets = SharedBuckets(self.path, self.slots)
+        return self._buckets
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = f"{scope['method']} {scope['path']}"
+        policy = self.policies.get(route)
+        if policy is None:
+            await self.app(scope, receive, send)
+            return
+
+        limits = []
+        if "ip" in policy:
+            limits.append(("ip", _client_ip(scope, self.trust_forwarded_for), policy["ip"]))
+        if "client" in policy:
+            client_id = _client_id_from_headers(scope)
+            if client_id is None:
+                headers = dict(scope["headers"])
+                content_type = headers.get(b"content-type", b"").decode("latin-1")
+                body, receive = await _buffer_body(receive)
+                client_id = _client_id_from_body(content_type, body)
+            if client_id:
+                limits.append(("client", client_id, policy["client"]))
+
+        for dimension, value, (rate, burst) in limits:
+            wait = self.buckets.take(f"{route}|{dimension}|{value}", rate, burst)
+            if wait:
+                error_summary = {
+                    "error_type": "RateLimitError",
+                    "error_message": "Too many requests",
+                    "details": f"Rate limit for {route} by {dimension} exceeded"
+                }
+                response = JSONResponse(
+                    {"detail": error_summary},
+                    status_code=429,
+                    headers={"Retry-After": str(math.ceil(wait))}
+                )
+                await response(scope, receive, send)
+                return
+        await self.app(scope, receive, send)
@@ -1,32 +1,78 @@
-from passlib.context import CryptContext
-from jose import JWTError, jwt
 from datetime import datetime, timedelta
 import secrets
 import hashlib
 import base64
-from ..config import SECRET_KEY, ALGORITHM, TOKEN_EXPIRATION
+import time
+from ..config import TOKEN_EXPIRATION, PASSWORD_HASHING, ACCESS_TOKEN_FORMAT
+from .jwt_codec import encode_token
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+def build_password_context(scheme=PASSWORD_HASHING["scheme"], rounds=PASSWORD_HASHING["rounds"]):
+    """New hashes use ``scheme`` at ``rounds``; hashes of the other scheme or a
+    lower cost still verify, and report that they need an update."""
+    from passlib.context import CryptContext
+    if scheme == "argon2":
+        from passlib.hash import argon2
+        if not argon2.has_backend():
+            raise RuntimeError("PASSWORD_HASH_SCHEME=argon2 requires the argon2-cffi package")
+        settings = {"argon2__memory_cost": PASSWORD_HASHING["argon2_memory_kib"]}
+        schemes = ["argon2", "bcrypt"]
+    elif scheme == "bcrypt":
+        settings = {}
+        schemes = ["bcrypt"]
+    else:
+        raise ValueError(f"Unsupported password hash scheme '{scheme}'")
+    if rounds is not None:
+        settings[f"{scheme}__default_rounds"] = rounds
+        settings[f"{scheme}__min_rounds"] = rounds
+    return CryptContext(schemes=schemes, deprecated="auto", **settings)
+
+pwd_context = None
+
+def password_context():
+    """The configured CryptContext; passlib is only imported once a password is hashed"""
+    global pwd_context
+    if pwd_context is None:
+        pwd_context = build_password_context()
+    return pwd_context
+
+def configure_password_context(scheme=PASSWORD_HASHING["scheme"], rounds=PASSWORD_HASHING["rounds"]):
+    global pwd_context
+    pwd_context = build_password_context(scheme, rounds)
+    return pwd_context
 
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return password_context().verify(plain_password, hashed_password)
+
+def verify_and_update_password(plain_password, hashed_password):
+    """(valid, new_hash); new_hash is set when the stored hash is below the current policy"""
+    return password_context().verify_and_update(plain_password, hashed_password)
 
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return password_context().hash(password)
 
 def create_access_token(data: dict, expires_delta: timedelta = None):
-    to_encode = data.copy()
-    if expires_delta:
-        expire = datetime.now() + expires_delta
-    else:
-        expire = datetime.now() + TOKEN_EXPIRATION["access_token"]
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
-    return encoded_jwt
+    if ACCESS_TOKEN_FORMAT == "opaque":
+        # A reference token; sub and exp live in the tokens row it is stored with
+        return generate_token()
+    expires_delta = expires_delta or TOKEN_EXPIRATION["access_token"]
+    return encode_token({**data, "exp": int(time.time() + expires_delta.total_seconds())})
+
+def is_reference_token(token):
+    """Opaque tokens are base64url without dots; JWTs have exactly two"""
+    return token.count(".") != 2
+
+def reference_token_claims(record):
+    """The sub and exp a JWT would carry, from an opaque token's TokenRecord"""
+    sub = str(record.user_id) if record.user_id is not None else f"client:{record.client_id}"
+    return {"sub": sub, "exp": int(datetime.fromisoformat(record.expires_at).timestamp())}
 
 def generate_token(length=32):
     return secrets.token_urlsafe(length)
 
+def token_digest(token):
+    """SHA-256 of a bearer or refresh token, the form tokens are stored and looked up by"""
+    return hashlib.sha256(token.encode()).digest()
+
 def generate_code_challenge(code_verifier):
     """Generate PKCE code challenge from verifier"""
     code_verifier_bytes = code_verifier.encode('ascii')
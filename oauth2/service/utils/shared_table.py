@@ -0,0 +1,79 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import struct
+from contextlib import contextmanager
+
+_HEAD = struct.Struct("<Qd")  # key hash, last update (unix time)
+_PROBES = 8
+
+
+def key_hash(key):
+    """64-bit hash of ``key``; never 0, which marks an empty slot."""
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "little") or 1
+
+
+class SharedTable:
+    """Fixed-size records in a memory-mapped file, shared by every process that opens it.
+
+    Records form an open-addressed table keyed by ``key_hash``, and each
+    ``record`` struct starts with that hash and the record's last update
+    time. A key missing from its probe window takes the window's least
+    recently updated slot, so size ``slots`` well above the number of keys
+    live at once. ``locked()`` holds an flock on the file, so callers in one
+    process must not use a table concurrently from threads, and each process
+    must open the file itself rather than inherit it across fork. A file
+    sized for a different ``slots`` is refused rather than resized, since
+    resizing would fault every other process still mapping it.
+    """
+
+    def __init__(self, path, slots, record):
+        self.slots = slots
+        self.record = record
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        size = slots * record.size
+        try:
+            # Size a new file under the lock, so only the first opener does it
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                existing = os.fstat(self._fd).st_size
+                if not existing:
+                    os.ftruncate(self._fd, size)
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+            if existing and existing != size:
+                raise ValueError(
+                    f"{path} holds {existing // record.size} slots, not {slots}; "
+                    "stop every process using it and remove it to change the slot count"
+                )
+            self._map = mmap.mmap(self._fd, size)
+        except BaseException:
+            os.close(self._fd)
+            raise
+
+    @contextmanager
+    def locked(self):
+        fcntl.flock(self._fd, fcntl.LOCK_EX)
+        try:
+            yield self._map
+        finally:
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def find(self, key_hash):
+        """Offset of the slot for ``key_hash`` and whether it already holds it; call under locked()."""
+        start = key_hash % self.slots
+        victim, victim_updated = None, math.inf
+        for probe in range(_PROBES):
+            offset = (start + probe) % self.slots * self.record.size
+            slot_hash, updated = _HEAD.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                return offset, True
+            if updated < victim_updated:
+                victim, victim_updated = offset, updated
+        return victim, False
+
+    def close(self):
+        self._map.close()
+        os.close(self._fd)
@@ -0,0 +1,106 @@
+import base64
+import functools
+import gzip
+import hashlib
+import json
+
+from starlette.responses import Response
+
+
+def strong_etag(body):
+    """Content hash, so every worker gives the same body the same ETag."""
+    return '"' + base64.urlsafe_b64encode(hashlib.sha256(body).digest()[:18]).decode() + '"'
+
+
+def etag_matches(if_none_match, etag):
+    # If-None-Match uses the weak comparison: W/ prefixes are ignored
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in if_none_match.split(","))
+
+
+@functools.lru_cache(maxsize=256)
+def accepts_gzip(accept_encoding):
+    # Clients send a handful of distinct values, so the parse is cached
+    for coding in accept_encoding.decode("latin-1").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            return params.replace(" ", "") not in ("q=0", "q=0.0", "q=0.00", "q=0.000")
+    return False
+
+
+class _Prebuilt(Response):
+    """A Response from already encoded parts, skipping header construction."""
+
+    def __init__(self, status_code, body, raw_headers):
+        self.status_code = status_code
+        self.body = body
+        self.raw_headers = raw_headers
+        self.background = None
+
+
+class _Variant:
+    def __init__(self, body, media_type, cache_control, vary=False, encoding=None):
+        self.body = body
+        self.etag = strong_etag(body)
+        self.etag_bytes = self.etag.encode()
+        self.not_modified_headers = [(b"etag", self.etag_bytes), (b"cache-control", cache_control.encode())]
+        if vary:
+            self.not_modified_headers.append((b"vary", b"Accept-Encoding"))
+        self.headers = self.not_modified_headers + [
+            (b"content-type", media_type.encode()),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        if encoding:
+            self.headers.append((b"content-encoding", encoding.encode()))
+
+
+class StaticBody:
+    """Encoded bytes served with a strong ETag and Cache-Control.
+
+    Requests whose If-None-Match carries the ETag get an empty 304. With
+    ``compress``, a gzip variant (deterministic, so it hashes the same in
+    every worker) is made up front and served to clients that accept it,
+    as long as it is actually smaller.
+    """
+
+    def __init__(self, body, media_type, cache_control, compress=False):
+        self.body = body
+        gzipped = gzip.compress(body, mtime=0) if compress else None
+        if gzipped is not None and len(gzipped) < len(body):
+            self._identity = _Variant(body, media_type, cache_control, vary=True)
+            self._gzip = _Variant(gzipped, media_type, cache_control, vary=True, encoding="gzip")
+        else:
+            self._identity = _Variant(body, media_type, cache_control)
+            self._gzip = None
+        self.etag = self._identity.etag
+
+    def respond(self, request):
+        # One pass over the raw ASGI headers (names arrive lowercased) is
+        # cheaper than two Headers lookups
+        accept_encoding = if_none_match = b""
+        for name, value in request.scope["headers"]:
+            if name == b"accept-encoding":
+                accept_encoding = value
+            elif name == b"if-none-match":
+                if_none_match = value
+        variant = self._identity
+        if self._gzip is not None and accepts_gzip(accept_encoding):
+            variant = self._gzip
+        if if_none_match and (
+            if_none_match == variant.etag_bytes
+            or etag_matches(if_none_match.decode("latin-1"), variant.etag)
+        ):
+            return _Prebuilt(304, b"", list(variant.not_modified_headers))
+        return _Prebuilt(200, variant.body, list(variant.headers))
+
+
+class StaticResponse(StaticBody):
+    """A JSON payload serialized once. ``payload`` is kept so callers can tell
+    when the source has changed and rebuild."""
+
+    def __init__(self, payload, cache_control):
+        self.payload = payload
+        super().__init__(json.dumps(payload, separators=(",", ":")).encode(), "application/json", cache_control, compress=True)
@@ -0,0 +1,80 @@
+import html
+import os
+from string import Template
+
+from .static_response import StaticBody, _Prebuilt
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "templates")
+HTML = "text/html; charset=utf-8"
+_NO_STORE = [(b"cache-control", b"no-store"), (b"content-type", HTML.encode())]
+
+_pages = {}
+
+
+class ByteTemplate:
+    """Markup with ``$name`` slots, split once into encoded chunks.
+
+    Slot values are HTML-escaped when rendered; ``$$`` is a literal dollar.
+    """
+
+    def __init__(self, source):
+        chunks, slots, literal, position = [], [], [], 0
+        for match in Template.pattern.finditer(source):
+            literal.append(source[position:match.start()])
+            position = match.end()
+            if match.group("escaped") is not None:
+                literal.append("$")
+                continue
+            name = match.group("named") or match.group("braced")
+            if name is None:
+                raise ValueError(f"Invalid placeholder at offset {match.start()}")
+            chunks.append("".join(literal).encode())
+            slots.append(name)
+            literal = []
+        literal.append(source[position:])
+        chunks.append("".join(literal).encode())
+        self.chunks = chunks
+        self.slots = tuple(slots)
+
+    def render(self, **values):
+        parts = [self.chunks[0]]
+        for name, chunk in zip(self.slots, self.chunks[1:]):
+            parts.append(html.escape(str(values[name])).encode())
+            parts.append(chunk)
+        return b"".join(parts)
+
+
+class Page:
+    """A compiled page. Without slots it is rendered once and served with its
+    ETag and gzip variant. Pages with slots carry request data (a user_code
+    that can approve a device), so they are rendered per request and never
+    stored."""
+
+    def __init__(self, template, cache_control="no-cache"):
+        self.template = template
+        self.static = None
+        if not template.slots:
+            self.static = StaticBody(template.render(), HTML, cache_control, compress=True)
+
+    def respond(self, request, **values):
+        if self.static is not None:
+            return self.static.respond(request)
+        body = self.template.render(**values)
+        return _Prebuilt(200, body, _NO_STORE + [(b"content-length", str(len(body)).encode())])
+
+
+def compile_pages(directory=TEMPLATE_DIR):
+    """Compile every .html file in ``directory``; main calls this at startup."""
+    pages = {}
+    for filename in sorted(os.listdir(directory)):
+        if filename.endswith(".html"):
+            with open(os.path.join(directory, filename), encoding="utf-8") as file:
+                pages[filename[:-len(".html")]] = Page(ByteTemplate(file.read()))
+    _pages.update(pages)
+    return pages
+
+
+def page(name, request, **values):
+    if not _pages:
+        compile_pages()
+    return _pages[name].respond(request, **values)
@@ -0,0 +1,7 @@
+from service.config import TOKEN_CACHE
+from service.database import events
+from service.utils.digest_cache import DigestCache
+
+# Token rows (TokenRecord) by access token digest, in front of get_token/get_tokens
+token_cache = DigestCache(TOKEN_CACHE["max_entries"], TOKEN_CACHE["max_ttl"])
+events.subscribe(events.TOKEN_DELETED, token_cache.invalidate_token)
@@ -0,0 +1,8 @@
+from service.config import USERINFO_CACHE
+from service.database import events
+from service.utils.digest_cache import DigestCache
+
+# Verified userinfo responses
+userinfo_cache = DigestCache(USERINFO_CACHE["max_entries"], USERINFO_CACHE["max_ttl"])
+events.subscribe(events.TOKEN_DELETED, userinfo_cache.invalidate_token)
+events.subscribe(events.USER_UPDATED, userinfo_cache.invalidate_user)
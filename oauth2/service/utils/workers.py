@@ -0,0 +1,84 @@
+"""Status of the workers forked by service.server.
+
+The launcher creates a WorkerTable before forking, so the anonymous mapping
+is shared: the parent records each worker's pid and restarts, and the worker
+writes a heartbeat from its event loop. A heartbeat that stops advancing
+means a worker that is alive but stuck. Workers whose launcher has died
+shut themselves down.
+"""
+import asyncio
+import mmap
+import os
+import signal
+import struct
+import time
+
+from service.config import SERVER
+
+_SLOT = struct.Struct("<qddQ")  # pid, started, heartbeat, restarts
+
+
+class WorkerTable:
+    def __init__(self, workers):
+        self.workers = workers
+        self.index = None  # This worker's slot, set after fork
+        self.parent = os.getpid()
+        self._map = mmap.mmap(-1, workers * _SLOT.size)
+
+    def _read(self, index):
+        return _SLOT.unpack_from(self._map, index * _SLOT.size)
+
+    def spawned(self, index, pid):
+        previous_pid, _, _, restarts = self._read(index)
+        _SLOT.pack_into(self._map, index * _SLOT.size, pid, time.time(), 0.0, restarts + bool(previous_pid))
+
+    def beat(self):
+        pid, started, _, restarts = self._read(self.index)
+        _SLOT.pack_into(self._map, self.index * _SLOT.size, pid, started, time.time(), restarts)
+
+    def snapshot(self, stale_after):
+        now = time.time()
+        workers = []
+        for index in range(self.workers):
+            pid, started, heartbeat, restarts = self._read(index)
+            workers.append({
+                "index": index,
+                "pid": pid,
+                "uptime": round(now - started, 1) if started else None,
+                "heartbeat_age": round(now - heartbeat, 2) if heartbeat else None,
+                "healthy": bool(heartbeat) and now - heartbeat < stale_after,
+                "restarts": restarts,
+            })
+        return workers
+
+
+worker_table = None
+
+
+async def run_heartbeat(interval=SERVER["heartbeat_interval"]):
+    while True:
+        if os.getppid() != worker_table.parent:
+            # The launcher is gone and nobody will stop or replace us; drain and exit
+            os.kill(os.getpid(), signal.SIGTERM)
+            return
+        worker_table.beat()
+        await asyncio.sleep(interval)
+
+
+def start_heartbeat():
+    if worker_table is None or worker_table.index is None:
+        return None
+    return asyncio.get_running_loop().create_task(run_heartbeat(), name="worker-heartbeat")
+
+
+def health():
+    if worker_table is None:
+        return {"status": "ok", "pid": os.getpid(), "worker": None, "workers": 1, "workers_status": []}
+    workers = worker_table.snapshot(stale_after=3 * SERVER["heartbeat_interval"])
+    return {
+        "status": "ok" if all(worker["healthy"] for worker in workers) else "degraded",
+        "pid": os.getpid(),
+        "worker": worker_table.index,
+        "workers": worker_table.workers,
+        "workers_status": workers,
+    }
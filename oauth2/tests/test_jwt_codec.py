@@ -0,0 +1,184 @@
+import base64
+import json
+
+import pytest
+
+from service.utils.jwt_codec import CodecSet, ExpiredTokenError, JWTCodec, TokenError
+
+SECRET = "test-secret"
+NOW = 1_700_000_000
+
+
+def b64(data):
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def segment(value):
+    return b64(json.dumps(value, separators=(",", ":")).encode())
+
+
+def forge(header, claims, signature=b"sig"):
+    return f"{segment(header)}.{segment(claims)}.{b64(signature)}"
+
+
+@pytest.fixture
+def codec():
+    return JWTCodec(SECRET, "HS256")
+
+
+@pytest.fixture(scope="module")
+def rsa_key():
+    from cryptography.hazmat.primitives.asymmetric import rsa
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+
+@pytest.fixture(scope="module")
+def ed25519_key():
+    from cryptography.hazmat.primitives.asymmetric import ed25519
+    return ed25519.Ed25519PrivateKey.generate()
+
+
+def test_round_trip(codec):
+    claims = {"sub": "42", "exp": NOW + 60, "name": "Zoë"}
+    assert codec.decode(codec.encode(claims), now=NOW) == claims
+
+
+@pytest.mark.parametrize("algorithm, key", [("RS256", "rsa_key"), ("EdDSA", "ed25519_key")])
+def test_asymmetric_round_trip(request, algorithm, key):
+    key = request.getfixturevalue(key)
+    signer = JWTCodec(key, algorithm, kid="k1")
+    verifier = JWTCodec(key.public_key(), algorithm, kid="k1")
+    token = signer.encode({"sub": "42"})
+    assert verifier.decode(token) == {"sub": "42"}
+    with pytest.raises(TokenError):
+        verifier.encode({"sub": "42"})
+    with pytest.raises(TokenError):
+        verifier.decode(token[:-4] + ("AAAA" if not token.endswith("AAAA") else "BBBB"))
+
+
+def test_tampered_signature(codec):
+    header, payload, signature = codec.encode({"sub": "42"}).split(".")
+    flipped = signature[:-2] + ("A" if signature[-2] != "A" else "B") + signature[-1]
+    with pytest.raises(TokenError, match="Signature verification failed"):
+        codec.decode(f"{header}.{payload}.{flipped}")
+    with pytest.raises(TokenError, match="Signature verification failed"):
+        codec.decode(f"{header}.{payload}.")
+
+
+def test_tampered_payload(codec):
+    header, _, signature = codec.encode({"sub": "42"}).split(".")
+    with pytest.raises(TokenError, match="Signature verification failed"):
+        codec.decode(f"{header}.{segment({'sub': '1'})}.{signature}")
+
+
+def test_other_secret(codec):
+    with pytest.raises(TokenError):
+        codec.decode(JWTCodec("other-secret", "HS256").encode({"sub": "42"}))
+
+
+def test_alg_none_rejected(codec):
+    with pytest.raises(TokenError, match="alg"):
+        codec.decode(forge({"alg": "none", "typ": "JWT"}, {"sub": "42"}, b""))
+    with pytest.raises(TokenError, match="alg"):
+        codec.decode(forge({"typ": "JWT"}, {"sub": "42"}))
+
+
+def test_hs256_presented_to_rs256(rsa_key):
+    from cryptography.hazmat.primitives import serialization
+
+    rs256 = JWTCodec(rsa_key.public_key(), "RS256")
+    # The classic confusion: HMAC keyed with the published public key
+    public_pem = rsa_key.public_key().public_bytes(
+        serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo
+    )
+    token = JWTCodec(public_pem, "HS256").encode({"sub": "42"})
+    with pytest.raises(TokenError, match="alg"):
+        rs256.decode(token)
+
+
+def test_kid_mismatch(rsa_key):
+    signer = JWTCodec(rsa_key, "RS256", kid="old")
+    verifier = JWTCodec(rsa_key.public_key(), "RS256", kid="new")
+    with pytest.raises(TokenError, match="different key"):
+        verifier.decode(signer.encode({"sub": "42"}))
+
+
+def test_codec_set_routes_by_kid(rsa_key, ed25519_key):
+    current = JWTCodec(ed25519_key, "EdDSA", kid="current")
+    retired = JWTCodec(rsa_key, "RS256", kid="retired")
+    codecs = CodecSet(current, [current, retired])
+    assert codecs.decode(codecs.encode({"sub": "1"})) == {"sub": "1"}
+    assert codecs.decode(retired.encode({"sub": "2"})) == {"sub": "2"}
+
+    unknown = JWTCodec(rsa_key, "RS256", kid="unknown").encode({"sub": "3"})
+    with pytest.raises(TokenError, match="Unknown signing key"):
+        codecs.decode(unknown)
+    # A known kid with someone else's signature still has to verify
+    header = segment({"alg": "RS256", "kid": "retired", "typ": "JWT", "x": 1})
+    _, payload, signature = unknown.split(".")
+    with pytest.raises(TokenError, match="Signature verification failed"):
+        codecs.decode(f"{header}.{payload}.{signature}")
+    with pytest.raises(TokenError):
+        codecs.decode("not-base64!.e30.sig")
+
+
+def test_exp_boundary(codec):
+    token = codec.encode({"sub": "42", "exp": NOW})
+    # Valid up to and including the exp second
+    assert codec.decode(token, now=NOW)["exp"] == NOW
+    assert codec.decode(token, now=NOW + 0.999)["exp"] == NOW
+    with pytest.raises(ExpiredTokenError):
+        codec.decode(token, now=NOW + 1)
+
+
+def test_nbf_boundary(codec):
+    token = codec.encode({"sub": "42", "nbf": NOW})
+    assert codec.decode(token, now=NOW)["nbf"] == NOW
+    with pytest.raises(TokenError, match="nbf"):
+        codec.decode(token, now=NOW - 0.001)
+
+
+@pytest.mark.parametrize("claim", ["exp", "nbf", "iat"])
+@pytest.mark.parametrize("value", ["1700000000", True, [1]])
+def test_non_numeric_time_claims(codec, claim, value):
+    with pytest.raises(TokenError, match=claim):
+        codec.decode(codec.encode({"sub": "42", claim: value}), now=NOW)
+
+
+@pytest.mark.parametrize("token", [
+    "",
+    "abc",
+    "abc.def",
+    ".e30.sig",
+    "e30..sig",
+    "!!!.e30.sig",
+    "eyJhbGciOiJIUzI1NiJ9.e30.%%%",
+    "tøken.with.non-ascii",
+    "eyJhbGciOiJIUzI1NiIsInR5cCI6IkpXVCJ9.ZTMw.c2ln",
+])
+def test_malformed(codec, token):
+    with pytest.raises(TokenError):
+        codec.decode(token)
+
+
+def test_non_object_payload(codec):
+    signing_input = f"{codec.header.decode()}.{segment([1, 2])}".encode()
+    signature = b64(codec._key.sign(signing_input))
+    with pytest.raises(TokenError, match="Invalid payload"):
+        codec.decode(f"{signing_input.decode()}.{signature}")
+
+
+def test_unsupported_algorithm():
+    with pytest.raises(ValueError):
+        JWTCodec(SECRET, "none")
+
+
+@pytest.mark.parametrize("algorithm", ["HS256", "HS384", "HS512"])
+def test_jose_parity(algorithm):
+    jwt = pytest.importorskip("jose.jwt")
+    ours = JWTCodec(SECRET, algorithm)
+    claims = {"sub": "42", "exp": 4_000_000_000, "scope": "openid profile"}
+    token = ours.encode(claims)
+    assert token == jwt.encode(claims, SECRET, algorithm=algorithm)
+    assert jwt.decode(token, SECRET, algorithms=[algorithm]) == claims
+    assert ours.decode(jwt.encode({"sub": "Zoë"}, SECRET, algorithm=algorithm)) == {"sub": "Zoë"}
@@ -0,0 +1,102 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+
+from service.config import TOKEN_EXPIRATION
+from service.database.migrations import LATEST_VERSION, _BASELINE_TABLES, migrate, pending
+from service.database.models import get_index_definitions, get_table_definitions
+from service.utils.security import token_digest
+
+EXPIRES_AT = "2030-01-01 00:00:00"
+
+
+def columns(db, table):
+    return [row[1:] for row in db.execute(f"PRAGMA table_info({table})")]
+
+
+def indexes(db):
+    return {row[0] for row in db.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'")}
+
+
+def assert_matches_models(db):
+    expected = sqlite3.connect(":memory:")
+    for table_def in get_table_definitions().values():
+        expected.execute(table_def)
+    for table in get_table_definitions():
+        assert columns(db, table) == columns(expected, table), table
+    assert indexes(db) == set(get_index_definitions())
+
+
+@pytest.fixture
+def baseline(tmp_path):
+    """A database created before migrations were versioned, with live rows."""
+    path = str(tmp_path / "baseline.db")
+    db = sqlite3.connect(path)
+    for table_def in _BASELINE_TABLES:
+        db.execute(table_def)
+    db.execute("INSERT INTO users (username, hashed_password) VALUES ('alice', 'hash')")
+    db.execute(
+        "INSERT INTO clients (client_id, client_secret, name, client_type) VALUES ('client', 's', 'C', 'public')"
+    )
+    db.executemany(
+        """INSERT INTO tokens (access_token, refresh_token, expires_at, scope, client_id, user_id)
+           VALUES (?, ?, ?, 'openid', 'client', 1)""",
+        [("access-1", "refresh-1", EXPIRES_AT), ("access-2", None, EXPIRES_AT)]
+    )
+    db.commit()
+    db.close()
+    return path
+
+
+def test_fresh_database_matches_models(tmp_path):
+    path = str(tmp_path / "fresh.db")
+    assert [migration.version for migration in migrate(path)] == list(range(1, LATEST_VERSION + 1))
+    db = sqlite3.connect(path)
+    assert_matches_models(db)
+    db.close()
+
+
+def test_upgrade_from_baseline(baseline):
+    applied = migrate(baseline)
+    assert [migration.version for migration in applied] == [1, 2, 4, 5]
+    assert [migration.version for migration in pending(baseline)] == [3, 6]
+
+    db = sqlite3.connect(baseline)
+    rows = db.execute(
+        "SELECT access_token_hash, refresh_token_hash, expires_at, refresh_expires_at FROM tokens ORDER BY id"
+    ).fetchall()
+    refresh_expires_at = datetime.fromisoformat(EXPIRES_AT) + (
+        TOKEN_EXPIRATION["refresh_token"] - TOKEN_EXPIRATION["access_token"]
+    )
+    assert rows == [
+        (token_digest("access-1"), token_digest("refresh-1"), EXPIRES_AT, str(refresh_expires_at)),
+        (token_digest("access-2"), None, EXPIRES_AT, EXPIRES_AT),
+    ]
+    assert db.execute("SELECT username FROM users").fetchall() == [("alice",)]
+    db.close()
+
+    assert [migration.version for migration in migrate(baseline, online=True)] == [3, 6]
+    assert pending(baseline) == []
+    assert migrate(baseline, online=True) == []
+    db = sqlite3.connect(baseline)
+    assert_matches_models(db)
+    db.close()
+
+
+def test_reaper_waits_for_deferred_index(baseline, caplog):
+    from service.database.operations import delete_expired
+
+    migrate(baseline)
+    db = sqlite3.connect(baseline)
+    db.execute("UPDATE tokens SET expires_at = '2000-01-01 00:00:00', refresh_expires_at = '2000-01-01 00:00:00'")
+    db.commit()
+
+    # Migration 6 is deferred: no index on refresh_expires_at, so no full scans
+    assert delete_expired("tokens", datetime.now(), 100, db) == 0
+    assert "idx_tokens_refresh_expires_at" in caplog.text
+    assert db.execute("SELECT COUNT(*) FROM tokens").fetchone()[0] == 2
+
+    migrate(baseline, online=True)
+    assert delete_expired("tokens", datetime.now(), 100, db) == 2
+    db.close()
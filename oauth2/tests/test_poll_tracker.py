@@ -0,0 +1,80 @@
+import pytest
+
+from service.utils import poll_tracker
+from service.utils.poll_tracker import PollTracker
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1_700_000_000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(poll_tracker.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture
+def workers(tmp_path):
+    # Two trackers on one file stand in for two workers
+    path = str(tmp_path / "polls")
+    trackers = [PollTracker(path, 64, interval=5, step=5, leeway=0.5, ttl=300) for _ in range(2)]
+    yield trackers
+    for tracker in trackers:
+        tracker.close()
+
+
+def test_slow_down_across_workers(clock, workers):
+    first, second = workers
+    assert first.poll("device") is None
+    clock.now += 2
+    interval = second.poll("device")
+    assert interval == 10 and isinstance(interval, int)
+    clock.now += 6
+    # The raised interval holds wherever the next poll lands
+    interval = first.poll("device")
+    assert interval == 15 and isinstance(interval, int)
+    clock.now += 15
+    assert second.poll("device") is None
+    assert (first.slowed, second.slowed) == (1, 1)
+
+
+def test_leeway_and_ttl(clock, workers):
+    first, second = workers
+    first.poll("device")
+    clock.now += 4.6
+    assert second.poll("device") is None
+    clock.now += 1
+    assert first.poll("device") == 10
+    clock.now += 300
+    assert second.poll("device") is None
+    clock.now += 5
+    assert first.poll("device") is None
+
+
+def test_touch_and_forget(clock, workers):
+    first, second = workers
+    first.poll("device")
+    clock.now += 10
+    second.touch("device")
+    assert first.poll("device") == 10
+    second.forget("device")
+    assert first.poll("device") is None
+    # Neither creates an entry for an unknown device
+    second.touch("other")
+    second.forget("other")
+    assert first.poll("other") is None
+
+
+def test_slot_count_mismatch_refused(workers, tmp_path):
+    workers[0].poll("device")
+    other = PollTracker(str(tmp_path / "polls"), 128, interval=5, step=5, leeway=0.5, ttl=300)
+    with pytest.raises(ValueError, match="64 slots, not 128"):
+        other.poll("device")
+    # The file the other workers map is left as it was
+    assert workers[1].poll("device") == 10
@@ -0,0 +1,237 @@
+"""One behavioural contract for every StorageBackend.
+
+Each test runs against every backend in BACKENDS; a new backend joins the
+suite by adding a factory there.
+"""
+import sqlite3
+from datetime import datetime, timedelta
+
+import pytest
+
+from service.database.migrations import migrate
+from service.database.pool import ConnectionPool
+from service.storage.memory import MemoryStorage
+from service.storage.sharded import ShardedSQLiteStorage
+from service.storage.sqlite import SQLiteStorage
+from service.storage.tokenlog import TokenLog
+
+
+def _pool(path):
+    migrate(str(path))
+    return ConnectionPool(str(path), size=2)
+
+
+def sqlite_storage(tmp_path):
+    return SQLiteStorage(_pool(tmp_path / "oauth.db"))
+
+
+def sharded_storage(tmp_path):
+    shards = [_pool(tmp_path / f"oauth.shard{i}.db") for i in range(3)]
+    return ShardedSQLiteStorage(shards=shards, pool=_pool(tmp_path / "oauth.db"))
+
+
+def token_log_storage(tmp_path):
+    return SQLiteStorage(_pool(tmp_path / "oauth.db"), tokens=TokenLog(str(tmp_path / "token_log")))
+
+
+def memory_storage(tmp_path):
+    return MemoryStorage()
+
+
+BACKENDS = {
+    "sqlite": sqlite_storage,
+    "sharded": sharded_storage,
+    "tokenlog": token_log_storage,
+    "memory": memory_storage,
+}
+
+
+@pytest.fixture(params=list(BACKENDS))
+def storage(request, tmp_path):
+    backend = BACKENDS[request.param](tmp_path)
+    yield backend
+    backend.close()
+
+
+def token_args(access_token="access", refresh_token="refresh", expires_in=timedelta(minutes=30),
+               refresh_expires_in=timedelta(days=7), user_id=1):
+    now = datetime.now()
+    return {
+        "access_token": access_token,
+        "refresh_token": refresh_token,
+        "token_type": "Bearer",
+        "expires_at": now + expires_in,
+        "refresh_expires_at": now + refresh_expires_in,
+        "scope": "openid",
+        "client_id": "client",
+        "user_id": user_id,
+    }
+
+
+def test_clients(storage):
+    storage.create_client("client", "secret", "http://a/cb,http://b/cb", "Client", "confidential")
+
+    assert storage.get_client("client") == ("client", "confidential", "http://a/cb,http://b/cb")
+    assert storage.get_client_credentials("client").client_secret == "secret"
+    assert storage.get_client("missing") is None
+    assert storage.validate_redirect_uri("client", "http://b/cb")
+    assert not storage.validate_redirect_uri("client", "http://c/cb")
+    assert not storage.validate_redirect_uri("missing", "http://a/cb")
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.create_client("client", "other", None, "Other", "public")
+
+
+def test_users(storage):
+    alice = storage.create_user("alice", "hash-a", "alice@example.com")
+    bob = storage.create_user("bob", "hash-b", None)
+
+    assert storage.get_user("alice") == (alice, "hash-a")
+    assert storage.get_user("carol") is None
+    assert storage.get_user_by_id(bob) == (bob, "bob", None)
+    assert storage.get_users_by_id([bob, 999, alice]) == [
+        (bob, "bob", None), None, (alice, "alice", "alice@example.com")
+    ]
+    assert sorted(user.username for user in storage.list_users()) == ["alice", "bob"]
+
+    storage.update_password_hash(alice, "hash-a2")
+    assert storage.get_user("alice").hashed_password == "hash-a2"
+
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.create_user("alice", "hash", None)
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.create_user("carol", "hash", "alice@example.com")
+
+
+def test_redeem_authorization_code(storage):
+    code = storage.create_authorization_code("client", "http://a/cb", 1, "openid", None, None)
+    assert storage.get_authorization_code(code).redirect_uri == "http://a/cb"
+
+    result = storage.redeem_authorization_code(code, lambda auth_code: token_args(user_id=auth_code.user_id))
+    assert result is not None
+    auth_code, token = result
+    assert auth_code.client_id == "client"
+    assert storage.get_token("access").user_id == 1
+    assert storage.get_authorization_code(code) is None
+    # A second redemption finds nothing to consume
+    assert storage.redeem_authorization_code(code, lambda auth_code: token_args("other", "other")) is None
+
+
+def test_redeem_rejected_leaves_code(storage):
+    code = storage.create_authorization_code("client", "http://a/cb", 1, "openid", None, None)
+
+    def reject(auth_code):
+        raise ValueError("client mismatch")
+
+    with pytest.raises(ValueError):
+        storage.redeem_authorization_code(code, reject)
+    assert storage.get_authorization_code(code) is not None
+
+    # Returning None consumes the code without issuing a token
+    assert storage.redeem_authorization_code(code, lambda auth_code: None)[1] is None
+    assert storage.get_authorization_code(code) is None
+
+
+def test_rotate_refresh_token(storage):
+    storage.create_token(**token_args())
+
+    result = storage.rotate_refresh_token("refresh", lambda old: token_args("access2", "refresh2"))
+    assert result is not None
+    assert result[0].client_id == "client"
+    assert storage.get_token("access") is None
+    assert storage.get_token_by_refresh_token("refresh") is None
+    assert storage.get_token_by_refresh_token("refresh2").access_token_hash == storage.get_token("access2").access_token_hash
+    assert storage.rotate_refresh_token("refresh", lambda old: token_args("access3", "refresh3")) is None
+
+
+def test_rotate_rejected_keeps_token(storage):
+    storage.create_token(**token_args())
+
+    def reject(old):
+        raise ValueError("client mismatch")
+
+    with pytest.raises(ValueError):
+        storage.rotate_refresh_token("refresh", reject)
+    assert storage.get_token("access") is not None
+    assert storage.get_token_by_refresh_token("refresh") is not None
+
+
+def test_tokens(storage):
+    storage.create_token(**token_args())
+    storage.create_token(**token_args("access2", None, user_id=None))
+
+    records = storage.get_tokens(["access2", "missing", "access"])
+    assert [record.user_id if record else "none" for record in records] == [None, "none", 1]
+    assert records[0].refresh_expires_at == records[0].expires_at
+    assert records[2].refresh_expires_at > records[2].expires_at
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.create_token(**token_args("access", "refresh3"))
+
+    storage.delete_token("access")
+    assert storage.get_token("access") is None
+    assert storage.get_token_by_refresh_token("refresh") is None
+
+
+def test_device_approve(storage):
+    expires_at = datetime.now() + timedelta(minutes=30)
+    storage.create_device_code("device", "USER", "client", "openid", expires_at, "http://v", 5)
+    storage.create_device_code("device2", "USER2", "client", None, expires_at, "http://v", 5)
+
+    assert not storage.get_device_code("device").is_approved
+    storage.approve_device_code("USER", 7)
+    device = storage.get_device_code_by_user_code("USER")
+    assert device.device_code == "device"
+    assert device.is_approved and device.user_id == 7
+    assert [record.device_code if record else None for record in storage.get_device_codes(["device2", "x", "device"])] == [
+        "device2", None, "device"
+    ]
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.create_device_code("device3", "USER", "client", None, expires_at, "http://v", 5)
+
+
+def test_revocations(storage):
+    storage.create_token(**token_args())
+    record = storage.get_token("access")
+    storage.revoke_token(record.access_token_hash, record.expires_at)
+    storage.revoke_token(record.access_token_hash, record.expires_at)
+
+    assert storage.is_token_revoked(record.access_token_hash)
+    assert not storage.is_token_revoked(b"\0" * 32)
+    rows = storage.list_revoked_tokens(0)
+    assert [digest for _, digest in rows] == [record.access_token_hash]
+    assert storage.list_revoked_tokens(rows[-1][0]) == []
+
+
+def test_stats(storage):
+    stats = storage.stats()
+    assert isinstance(stats, dict)
+    if "pool" in stats:
+        assert stats["pool"]["size"] == 2
+        assert stats["pool"]["in_use"] == 0
+
+
+def test_delete_expired(storage):
+    now = datetime.now()
+    code = storage.create_authorization_code("client", "http://a/cb", 1, None, None, None)
+    storage.create_device_code("old", "OLD", "client", None, now - timedelta(minutes=1), "http://v", 5)
+    storage.create_device_code("new", "NEW", "client", None, now + timedelta(minutes=30), "http://v", 5)
+    # Access token expired, refresh token still valid: the row must stay
+    storage.create_token(**token_args("live", "live-refresh", expires_in=-timedelta(minutes=1)))
+    storage.create_token(**token_args(
+        "dead", "dead-refresh", expires_in=-timedelta(days=2), refresh_expires_in=-timedelta(days=1)
+    ))
+    storage.create_token(**token_args("no-refresh", None, expires_in=-timedelta(minutes=1)))
+    storage.revoke_token(b"\1" * 32, now - timedelta(minutes=1))
+
+    assert storage.delete_expired("authorization_codes", now, 100) == 0
+    assert storage.delete_expired("authorization_codes", now + timedelta(minutes=11), 100) == 1
+    assert storage.get_authorization_code(code) is None
+    assert storage.delete_expired("device_codes", now, 100) == 1
+    assert storage.get_device_code("old") is None
+    assert storage.get_device_code_by_user_code("NEW") is not None
+    assert storage.delete_expired("tokens", now, 100) == 2
+    assert storage.get_token("live") is not None
+    assert storage.get_token_by_refresh_token("live-refresh") is not None
+    assert storage.get_token("dead") is None
+    assert storage.get_token("no-refresh") is None
+    assert storage.delete_expired("revoked_tokens", now, 100) == 1
+    assert not storage.is_token_revoked(b"\1" * 32)
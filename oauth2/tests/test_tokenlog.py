@@ -0,0 +1,203 @@
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from service.storage.mmap_index import _HEADER_SIZE
+from service.storage.tokenlog import TokenLog
+
+
+def token_args(n, expires_in=timedelta(minutes=30), refresh_expires_in=timedelta(days=7)):
+    now = datetime.now()
+    return {
+        "access_token": f"access-{n}",
+        "refresh_token": f"refresh-{n}",
+        "token_type": "Bearer",
+        "expires_at": now + expires_in,
+        "refresh_expires_at": now + refresh_expires_in,
+        "scope": "openid",
+        "client_id": "client",
+        "user_id": n,
+    }
+
+
+def crash(log):
+    """Drop every handle without the clean-shutdown checkpoint, like a killed process."""
+    os.close(log._active_fd)
+    for fd in log._readers.values():
+        os.close(fd)
+    for index in (log._access, log._refresh):
+        index._map.close()
+        index._file.close()
+    log._lock_file.close()
+
+
+def segment_files(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith(".log"))
+
+
+@pytest.fixture
+def directory(tmp_path):
+    return str(tmp_path / "log")
+
+
+def test_reopen_after_clean_close(directory):
+    log = TokenLog(directory, segment_size=512)
+    for n in range(20):
+        log.create_token(**token_args(n))
+    log.delete_token("access-3")
+    log.close()
+
+    log = TokenLog(directory, segment_size=512)
+    assert len(segment_files(directory)) > 1
+    assert log.get_token("access-7").user_id == 7
+    assert log.get_token_by_refresh_token("refresh-19").user_id == 19
+    assert log.get_token("access-3") is None
+    assert log.stats()["tokens"] == 19
+    log.close()
+
+
+def test_index_rebuilt_after_crash(directory):
+    log = TokenLog(directory, segment_size=512)
+    for n in range(20):
+        log.create_token(**token_args(n))
+    log.delete_token("access-3")
+    crash(log)
+    # Wipe the slots but keep the header, which still says unclean; the
+    # segments alone must be enough
+    for name in ("access.idx", "refresh.idx"):
+        path = os.path.join(directory, name)
+        with open(path, "r+b") as f:
+            f.seek(_HEADER_SIZE)
+            f.write(bytes(os.path.getsize(path) - _HEADER_SIZE))
+
+    log = TokenLog(directory, segment_size=512)
+    assert log.get_token("access-11").user_id == 11
+    assert log.get_token_by_refresh_token("refresh-0").user_id == 0
+    assert log.get_token("access-3") is None
+    assert log.get_token_by_refresh_token("refresh-3") is None
+    assert log.stats()["tokens"] == 19
+    log.close()
+
+
+@pytest.mark.parametrize("corruption", ["short", "bad_crc"])
+def test_torn_tail_is_truncated(directory, corruption):
+    log = TokenLog(directory)
+    for n in range(3):
+        log.create_token(**token_args(n))
+    path = log._path(log._active)
+    intact = os.path.getsize(path)
+    log.create_token(**token_args(3))
+    crash(log)
+    with open(path, "r+b") as f:
+        if corruption == "short":
+            f.truncate(intact + 10)
+        else:
+            f.seek(intact + 20)
+            byte = f.read(1)
+            f.seek(intact + 20)
+            f.write(bytes([byte[0] ^ 0xFF]))
+
+    log = TokenLog(directory)
+    assert os.path.getsize(path) == intact
+    assert [log.get_token(f"access-{n}") is not None for n in range(4)] == [True, True, True, False]
+    # Appends after the truncation point survive another crash
+    log.create_token(**token_args(4))
+    crash(log)
+    log = TokenLog(directory)
+    assert log.get_token("access-4").user_id == 4
+    log.close()
+
+
+def test_compaction_keeps_live_and_rotated(directory):
+    log = TokenLog(directory, segment_size=512)
+    log.create_token(**token_args(1))
+    log.create_token(**token_args(2))
+    log.rotate_refresh_token("refresh-2", lambda old: token_args(3))
+    log.create_token(**token_args(4))
+    log.delete_token("access-4")
+    # Access token expired but the refresh token is live: kept
+    log.create_token(**token_args(5, expires_in=-timedelta(hours=1)))
+    # Both expired: dropped
+    log.create_token(**token_args(6, expires_in=-timedelta(days=2), refresh_expires_in=-timedelta(days=1)))
+    for n in range(10, 30):
+        log.create_token(**token_args(n))
+    before = log.stats()["bytes"]
+
+    stats = log.compact()
+    assert stats["expired"] == 1
+    assert stats["live"] == 23
+    assert log.stats()["bytes"] < before
+    assert len(segment_files(directory)) == 2  # compacted output plus the fresh active segment
+
+    def check(log):
+        for n in [1, 3, 5] + list(range(10, 30)):
+            assert log.get_token(f"access-{n}").user_id == n
+            assert log.get_token_by_refresh_token(f"refresh-{n}").user_id == n
+        for n in (2, 4, 6):
+            assert log.get_token(f"access-{n}") is None
+            assert log.get_token_by_refresh_token(f"refresh-{n}") is None
+
+    check(log)
+    log.create_token(**token_args(40))
+    log.close()
+    log = TokenLog(directory, segment_size=512)
+    check(log)
+    crash(log)
+    log = TokenLog(directory, segment_size=512)
+    check(log)
+    assert log.get_token("access-40").user_id == 40
+    log.close()
+
+
+class Interrupted(Exception):
+    pass
+
+
+@pytest.mark.parametrize("function, calls_before_crash", [
+    ("replace", 0),  # output written, not yet committed: rolled back
+    ("remove", 0),  # committed, nothing removed yet: rolled forward
+    ("remove", 1),  # committed, some segments removed
+])
+def test_compaction_interrupted(directory, monkeypatch, function, calls_before_crash):
+    log = TokenLog(directory, segment_size=512)
+    log.create_token(**token_args(1))
+    log.create_token(**token_args(3))
+    for n in range(10, 30):
+        log.create_token(**token_args(n))
+    # Tombstones in a later segment than the PUTs they cancel
+    log.rotate_refresh_token("refresh-1", lambda old: token_args(2))
+    log.delete_token("access-3")
+
+    real = getattr(os, function)
+    calls = []
+
+    def fail(*args):
+        if len(calls) == calls_before_crash:
+            raise Interrupted
+        calls.append(args)
+        return real(*args)
+
+    monkeypatch.setattr(os, function, fail)
+    with pytest.raises(Interrupted):
+        log.compact()
+    monkeypatch.undo()
+    crash(log)
+
+    log = TokenLog(directory, segment_size=512)
+    assert not [name for name in os.listdir(directory) if ".compact" in name]
+    for n in (1, 3):
+        assert log.get_token(f"access-{n}") is None
+        assert log.get_token_by_refresh_token(f"refresh-{n}") is None
+    for n in [2] + list(range(10, 30)):
+        assert log.get_token(f"access-{n}").user_id == n
+    assert log.stats()["tokens"] == 21
+    log.close()
+
+
+def test_single_owner(directory):
+    log = TokenLog(directory)
+    with pytest.raises(RuntimeError):
+        TokenLog(directory)
+    log.close()
+    TokenLog(directory).close()
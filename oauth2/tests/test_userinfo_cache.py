@@ -0,0 +1,44 @@
+import asyncio
+
+import pytest
+
+from service.database import async_operations
+from service.routes import health
+from service.storage.memory import MemoryStorage
+from service.utils.userinfo_cache import userinfo_cache
+
+
+@pytest.fixture
+def storage(monkeypatch):
+    storage = MemoryStorage()
+    monkeypatch.setattr(async_operations, "get_storage", lambda: storage)
+    monkeypatch.setattr(health, "get_storage", lambda: storage)
+    userinfo_cache.clear()
+    yield storage
+    userinfo_cache.clear()
+
+
+def test_user_update_evicts_userinfo(storage):
+    alice = storage.create_user("alice", "hash-a", "alice@example.com")
+    bob = storage.create_user("bob", "hash-b", None)
+    userinfo_cache.put(b"a" * 32, None, alice, {"sub": str(alice)})
+    userinfo_cache.put(b"b" * 32, None, bob, {"sub": str(bob)})
+
+    asyncio.run(async_operations.update_password_hash(alice, "hash-a2"))
+    assert storage.get_user("alice").hashed_password == "hash-a2"
+    assert userinfo_cache.get(b"a" * 32) is None
+    assert userinfo_cache.get(b"b" * 32) == {"sub": str(bob)}
+
+
+def test_metrics_report_cache_stats(storage):
+    before = userinfo_cache.stats()
+    userinfo_cache.put(b"a" * 32, None, 1, {"sub": "1"})
+    userinfo_cache.get(b"a" * 32)
+    userinfo_cache.get(b"c" * 32)
+
+    metrics = asyncio.run(health.metrics())
+    stats = metrics["userinfo_cache"]
+    assert stats["entries"] == 1
+    assert (stats["hits"] - before["hits"], stats["misses"] - before["misses"]) == (1, 1)
+    assert set(metrics["token_cache"]) == {"entries", "hits", "misses", "evictions"}
+    assert metrics["storage"] == {}